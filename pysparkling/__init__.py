@@ -7,11 +7,12 @@ from .accumulators import Accumulator, AccumulatorParam
 from .broadcast import Broadcast
 from .cache_manager import CacheManager, TimedCacheManager
 from .context import Context
+from .executor import ProcessPool
 from .rdd import RDD
 from .sql.types import Row
 from .stat_counter import StatCounter
 from .storagelevel import StorageLevel
 
 __all__ = ['RDD', 'Context', 'Broadcast', 'StatCounter', 'CacheManager', 'Row',
-           'TimedCacheManager', 'StorageLevel',
+           'TimedCacheManager', 'StorageLevel', 'ProcessPool',
            'exceptions', 'fileio', 'streaming']
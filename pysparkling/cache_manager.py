@@ -1,69 +1,142 @@
 """Manages caches of calculated partitions."""
+from collections import OrderedDict
 import logging
+import os
 import pickle
+import shutil
+import sys
+import tempfile
+import threading
 import time
+import weakref
 import zlib
 
+from .storagelevel import StorageLevel
+
 log = logging.getLogger(__name__)
 
+# number of elements whose size is measured to estimate the size of a partition
+SIZE_SAMPLE = 100
+
 
 class CacheManager:
     """cache manager
 
-    When mem_obj or disk_location are None, it means the object does not
-    exist in memory or on disk. The other variables might be set though.
+    When mem_obj, mem_ser or disk_location are None, it means the object
+    does not exist deserialized in memory, serialized in memory or on disk.
+    The other variables might be set though.
+
+    The storage level of an entry decides where it is stored:
+
+    * ``MEMORY_ONLY``: Python objects in memory, the default
+    * ``MEMORY_ONLY_SER``: compressed output of the serializer in memory
+    * ``DISK_ONLY``: output of the serializer in a temporary file, verified
+      with the checksum when read
+    * ``MEMORY_AND_DISK``: in memory, spilled to disk when evicted
+
+    When the entries in memory use more than ``max_mem``, the least
+    recently used ones are evicted: they are spilled to disk if their
+    storage level uses the disk and dropped otherwise.
+
+    A cache manager can be shared by jobs running in several threads.
 
     :param max_mem: Memory in GB to keep in memory before spilling to disk.
     :param serializer: Use to serialize cache objects.
     :param deserializer: Use to deserialize cache objects.
     :param checksum: Function returning a checksum.
+    :param local_dir: (optional) directory of the files of entries on disk,
+        a temporary directory is created when needed if not given
     """
 
     def __init__(self, max_mem=1.0, serializer=None, deserializer=None,
-                 checksum=None):
+                 checksum=None, local_dir=None):
         self.max_mem = max_mem
         self.serializer = serializer if serializer else pickle.dumps
         self.deserializer = deserializer if deserializer else pickle.loads
         self.checksum = checksum if checksum else zlib.crc32
+        self.local_dir = local_dir
 
-        self.cache_obj = {}
+        # entries are kept from the least to the most recently used
+        self.cache_obj = OrderedDict()
         self.cache_cnt = 0
         self.cache_mem_size = 0.0
         self.cache_disk_size = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        r = {k: v if k not in ('_lock',) else None
+             for k, v in self.__dict__.items()}
+        return r
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
 
     def incr_cache_cnt(self):
-        self.cache_cnt += 1
-        return self.cache_cnt
+        with self._lock:
+            self.cache_cnt += 1
+            return self.cache_cnt
 
     def add(self, ident, obj, storageLevel=None):
-        self.cache_obj[ident] = {
+        if storageLevel is None:
+            storageLevel = StorageLevel.MEMORY_ONLY
+
+        entry = {
             'id': self.incr_cache_cnt(),
             'storageLevel': storageLevel,
             'mem_size': None,
-            'mem_obj': obj,
+            'mem_obj': None,
             'mem_ser': None,
             'mem_ser_size': None,
             'disk_size': None,
             'disk_location': None,
             'checksum': None,
         }
+        if storageLevel.useMemory and not is_serialized(storageLevel):
+            entry['mem_obj'] = obj
+            entry['mem_size'] = estimate_size(obj)
+        elif storageLevel.useMemory:
+            entry['mem_ser'] = zlib.compress(self.serializer(obj))
+            entry['mem_ser_size'] = len(entry['mem_ser'])
+        else:
+            self._write_to_disk(ident, entry, obj)
+
+        with self._lock:
+            self.delete(ident)
+            self._insert(ident, entry)
+            self.evict()
         log.debug('Added %s to cache.', ident)
 
     def get(self, ident):
-        if ident not in self.cache_obj:
-            log.debug('%s not found in cache.', ident)
-            return None
-
+        with self._lock:
+            entry = self.cache_obj.get(ident)
+            if entry is None:
+                self.cache_misses += 1
+                log.debug('%s not found in cache.', ident)
+                return None
+            self.cache_obj.move_to_end(ident)
+
+        if entry['mem_obj'] is not None:
+            obj = entry['mem_obj']
+        elif entry['mem_ser'] is not None:
+            obj = self.deserializer(zlib.decompress(entry['mem_ser']))
+        else:
+            obj = self._read_from_disk(ident, entry)
+            if obj is None:
+                return None
+
+        with self._lock:
+            self.cache_hits += 1
         log.debug('Returning %s from cache.', ident)
-        return self.cache_obj[ident]['mem_obj']
+        return obj
 
     def has(self, ident):
-        return (
-            ident in self.cache_obj and (
-                self.cache_obj[ident]['mem_obj'] is not None
-                or self.cache_obj[ident]['disk_location'] is not None
-            )
-        )
+        with self._lock:
+            entry = self.cache_obj.get(ident)
+        return entry is not None and is_stored(entry)
 
     def get_not_in(self, idents):
         """get entries not given in idents
@@ -71,9 +144,10 @@ class CacheManager:
         :param idents: A list of cache ids (or idents).
         :returns: All cache entries that are not in the given list.
         """
-        return {i: c
-                for i, c in self.cache_obj.items()
-                if i not in idents}
+        with self._lock:
+            return {i: c
+                    for i, c in self.cache_obj.items()
+                    if i not in idents}
 
     def join(self, cache_objects):
         """join
@@ -81,13 +155,17 @@ class CacheManager:
         :param cache_objects:
             Objects obtained with :func:`CacheManager.get_not_in()`.
         """
-        self.cache_obj.update(cache_objects)
+        with self._lock:
+            for ident, entry in cache_objects.items():
+                self.delete(ident, remove_file=False)
+                self._insert(ident, entry)
+            self.evict()
 
     def stored_idents(self):
-        return [k
-                for k, v in self.cache_obj.items()
-                if (v['mem_obj'] is not None
-                    or v['disk_location'] is not None)]
+        with self._lock:
+            return [k
+                    for k, v in self.cache_obj.items()
+                    if is_stored(v)]
 
     def clone_contains(self, filter_id):
         """Clone the cache manager and add a subset of the cache to it.
@@ -99,25 +177,108 @@ class CacheManager:
         """
         cm = CacheManager(self.max_mem,
                           self.serializer, self.deserializer,
-                          self.checksum)
-        cm.cache_obj = {i: c
-                        for i, c in self.cache_obj.items()
-                        if filter_id(i)}
+                          self.checksum, self.get_local_dir())
+        self._copy_entries(cm, filter_id)
         return cm
 
-    def delete(self, ident):
-        if ident not in self.cache_obj:
-            return False
-
-        del self.cache_obj[ident]
+    def delete(self, ident, remove_file=True):
+        with self._lock:
+            if ident not in self.cache_obj:
+                return False
+
+            entry = self.cache_obj.pop(ident)
+            self.cache_mem_size -= memory_size(entry)
+            self.cache_disk_size -= entry['disk_size'] or 0
+        if remove_file and entry['disk_location'] is not None:
+            try:
+                os.remove(entry['disk_location'])
+            except FileNotFoundError:
+                pass
         return True
 
     def clear(self):
         """empties the entire cache"""
-        self.cache_obj = {}
-        self.cache_cnt = 0
-        self.cache_mem_size = 0.0
-        self.cache_disk_size = 0.0
+        with self._lock:
+            for ident in list(self.cache_obj):
+                self.delete(ident)
+            self.cache_cnt = 0
+            self.cache_mem_size = 0.0
+            self.cache_disk_size = 0.0
+
+    def evict(self):
+        """Evict the least recently used entries until the memory used
+        is below ``max_mem``.
+
+        Entries whose storage level uses the disk are spilled to disk.
+        """
+        max_bytes = self.max_mem * 1e9
+        with self._lock:
+            for ident in list(self.cache_obj):
+                if self.cache_mem_size <= max_bytes:
+                    break
+                entry = self.cache_obj[ident]
+                size = memory_size(entry)
+                if not size:
+                    continue
+
+                self.cache_evictions += 1
+                if entry['storageLevel'].useDisk:
+                    log.debug('Spilling %s to disk.', ident)
+                    obj = (entry['mem_obj'] if entry['mem_obj'] is not None
+                           else self.deserializer(zlib.decompress(entry['mem_ser'])))
+                    self._write_to_disk(ident, entry, obj)
+                    self.cache_disk_size += entry['disk_size']
+                    self.cache_mem_size -= size
+                    entry.update(mem_obj=None, mem_size=None, mem_ser=None, mem_ser_size=None)
+                else:
+                    log.debug('Evicting %s from cache.', ident)
+                    self.delete(ident)
+
+    def get_local_dir(self):
+        """Directory of the files of the entries on disk, created if needed.
+
+        It is removed when the cache manager that created it is garbage
+        collected.
+        """
+        with self._lock:
+            if self.local_dir is None:
+                self.local_dir = tempfile.mkdtemp(prefix='pysparkling-cache-')
+                weakref.finalize(self, shutil.rmtree, self.local_dir, True)
+            return self.local_dir
+
+    def _insert(self, ident, entry):
+        self.cache_obj[ident] = entry
+        self.cache_mem_size += memory_size(entry)
+        self.cache_disk_size += entry['disk_size'] or 0
+
+    def _copy_entries(self, cm, filter_id):
+        with self._lock:
+            for i, c in self.cache_obj.items():
+                if filter_id(i):
+                    cm._insert(i, c)
+
+    def _write_to_disk(self, ident, entry, obj):
+        data = self.serializer(obj)
+        file_name = '_'.join(str(i) for i in ident) if isinstance(ident, tuple) else str(ident)
+        path = os.path.join(self.get_local_dir(), f'{file_name}_{entry["id"]}')
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+        entry.update(disk_location=path, disk_size=len(data), checksum=self.checksum(data))
+
+    def _read_from_disk(self, ident, entry):
+        try:
+            with open(entry['disk_location'], 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = None
+        if data is None or self.checksum(data) != entry['checksum']:
+            log.warning('Cache entry %s on disk is missing or corrupt.', ident)
+            with self._lock:
+                self.cache_misses += 1
+            self.delete(ident)
+            return None
+        return self.deserializer(data)
 
 
 class TimedCacheManager(CacheManager):
@@ -132,21 +293,23 @@ class TimedCacheManager(CacheManager):
     :param deserializer: Use to deserialize cache objects.
     :param checksum: Function returning a checksum.
     :param float timeout: timeout duration in seconds
+    :param local_dir: (optional) directory of the files of entries on disk
     """
     def __init__(self,
                  max_mem=1.0,
                  serializer=None, deserializer=None,
-                 checksum=None, timeout=600.0):
+                 checksum=None, timeout=600.0, local_dir=None):
         super().__init__(
-            max_mem, serializer, deserializer, checksum)
+            max_mem, serializer, deserializer, checksum, local_dir)
 
         self.timeout = timeout
         self._time_added = []  # pairs of (id, timestamp); oldest first
 
     def add(self, ident, obj, storageLevel=None):
-        super().add(ident, obj, storageLevel)
-        self._time_added.append((ident, time.time()))
-        self.gc()
+        with self._lock:
+            super().add(ident, obj, storageLevel)
+            self._time_added.append((ident, time.time()))
+            self.gc()
 
     def clone_contains(self, filter_id):
         """Clone the timed cache manager and add a subset of the cache to it.
@@ -158,20 +321,61 @@ class TimedCacheManager(CacheManager):
         """
         cm = TimedCacheManager(self.max_mem,
                                self.serializer, self.deserializer,
-                               self.checksum, self.timeout)
-        cm.cache_obj = {i: c
-                        for i, c in self.cache_obj.items()
-                        if filter_id(i)}
+                               self.checksum, self.timeout,
+                               self.get_local_dir())
+        self._copy_entries(cm, filter_id)
         return cm
 
     def gc(self):
         """Remove timed out entries."""
         log.debug('Looking for timed out cache entries.')
         threshold_time = time.time() - self.timeout
-        while self._time_added:
-            ident, timestamp = self._time_added[0]
-            if timestamp > threshold_time:
-                break
-            self.delete(ident)
-            del self._time_added[0]
+        with self._lock:
+            while self._time_added:
+                ident, timestamp = self._time_added[0]
+                if timestamp > threshold_time:
+                    break
+                self.delete(ident)
+                del self._time_added[0]
         log.debug('Clear done.')
+
+
+def is_serialized(storageLevel):
+    """Whether partitions of the level are kept serialized in memory.
+
+    The ``*_SER`` constants have the same flags as ``MEMORY_ONLY`` and
+    ``MEMORY_AND_DISK``, they are told apart by ``cacheSerialized``.
+    """
+    return storageLevel.cacheSerialized
+
+
+def is_stored(entry):
+    return (entry['mem_obj'] is not None
+            or entry['mem_ser'] is not None
+            or entry['disk_location'] is not None)
+
+
+def memory_size(entry):
+    """Bytes used by an entry in memory."""
+    return (entry['mem_size'] or 0) + (entry['mem_ser_size'] or 0)
+
+
+def estimate_size(obj):
+    """Estimate the memory used by obj and the objects it contains.
+
+    The size of a list or a tuple is extrapolated from the size of a sample
+    of its elements.
+
+    >>> estimate_size(list(range(1000))) > estimate_size(list(range(10)))
+    True
+    """
+    if isinstance(obj, (list, tuple)):
+        size = sys.getsizeof(obj)
+        if not obj:
+            return size
+        step = max(1, len(obj) // SIZE_SAMPLE)
+        sample = obj[::step]
+        return size + sum(estimate_size(e) for e in sample) * len(obj) // len(sample)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    return sys.getsizeof(obj)
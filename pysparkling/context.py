@@ -1,20 +1,28 @@
 """Context."""
 from collections import defaultdict
+from concurrent.futures import as_completed, CancelledError, ThreadPoolExecutor
+import functools
 import itertools
 import logging
 import pickle
 import struct
+import threading
 import time
 import traceback
 
-from . import accumulators
+from . import accumulators, shared_memory
 from .__version__ import __version__ as PYSPARKLING_VERSION
 from .broadcast import Broadcast
 from .cache_manager import CacheManager
-from .exceptions import ContextIsLockedException
+from .executor import payload_key_of, ProcessPool
 from .fileio import File, TextFile
+from .futures import as_awaitable, FutureAction
+from .metrics import JobMetrics, serialized_size, StageMetrics, TaskMetrics
 from .partition import Partition
-from .rdd import EmptyRDD, RDD
+from .profiler import BasicProfiler, ProfilerCollector
+from .rdd import EmptyRDD, RDD, UnionRDD
+from .scheduler import DAGScheduler, persisted_blocks
+from .shuffle import DiskShuffleManager, ShuffleManager
 from .task_context import TaskContext
 
 log = logging.getLogger(__name__)
@@ -34,6 +42,7 @@ def _run_task(task_context, rdd, func, partition):
     :param Partition partition: partition to process
     """
     task_context.attempt_number += 1
+    task_context.metrics.start_attempt(task_context.attempt_number)
 
     log.debug(
         'Running stage %s for partition %s of %s (id: %s).',
@@ -41,7 +50,7 @@ def _run_task(task_context, rdd, func, partition):
     )
 
     try:
-        return func(task_context, rdd.compute(partition, task_context))
+        return func(task_context, task_context.metrics.count_written(rdd.compute(partition, task_context)))
     except Exception as e:  # pylint: disable=broad-except
         log.warning(
             'Attempt %s failed for partition %s of %s (id: %s): %s',
@@ -59,13 +68,128 @@ def _run_task(task_context, rdd, func, partition):
     return _run_task(task_context, rdd, func, partition)
 
 
-def runJob_map(i):  # pylint: disable=too-many-locals
-    (deserializer, data_serializer, data_deserializer,
+def _run_measured_task(task_context, rdd, func, partition):
+    """Run a task and measure it in ``task_context.metrics``."""
+    with task_context.metrics.measure():
+        return _run_task(task_context, rdd, func, partition)
+
+
+def _run_profiled_task(task_context, rdd, func, partition):
+    """Run a measured task under ``task_context.profiler_cls`` if it is set.
+
+    :returns: the result and the stats of the profiler or None
+    """
+    if task_context.profiler_cls is None:
+        return _run_measured_task(task_context, rdd, func, partition), None
+    profiler = task_context.profiler_cls()
+    result = profiler.profile(_run_measured_task, task_context, rdd, func, partition)
+    return result, profiler.stats()
+
+
+def runJob_map(i):
+    data_serializer = i[1]
+    task_context, func, rdd, partition, stats = _deserialize_task(i)
+    cm_state = task_context.cache_manager.stored_idents()
+
+    t_start = time.perf_counter()
+    result, profile = _run_profiled_task(task_context, rdd, func, partition)
+    stats['map_exec'] = time.perf_counter() - t_start
+
+    return data_serializer((
+        result,
+        task_context.cache_manager.get_not_in(cm_state),
+        stats,
+        task_context.metrics,
+        profile,
+    ))
+
+
+def _release_task_data(serialized_partition, future):
+    """Release the shared memory of a task whose result is not loaded.
+
+    The partition was not loaded by the worker if the task did not run,
+    e.g. when the pool is broken, the result if the task succeeded.
+    """
+    if future.cancelled() or future.exception() is not None:
+        shared_memory.release(serialized_partition)
+    else:
+        shared_memory.release(future.result())
+
+
+def _release_results(results):
+    """Release the shared memory of the remaining results of a pool."""
+    while True:
+        try:
+            d = next(results)
+        except StopIteration:
+            return
+        except Exception:  # pylint: disable=broad-except
+            # the other results are still released
+            continue
+        shared_memory.release(d)
+
+
+# cache manager of a worker process of a ProcessPool, it keeps the cached
+# partitions between the tasks that run in this worker
+_resident_cache_manager = None
+
+
+def runJob_map_resident(i, payload=None):
+    """Run a task with the cache manager resident in this worker.
+
+    The serialized function and RDD of the job are the payload, which is
+    only deserialized by the first task of the job running in this worker.
+    Instead of the cached partitions, the changes to the idents stored in
+    the cache are returned.
+    """
+    global _resident_cache_manager  # pylint: disable=global-statement
+
+    data_serializer = i[1]
+    task_context, func, rdd, partition, stats = _deserialize_task(i, payload)
+    # the cache manager sent with the first task has the configuration of
+    # the cache manager of the context
+    if _resident_cache_manager is None:
+        _resident_cache_manager = task_context.cache_manager
+    task_context.cache_manager = _resident_cache_manager
+    cm_state = set(_resident_cache_manager.stored_idents())
+
+    t_start = time.perf_counter()
+    result, profile = _run_profiled_task(task_context, rdd, func, partition)
+    stats['map_exec'] = time.perf_counter() - t_start
+
+    new_state = set(_resident_cache_manager.stored_idents())
+    return data_serializer((
+        result,
+        (new_state - cm_state, cm_state - new_state),
+        stats,
+        task_context.metrics,
+        profile,
+    ))
+
+
+def remove_resident_blocks(idents):
+    if _resident_cache_manager is not None:
+        for ident in idents:
+            _resident_cache_manager.delete(ident)
+
+
+def _deserialize_task(i, payload=None):  # pylint: disable=too-many-locals
+    (deserializer, _, data_deserializer,
      serialized_func_rdd, serialized_task_context,
      serialized_data) = i
 
+    # the payload is only received by the first task using it
+    bytes_received = serialized_size(serialized_func_rdd if payload is None else payload.data)
+    bytes_received += serialized_size(serialized_task_context) + serialized_size(serialized_data)
+
     t_start = time.perf_counter()
-    func, rdd = deserializer(serialized_func_rdd)
+    if payload is None:
+        func, rdd = deserializer(serialized_func_rdd)
+    else:
+        if payload.value is None:
+            payload.value = deserializer(payload.data)
+            payload.data = None
+        func, rdd = payload.value
     t_deserialize_func = time.perf_counter() - t_start
 
     t_start = time.perf_counter()
@@ -74,23 +198,14 @@ def runJob_map(i):  # pylint: disable=too-many-locals
 
     t_start = time.perf_counter()
     task_context = deserializer(serialized_task_context)
-    cm_state = task_context.cache_manager.stored_idents()
     t_deserialize_task_context = time.perf_counter() - t_start
+    task_context.metrics.bytes_serialized += bytes_received
 
-    t_start = time.perf_counter()
-    result = _run_task(task_context, rdd, func, partition)
-    t_exec = time.perf_counter() - t_start
-
-    return data_serializer((
-        result,
-        task_context.cache_manager.get_not_in(cm_state),
-        {
-            'map_deserialize_func': t_deserialize_func,
-            'map_deserialize_task_context': t_deserialize_task_context,
-            'map_deserialize_data': t_deserialize_data,
-            'map_exec': t_exec,
-        }
-    ))
+    return task_context, func, rdd, partition, {
+        'map_deserialize_func': t_deserialize_func,
+        'map_deserialize_task_context': t_deserialize_task_context,
+        'map_deserialize_data': t_deserialize_data,
+    }
 
 
 class Context:
@@ -99,6 +214,14 @@ class Context:
     The variable `_stats` contains measured timing information about data and
     function (de)serialization and workload execution to benchmark your jobs.
 
+    Jobs can be submitted concurrently from several threads. Each job gets
+    its own job and stage ids and its timings are added to `_stats` when it
+    completes. Asynchronous actions like :func:`RDD.collectAsync` run their
+    jobs in a thread pool of the context.
+
+    The metrics of every job, stage and task are posted to the listeners
+    added with :func:`addListener`, see :mod:`pysparkling.metrics`.
+
     :param pool: An instance with a ``map(func, iterable)`` method.
     :param serializer:
         Serializer for functions. Examples are `pickle.dumps` and
@@ -111,14 +234,23 @@ class Context:
     :param float retry_wait: seconds to wait between retries
     :param cache_manager: custom cache manager (like `TimedCacheManager`)
     :param catch_exceptions: whether to catch and silence user space exceptions
+    :param bool profile: whether to profile the tasks, see
+        :func:`show_profiles`
+    :param profiler_cls: class of the profiler of the tasks, a subclass of
+        :class:`pysparkling.profiler.Profiler`, by default the
+        :class:`~pysparkling.profiler.BasicProfiler` using cProfile
     """
 
     __last_rdd_id = 0
+    __last_shuffle_id = 0
+    __last_job_id = 0
+    __last_stage_id = 0
+    __id_lock = threading.Lock()
 
     def __init__(self, pool=None, serializer=None, deserializer=None,
                  data_serializer=None, data_deserializer=None,
                  max_retries=3, retry_wait=0.0, cache_manager=None,
-                 catch_exceptions=False):
+                 catch_exceptions=False, profile=False, profiler_cls=None):
         if pool is None:
             pool = DummyPool()
         if serializer is None:
@@ -133,6 +265,8 @@ class Context:
         self.retry_wait = retry_wait
 
         self._cache_manager = cache_manager or CacheManager()
+        self._shuffle_manager = (ShuffleManager() if isinstance(pool, DummyPool)
+                                 else DiskShuffleManager())
         self._catch_exceptions = catch_exceptions
         self._pool = pool
         self._serializer = serializer
@@ -141,15 +275,80 @@ class Context:
         self._data_deserializer = data_deserializer
         self._s3_conn = None
         self._stats = defaultdict(float)
-        self.locked = False
+        self._stats_lock = threading.Lock()
+        self._job_executor = ThreadPoolExecutor(thread_name_prefix='pysparkling-job')
+        self._job_local = threading.local()
+        self._dag_scheduler = DAGScheduler(self)
+        # workers holding every cached partition when the pool is a ProcessPool
+        self._block_locations = {}
+        self._block_locations_lock = threading.Lock()
+        self._listeners = []
+        self._listener_lock = threading.Lock()
+        self._profiler_cls = (profiler_cls or BasicProfiler) if profile else None
+        self._profiler_collector = ProfilerCollector() if profile else None
 
         self.version = PYSPARKLING_VERSION
 
     def __getstate__(self):
-        r = {k: v if k not in ('_pool',) else None
+        r = {k: v if k not in ('_pool', '_stats_lock', '_job_executor', '_job_local',
+                               '_block_locations_lock', '_listeners', '_listener_lock',
+                               '_profiler_collector') else None
              for k, v in self.__dict__.items()}
         return r
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._stats_lock = threading.Lock()
+        self._job_local = threading.local()
+        self._block_locations_lock = threading.Lock()
+        self._listeners = []
+        self._listener_lock = threading.Lock()
+
+    def addListener(self, listener):
+        """Add a listener of the events of the jobs, stages and tasks.
+
+        :param pysparkling.metrics.Listener listener: the listener
+        """
+        with self._listener_lock:
+            self._listeners.append(listener)
+
+    def removeListener(self, listener):
+        with self._listener_lock:
+            self._listeners.remove(listener)
+
+    def _post(self, event, metrics):
+        """Call the method named event of every listener with metrics."""
+        if not self._listeners:
+            return
+        with self._listener_lock:
+            for listener in self._listeners:
+                try:
+                    getattr(listener, event)(metrics)
+                except Exception:  # pylint: disable=broad-except
+                    log.exception('Listener %r failed on %s.', listener, event)
+
+    def show_profiles(self):
+        """Print the profiles of the tasks merged per RDD.
+
+        The tasks of a stage are profiled as part of the last RDD of the
+        stage, the one computed by the stage.
+        """
+        self._check_profiling().show_profiles()
+
+    def dump_profiles(self, path):
+        """Write the profiles of the tasks in ``rdd_<id>.pstats`` files.
+
+        They can be loaded with :class:`pstats.Stats`.
+
+        :param str path: the directory of the files
+        """
+        self._check_profiling().dump_profiles(path)
+
+    def _check_profiling(self):
+        if self._profiler_collector is None:
+            raise RuntimeError('Tasks are not profiled, create the Context with profile=True.')
+        return self._profiler_collector
+
     def broadcast(self, x):
         return Broadcast(self, x)
 
@@ -175,8 +374,82 @@ class Context:
         return accumulators.Accumulator(value, accum_param)
 
     def newRddId(self):
-        Context.__last_rdd_id += 1
-        return Context.__last_rdd_id
+        with Context.__id_lock:
+            Context.__last_rdd_id += 1
+            return Context.__last_rdd_id
+
+    def newShuffleId(self):
+        with Context.__id_lock:
+            Context.__last_shuffle_id += 1
+            return Context.__last_shuffle_id
+
+    def newJobId(self):
+        with Context.__id_lock:
+            Context.__last_job_id += 1
+            return Context.__last_job_id
+
+    def newStageId(self):
+        with Context.__id_lock:
+            Context.__last_stage_id += 1
+            return Context.__last_stage_id
+
+    def _submit_action(self, action):
+        """Run an action in the background.
+
+        :param action: function without arguments that runs jobs
+        :returns: a :class:`FutureAction` of the result of action, wrapped in
+            an asyncio future when called from a running event loop
+        """
+        future = FutureAction()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            self._job_local.cancel_requested = future.cancel_requested
+            try:
+                result = action()
+            except BaseException as e:  # pylint: disable=broad-except
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                self._job_local.cancel_requested = None
+
+        self._job_executor.submit(run)
+        return as_awaitable(future)
+
+    def _check_cancelled(self):
+        """Raise CancelledError if the current action was cancelled."""
+        cancel_requested = getattr(self._job_local, 'cancel_requested', None)
+        if cancel_requested is not None and cancel_requested.is_set():
+            raise CancelledError
+
+    def _is_block_stored(self, ident):
+        """Whether a partition is cached in the driver or in a worker."""
+        with self._block_locations_lock:
+            if ident in self._block_locations:
+                return True
+        return self._cache_manager.has(ident)
+
+    def _remove_blocks(self, idents):
+        """Remove cached partitions from the driver and from the workers."""
+        by_worker = defaultdict(list)
+        with self._block_locations_lock:
+            for ident in idents:
+                self._cache_manager.delete(ident)
+                for worker in self._block_locations.pop(ident, ()):
+                    by_worker[worker].append(ident)
+
+        removals = [self._pool.submit(remove_resident_blocks, worker_idents, worker=worker)
+                    for worker, worker_idents in by_worker.items()]
+        for removal in removals:
+            removal.result()
+
+    def _add_stats(self, stats):
+        """Add the timings measured by a job to `_stats`."""
+        with self._stats_lock:
+            for k, v in stats.items():
+                self._stats[k] += v
 
     @property
     def defaultParallelism(self):
@@ -266,7 +539,7 @@ class Context:
         return rdd
 
     def runJob(self, rdd, func, partitions=None, allowLocal=False,
-               resultHandler=None):
+               resultHandler=None, ordered=True):
         """This function is used by methods in the RDD.
 
         Note that the maps are only inside generators and the resultHandler
@@ -280,67 +553,142 @@ class Context:
             the map job is applied to all partitions.
         :param allowLocal: Allows local execution.
         :param resultHandler: Process the result from the maps.
+        :param bool ordered: Whether the results are passed to resultHandler
+            in the order of the partitions. Otherwise, they are passed as
+            soon as they are computed, which is faster with a pool.
         :returns: Result of resultHandler.
         :rtype: list
         """
         if not partitions:
             partitions = rdd.partitions()
 
-        # acquire lock
-        if self.locked:
-            raise ContextIsLockedException
-        self.locked = True
+        job_id = self.newJobId()
+        log.debug('Starting job %s on %s (id: %s).', job_id, rdd.name(), rdd.id())
+
+        # stats are collected per job and only added to the shared
+        # stats once the job is done
+        stats = defaultdict(float)
+        job = JobMetrics(job_id, rdd.name())
+        self._post('on_job_start', job)
+        job.start()
+
+        try:
+            map_result = self._dag_scheduler.run_job(rdd, func, partitions, allowLocal,
+                                                     job, stats, ordered)
+            result = (resultHandler(map_result) if resultHandler is not None
+                      else list(map_result))
+            # completes the result stage if it is not used anymore, e.g. after
+            # take(), but not if the result handler returned a lazy iterator
+            del map_result
+            job.succeeded = True
+        finally:
+            self._add_stats(stats)
+            job.succeeded = bool(job.succeeded)
+            job.stop()
+            self._post('on_job_end', job)
+
+        log.debug('Finished job %s.', job_id)
+        return result
+
+    def _run_tasks(self, rdd, func, partitions, stage_id, allowLocal, stats, ordered=True,
+                   job=None):
+        """Run the tasks of a stage.
 
+        :param bool ordered: whether the results are in the order of the
+            partitions or in the order in which the tasks finish
+        :param JobMetrics job: (optional) metrics of the job running the stage
+        :returns: an iterator over the results of the tasks
+        """
         # this is the place to insert proper schedulers
         if allowLocal or isinstance(self._pool, DummyPool):
-            map_result = self._runJob_local(rdd, func, partitions)
+            tasks = self._runJob_local(rdd, func, partitions, stage_id)
+        elif isinstance(self._pool, ProcessPool):
+            tasks = self._runJob_resident(rdd, func, partitions, stage_id, stats, ordered)
         else:
-            map_result = self._runJob_distributed(rdd, func, partitions)
-
-        result = (resultHandler(map_result) if resultHandler is not None
-                  else list(map_result))
-
-        # release lock
-        self.locked = False
-
-        return result
-
-    def _runJob_local(self, rdd, func, partitions):
+            tasks = self._runJob_distributed(rdd, func, partitions, stage_id, stats, ordered)
+        stage = StageMetrics(stage_id, job.job_id if job is not None else None, rdd.name())
+        return self._measure_stage(tasks, stage, job, rdd.id())
+
+    def _measure_stage(self, tasks, stage, job, rdd_id):
+        """Collect the metrics and profiles of the tasks of a stage and post
+        its events.
+
+        :param tasks: iterator over the results, metrics and profiles of the
+            tasks
+        :param int rdd_id: id of the RDD computed by the stage
+        :returns: an iterator over the results of the tasks
+        """
+        self._post('on_stage_submitted', stage)
+        stage.start()
+        try:
+            for result, task, profile in tasks:
+                stage.add_task(task)
+                self._post('on_task_end', task)
+                if profile is not None:
+                    self._profiler_collector.add(rdd_id, profile)
+                yield result
+        except Exception:
+            stage.succeeded = False
+            raise
+        finally:
+            # a stage stopped early, e.g. by take(), did not fail
+            stage.succeeded = stage.succeeded is None
+            stage.stop()
+            self._post('on_stage_completed', stage)
+            if job is not None:
+                with self._listener_lock:
+                    job.add_stage(stage)
+
+    def _runJob_local(self, rdd, func, partitions, stage_id):
+        # tasks are only measured for listeners
+        measured = bool(self._listeners)
         for partition in partitions:
+            self._check_cancelled()
             task_context = TaskContext(
                 cache_manager=self._cache_manager,
                 catch_exceptions=self._catch_exceptions,
-                stage_id=0,
+                stage_id=stage_id,
                 partition_id=partition.index,
                 max_retries=self.max_retries,
                 retry_wait=self.retry_wait,
+                metrics=TaskMetrics(stage_id, partition.index, enabled=measured),
+                profiler_cls=self._profiler_cls,
             )
-            yield _run_task(task_context, rdd, func, partition)
+            self._post('on_task_start', task_context.metrics)
+            result, profile = _run_profiled_task(task_context, rdd, func, partition)
+            yield result, task_context.metrics, profile
 
-    def _runJob_distributed(self, rdd, func, partitions):
+    def _runJob_distributed(self, rdd, func, partitions, stage_id, stats,  # pylint: disable=too-many-locals
+                            ordered):
         serialized_func_rdd = self._serializer((func, rdd))
+        measured = bool(self._listeners)
 
         def prepare(partition):
+            self._check_cancelled()
+
             t_start = time.perf_counter()
             cm_clone = self._cache_manager.clone_contains(
                 lambda i: i[1] == partition.index)
-            self._stats['driver_cache_clone'] += time.perf_counter() - t_start
+            stats['driver_cache_clone'] += time.perf_counter() - t_start
 
             t_start = time.perf_counter()
             task_context = TaskContext(
                 cache_manager=cm_clone,
                 catch_exceptions=self._catch_exceptions,
-                stage_id=0,
+                stage_id=stage_id,
                 partition_id=partition.index,
                 max_retries=self.max_retries,
                 retry_wait=self.retry_wait,
+                metrics=TaskMetrics(stage_id, partition.index, enabled=measured),
+                profiler_cls=self._profiler_cls,
             )
             serialized_task_context = self._serializer(task_context)
-            self._stats['driver_serialize_task_context'] += time.perf_counter() - t_start
+            stats['driver_serialize_task_context'] += time.perf_counter() - t_start
+            self._post('on_task_start', task_context.metrics)
 
             t_start = time.perf_counter()
-            serialized_partition = self._data_deserializer(partition)
-            self._stats['driver_serialize_data'] += time.perf_counter() - t_start
+            serialized_partition = self._data_serializer(partition)
+            stats['driver_serialize_data'] += time.perf_counter() - t_start
 
             return (
                 self._deserializer,
@@ -351,22 +699,147 @@ class Context:
                 serialized_partition,
             )
 
-        prepared_partitions = (prepare(p) for p in partitions)
-        for d in self._pool.map(runJob_map, prepared_partitions):
-            t_start = time.perf_counter()
-            map_result, cache_result, s = self._data_deserializer(d)
-            self._stats['driver_deserialize_data'] += time.perf_counter() - t_start
+        prepared_partitions = []
+        results = iter(())
+        try:
+            for partition in partitions:
+                prepared_partitions.append(prepare(partition))
+            if not ordered and hasattr(self._pool, 'imap_unordered'):
+                results = iter(self._pool.imap_unordered(runJob_map, prepared_partitions))
+            else:
+                results = iter(self._pool.map(runJob_map, prepared_partitions))
+            for d in results:
+                t_start = time.perf_counter()
+                map_result, cache_result, s, task_metrics, profile = self._data_deserializer(d)
+                stats['driver_deserialize_data'] += time.perf_counter() - t_start
+                task_metrics.bytes_serialized += serialized_size(d)
+
+                # join cache
+                t_start = time.perf_counter()
+                self._cache_manager.join(cache_result)
+                stats['driver_cache_join'] += time.perf_counter() - t_start
+
+                # collect stats
+                for k, v in s.items():
+                    stats[k] += v
+
+                yield map_result, task_metrics, profile
+        except BaseException:
+            # when the job fails or is stopped early, the data that is not
+            # loaded is released, the partitions once their tasks are done
+            _release_results(results)
+            for prepared_partition in prepared_partitions:
+                shared_memory.release(prepared_partition[-1])
+            raise
+
+    def _runJob_resident(self, rdd, func, partitions, stage_id, stats,  # pylint: disable=too-many-locals
+                         ordered):
+        """Run tasks in a ProcessPool whose workers keep cached partitions.
+
+        Tasks computing a partition that is cached in a worker are sent to
+        that worker, only the locations of cached partitions are kept in
+        the driver. The serialized function and RDD are sent once to every
+        worker as the payload of the tasks.
+        """
+        serialized_func_rdd = self._serializer((func, rdd))
+        # the pool hashes payloads, they need to be bytes
+        payload = serialized_func_rdd if isinstance(serialized_func_rdd, bytes) else None
+        payload_key = payload_key_of(payload) if payload is not None else None
+        # the cache manager sent to the workers only has the configuration
+        task_cache_manager = self._cache_manager.clone_contains(lambda i: False)
+        measured = bool(self._listeners)
+
+        serialized_partitions = []
+
+        def submit(partition):
+            self._check_cancelled()
 
-            # join cache
             t_start = time.perf_counter()
-            self._cache_manager.join(cache_result)
-            self._stats['driver_cache_join'] += time.perf_counter() - t_start
+            task_context = TaskContext(
+                cache_manager=task_cache_manager,
+                catch_exceptions=self._catch_exceptions,
+                stage_id=stage_id,
+                partition_id=partition.index,
+                max_retries=self.max_retries,
+                retry_wait=self.retry_wait,
+                metrics=TaskMetrics(stage_id, partition.index, enabled=measured),
+                profiler_cls=self._profiler_cls,
+            )
+            serialized_task_context = self._serializer(task_context)
+            stats['driver_serialize_task_context'] += time.perf_counter() - t_start
+            self._post('on_task_start', task_context.metrics)
 
-            # collect stats
-            for k, v in s.items():
-                self._stats[k] += v
+            t_start = time.perf_counter()
+            serialized_partition = self._data_serializer(partition)
+            serialized_partitions.append(serialized_partition)
+            stats['driver_serialize_data'] += time.perf_counter() - t_start
 
-            yield map_result
+            worker = self._block_worker(persisted_blocks(rdd, partition))
+            return self._pool.submit(runJob_map_resident, (
+                self._deserializer,
+                self._data_serializer,
+                self._data_deserializer,
+                serialized_func_rdd if payload is None else None,
+                serialized_task_context,
+                serialized_partition,
+            ), worker=worker, payload=payload, payload_key=payload_key)
+
+        futures = []
+        loaded = set()
+        try:
+            for partition in partitions:
+                futures.append(submit(partition))
+
+            for future in (futures if ordered else as_completed(futures)):
+                d = future.result()
+                loaded.add(future)
+                t_start = time.perf_counter()
+                map_result, cache_changes, s, task_metrics, profile = self._data_deserializer(d)
+                stats['driver_deserialize_data'] += time.perf_counter() - t_start
+                task_metrics.bytes_serialized += serialized_size(d)
+
+                self._register_blocks(future.worker, *cache_changes)
+                for k, v in s.items():
+                    stats[k] += v
+
+                yield map_result, task_metrics, profile
+        except BaseException:
+            # when the job fails or is stopped early, the data that is not
+            # loaded is released once the tasks that are still running are done
+            for serialized_partition in serialized_partitions[len(futures):]:
+                shared_memory.release(serialized_partition)
+            for future, serialized_partition in zip(futures, serialized_partitions):
+                if future not in loaded:
+                    future.add_done_callback(functools.partial(_release_task_data, serialized_partition))
+            raise
+
+    def _register_blocks(self, worker, added, removed):
+        """Update the locations of the partitions cached by a worker."""
+        with self._block_locations_lock:
+            for ident in removed:
+                workers = self._block_locations.get(ident)
+                if workers is not None:
+                    workers.discard(worker)
+                    if not workers:
+                        del self._block_locations[ident]
+            for ident in added:
+                self._block_locations.setdefault(ident, set()).add(worker)
+
+    def _block_worker(self, idents):
+        """Worker holding most of the given cached partitions.
+
+        :param list idents: partitions read by a task, see
+            :func:`~pysparkling.scheduler.persisted_blocks`
+        :returns: a worker id or None if none of the partitions is cached
+        """
+        counts = defaultdict(int)
+        with self._block_locations_lock:
+            for ident in idents:
+                for worker in self._block_locations.get(ident, ()):
+                    counts[worker] += 1
+        if not counts:
+            return None
+        return min(counts, key=lambda worker: (-counts[worker], worker))
 
     def binaryFiles(self, path, minPartitions=None):
         """Read a binary file into an RDD.
@@ -520,15 +993,17 @@ class Context:
     def union(self, rdds):
         """Create a union of rdds.
 
+        The partitions of the union are the partitions of the rdds one
+        after the other, they are only computed by actions on the union.
+
         :param rdds: Iterable of RDDs.
         :rtype: RDD
         """
+        rdds = list(rdds)
         if all(isinstance(rdd, EmptyRDD) for rdd in rdds):
             return EmptyRDD(self)
 
-        return self.parallelize(
-            (x for rdd in rdds for x in rdd.collect())
-        )
+        return UnionRDD(rdds)
 
     def wholeTextFiles(self, path, minPartitions=None, use_unicode=True):
         """Read text files into an RDD of pairs of file name and file content.
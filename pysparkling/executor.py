@@ -0,0 +1,305 @@
+"""Pool of persistent worker processes."""
+from collections import OrderedDict
+from concurrent.futures import as_completed, Future
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import pickle
+import threading
+import traceback
+
+try:
+    from multiprocessing import resource_tracker
+except ImportError:  # Python < 3.8
+    resource_tracker = None
+
+log = logging.getLogger(__name__)
+
+# id of the worker when running in a worker process of a ProcessPool
+WORKER_ID = None
+
+# number of payloads kept by every worker
+MAX_PAYLOADS = 32
+
+
+class Payload:
+    """Data shared by several tasks, sent once to every worker.
+
+    :param str key: hash of the data
+    :param bytes data: the data
+    """
+
+    def __init__(self, key, data):
+        self.key = key
+        self.data = data
+        # can be set by the tasks to keep a value computed from data,
+        # e.g. the deserialized data
+        self.value = None
+
+    def __getstate__(self):
+        return {'key': self.key, 'data': self.data, 'value': None}
+
+
+class RemoteTraceback(Exception):
+    """Exception raised in a worker that could not be pickled."""
+
+
+class ProcessPool:
+    """Pool of persistent worker processes.
+
+    Unlike :class:`multiprocessing.Pool`, tasks can be sent to a given worker
+    with :func:`submit`. The workers keep their state between tasks and jobs,
+    which is how a :class:`~pysparkling.Context` using this pool keeps cached
+    partitions in the worker that computed them.
+
+    Data shared by the tasks, like the pickled function and lineage of a
+    job, can be passed as a payload. It is sent once to every worker, which
+    keeps the last payloads it received.
+
+    It can also be used like other pools with :func:`map` and
+    :func:`imap_unordered`.
+
+    If a worker terminates abruptly, e.g. when killed, the pool is broken:
+    the pending tasks fail with a
+    :class:`~concurrent.futures.process.BrokenProcessPool` error, and so do
+    the tasks submitted afterwards.
+
+    :param int processes: number of workers, the number of CPUs by default
+    :param mp_context: (optional) multiprocessing context used to start the
+        workers
+    """
+
+    def __init__(self, processes=None, mp_context=None):
+        if mp_context is None:
+            mp_context = multiprocessing.get_context()
+        self.processes = processes or mp_context.cpu_count()
+
+        if os.name == 'posix' and resource_tracker is not None:
+            # the workers share the resource tracker of this process, which
+            # is needed to pass shared memory blocks between them and the
+            # driver, see pysparkling.shared_memory
+            resource_tracker.ensure_running()
+
+        self._task_queues = [mp_context.SimpleQueue() for _ in range(self.processes)]
+        self._result_queue = mp_context.SimpleQueue()
+        self._workers = [
+            mp_context.Process(target=worker_loop,
+                               args=(worker_id, task_queue, self._result_queue),
+                               daemon=True)
+            for worker_id, task_queue in enumerate(self._task_queues)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+        self._lock = threading.Lock()
+        # a task is queued without holding _lock, the result handler would
+        # otherwise wait for a worker blocked by a full result queue
+        self._queue_locks = [threading.Lock() for _ in range(self.processes)]
+        self._task_ids = itertools.count()
+        self._pending = {}
+        self._pending_per_worker = [0] * self.processes
+        # keys of the payloads kept by every worker, from the least to the
+        # most recently used, updated in the order of the tasks of the worker
+        self._payload_keys = [OrderedDict() for _ in range(self.processes)]
+        self._closed = False
+        # message of the BrokenProcessPool errors once a worker terminated
+        self._broken = None
+        self._result_handler = threading.Thread(target=self._handle_results,
+                                                name='pysparkling-results', daemon=True)
+        self._result_handler.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def submit(self, f, arg, worker=None, payload=None, payload_key=None):
+        """Run ``f(arg)`` or ``f(arg, payload)`` in a worker.
+
+        :param f: a picklable function
+        :param arg: a picklable argument
+        :param int worker: (optional) id of the worker running the task, the
+            worker with the fewest pending tasks by default
+        :param bytes payload: (optional) data passed to f as a
+            :class:`Payload`, only sent if the worker does not have it yet
+        :param str payload_key: (optional) key identifying the payload,
+            computed from it by default. Pass the key returned by
+            :func:`payload_key_of` to hash a payload shared by many tasks
+            only once.
+        :returns: a future of the result, its ``worker`` attribute is the id
+            of the worker running the task
+        :rtype: concurrent.futures.Future
+        """
+        future = Future()
+        # unpickled by the worker when it runs the task, a task that cannot
+        # be unpickled fails like a task raising an exception
+        task = pickle.dumps((f, arg), protocol=pickle.HIGHEST_PROTOCOL)
+        if payload is not None and payload_key is None:
+            payload_key = payload_key_of(payload)
+        with self._lock:
+            if self._closed:
+                raise ValueError('Pool is closed')
+            if self._broken is not None:
+                raise BrokenProcessPool(self._broken)
+            if worker is None:
+                worker = min(range(self.processes), key=self._pending_per_worker.__getitem__)
+            task_id = next(self._task_ids)
+            future.worker = worker
+            self._pending[task_id] = future
+            self._pending_per_worker[worker] += 1
+
+        # tasks are queued with the lock of the worker so that the payloads
+        # kept by the worker are updated in the same order here and there
+        with self._queue_locks[worker]:
+            if self._closed:
+                with self._lock:
+                    del self._pending[task_id]
+                    self._pending_per_worker[worker] -= 1
+                raise ValueError('Pool is closed')
+            if payload_key is not None and update_payload_keys(self._payload_keys[worker], payload_key):
+                payload = None
+            self._task_queues[worker].put((task_id, payload_key, payload, task))
+        return future
+
+    def map(self, f, iterable):
+        """Apply f to every element of iterable in the workers.
+
+        :returns: the results in the order of iterable
+        :rtype: list
+        """
+        return [future.result() for future in [self.submit(f, x) for x in iterable]]
+
+    def imap_unordered(self, f, iterable):
+        """Apply f to every element of iterable in the workers.
+
+        :returns: an iterator over the results in the order in which they
+            are computed
+        """
+        for future in as_completed([self.submit(f, x) for x in iterable]):
+            yield future.result()
+
+    def _handle_results(self):
+        reader = self._result_queue._reader  # pylint: disable=protected-access
+        sentinels = {worker.sentinel: worker_id for worker_id, worker in enumerate(self._workers)}
+        while sentinels:
+            ready = multiprocessing.connection.wait([reader, *sentinels])
+            if reader in ready:
+                # the results of a worker are read before its termination
+                self._set_result(*self._result_queue.get())
+                continue
+
+            for sentinel in ready:
+                worker_id = sentinels.pop(sentinel)
+                with self._lock:
+                    terminated = not self._closed or self._pending_per_worker[worker_id]
+                if terminated:
+                    self._break(worker_id)
+                    return
+
+    def _set_result(self, task_id, succeeded, data):
+        try:
+            value = pickle.loads(data)
+        except Exception as e:  # pylint: disable=broad-except
+            succeeded, value = False, e
+        with self._lock:
+            future = self._pending.pop(task_id)
+            self._pending_per_worker[future.worker] -= 1
+        if succeeded:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+
+    def _break(self, worker_id):
+        """Fail the pending tasks after the termination of a worker."""
+        exitcode = self._workers[worker_id].exitcode
+        with self._lock:
+            self._broken = (f'Worker {worker_id} of the pool terminated abruptly '
+                            f'with exit code {exitcode}')
+            futures = list(self._pending.values())
+            self._pending.clear()
+            self._pending_per_worker = [0] * self.processes
+        log.error(self._broken)
+        for future in futures:
+            future.set_exception(BrokenProcessPool(self._broken))
+
+    def close(self):
+        """Stop the workers once their pending tasks are done."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for worker, task_queue, queue_lock in zip(self._workers, self._task_queues, self._queue_locks):
+            with queue_lock:
+                if self._broken is not None:
+                    # the pending tasks failed already and the workers may
+                    # wait for a lock held by the terminated worker
+                    worker.terminate()
+                elif worker.is_alive():
+                    task_queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._result_handler.join()
+
+    def shutdown(self):
+        self.close()
+
+
+def worker_loop(worker_id, task_queue, result_queue):
+    global WORKER_ID  # pylint: disable=global-statement
+    WORKER_ID = worker_id
+
+    payloads = OrderedDict()
+    while True:
+        task = task_queue.get()
+        if task is None:
+            return
+        task_id, payload_key, payload_data, serialized_task = task
+        # the payload is kept even if the task fails, like in the driver
+        if payload_key is not None and not update_payload_keys(payloads, payload_key):
+            payloads[payload_key] = Payload(payload_key, payload_data)
+        try:
+            f, arg = pickle.loads(serialized_task)
+            if payload_key is None:
+                succeeded, value = True, f(arg)
+            else:
+                succeeded, value = True, f(arg, payloads[payload_key])
+        except BaseException as e:  # pylint: disable=broad-except
+            succeeded, value = False, e
+        try:
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:  # pylint: disable=broad-except
+            # the result or the exception could not be pickled
+            succeeded, data = False, pickle.dumps(RemoteTraceback(traceback.format_exc()))
+        result_queue.put((task_id, succeeded, data))
+
+
+def payload_key_of(payload):
+    """Key identifying a payload in the workers.
+
+    :param bytes payload: the payload
+    :rtype: str
+    """
+    return hashlib.sha1(payload).hexdigest()
+
+
+def update_payload_keys(payloads, key):
+    """Mark a payload as the most recently used one.
+
+    The least recently used payloads are removed to keep at most
+    ``MAX_PAYLOADS`` of them.
+
+    :param OrderedDict payloads: payloads by key
+    :returns: whether the payload was already there
+    """
+    if key in payloads:
+        payloads.move_to_end(key)
+        return True
+    payloads[key] = None
+    while len(payloads) > MAX_PAYLOADS:
+        payloads.popitem(last=False)
+    return False
@@ -0,0 +1,51 @@
+"""Futures of asynchronous actions."""
+import asyncio
+from concurrent.futures import Future
+import threading
+
+
+class FutureAction(Future):
+    """Future of an action that runs in the background.
+
+    In addition to cancelling an action that did not start yet, ``cancel()``
+    stops a running action before the computation of its next partition.
+    The action then fails with a
+    :class:`concurrent.futures.CancelledError`.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.cancel_requested = threading.Event()
+
+    def cancel(self):
+        self.cancel_requested.set()
+        return super().cancel()
+
+
+def as_awaitable(future):
+    """Wrap future in an asyncio future when called from an event loop.
+
+    :param concurrent.futures.Future future: a future
+    :returns: an awaitable if an event loop is running in this thread,
+        future otherwise
+    """
+    loop = running_loop()
+    if loop is None:
+        return future
+    return asyncio.wrap_future(future, loop=loop)
+
+
+def running_loop():
+    """The event loop running in this thread or None."""
+    if hasattr(asyncio, 'get_running_loop'):
+        try:
+            return asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+
+    # Python 3.6
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        return None
+    return loop if loop.is_running() else None
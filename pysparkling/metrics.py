@@ -0,0 +1,370 @@
+"""Metrics of jobs, stages and tasks and listeners of their events.
+
+Every task measures itself in the process running it. The driver adds the
+sizes of the serialized task and result, sums the metrics of the tasks into
+their stage and job, and posts events to the listeners added with
+:func:`~pysparkling.Context.addListener`:
+
+>>> from pysparkling import Context
+>>> class PrintTasks(Listener):
+...     def on_task_end(self, task):
+...         print(task.partition_id, task.records_read, task.records_written)
+>>> sc = Context()
+>>> sc.addListener(PrintTasks())
+>>> sc.parallelize(range(5), 2).filter(lambda x: x % 2).collect()
+0 2 1
+1 3 1
+[1, 3]
+"""
+from itertools import chain, count
+import json
+from operator import itemgetter
+import os
+import sys
+import threading
+import time
+import types
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# CPU time of the current thread, of the whole process before Python 3.7
+thread_time = getattr(time, 'thread_time', time.process_time)
+
+# iterables whose records are counted, other objects computed for a
+# partition are passed on as they are, e.g. the StringIO of saveAsTextFile()
+COUNTED_TYPES = (list, tuple, types.GeneratorType, map, filter, zip, chain)
+
+
+class Metrics:
+    """Metrics measured for jobs, stages and tasks.
+
+    Times are in seconds and sizes in bytes. ``launch_time`` and
+    ``end_time`` are timestamps and ``wall_time`` is the time between them.
+    ``peak_memory`` is the highest peak memory of the processes running the
+    tasks when it can be measured.
+    """
+
+    def __init__(self):
+        self.launch_time = None
+        self.end_time = None
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.records_read = 0
+        self.records_written = 0
+        self.bytes_serialized = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.retries = 0
+        self.peak_memory = None
+        self._t_start = None
+
+    def to_dict(self):
+        return {k: v for k, v in self.__dict__.items() if not k.startswith('_')}
+
+    def start(self):
+        self.launch_time = time.time()
+        self._t_start = time.perf_counter()
+
+    def stop(self):
+        self.end_time = time.time()
+        self.wall_time = time.perf_counter() - self._t_start
+
+
+class TaskMetrics(Metrics):
+    """Metrics of a task.
+
+    ``records_read`` are the records read from source partitions, shuffle
+    outputs and the cache. ``records_written`` are the records passed to
+    the function of the stage, e.g. written to the shuffle by a shuffle map
+    stage. ``retries`` is the number of failed attempts.
+
+    :param int stage_id: id of the stage of the task
+    :param int partition_id: index of the partition computed by the task
+    :param bool enabled: whether the task is measured, the records are
+        only counted when it is
+    """
+
+    def __init__(self, stage_id, partition_id, enabled=True):
+        super().__init__()
+        self.stage_id = stage_id
+        self.partition_id = partition_id
+        self.enabled = enabled
+        self.pid = None
+        self.thread_id = None
+        self._cpu_start = None
+        self._read_counters = []
+        self._written_counter = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.update(_read_counters=[], _written_counter=None)
+        return state
+
+    def start(self):
+        super().start()
+        self.pid = os.getpid()
+        self.thread_id = threading.get_ident()
+        self._cpu_start = thread_time()
+
+    def stop(self):
+        super().stop()
+        self.cpu_time = thread_time() - self._cpu_start
+        self.records_read = sum(next(c) for c in self._read_counters)
+        if self._written_counter is not None:
+            self.records_written = next(self._written_counter)
+        self._read_counters, self._written_counter = [], None
+        self.peak_memory = peak_memory()
+
+    def measure(self):
+        """Context manager measuring the task."""
+        return MeasuredTask(self) if self.enabled else NOT_MEASURED
+
+    def start_attempt(self, attempt_number):
+        """Discard what was counted by the failed attempts."""
+        self.retries = attempt_number - 1
+        self.cache_hits = self.cache_misses = 0
+        self._read_counters, self._written_counter = [], None
+
+    def count_read(self, iterable):
+        """Count the records of iterable as read when they are consumed."""
+        if not self.enabled or not isinstance(iterable, COUNTED_TYPES):
+            return iterable
+        counter = count()
+        self._read_counters.append(counter)
+        return map(itemgetter(0), zip(iterable, counter))
+
+    def count_written(self, iterable):
+        """Count the records of iterable as written when they are consumed."""
+        if not self.enabled or not isinstance(iterable, COUNTED_TYPES):
+            return iterable
+        self._written_counter = count()
+        return map(itemgetter(0), zip(iterable, self._written_counter))
+
+
+class MeasuredTask:
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def __enter__(self):
+        self.metrics.start()
+        return self.metrics
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.metrics.stop()
+
+
+class NotMeasured:
+    """Context manager of a task that is not measured."""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+NOT_MEASURED = NotMeasured()
+
+
+class AggregatedMetrics(Metrics):
+    """Metrics of a stage or a job.
+
+    The metrics of the completed tasks are summed, ``task_time`` is the sum
+    of their wall times and ``num_tasks`` their number.
+    """
+
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+        self.num_tasks = 0
+        self.task_time = 0.0
+        self.succeeded = None
+
+    def add(self, metrics, num_tasks, task_time):
+        self.num_tasks += num_tasks
+        self.task_time += task_time
+        self.cpu_time += metrics.cpu_time
+        self.records_read += metrics.records_read
+        self.records_written += metrics.records_written
+        self.bytes_serialized += metrics.bytes_serialized
+        self.cache_hits += metrics.cache_hits
+        self.cache_misses += metrics.cache_misses
+        self.retries += metrics.retries
+        if metrics.peak_memory is not None:
+            self.peak_memory = max(self.peak_memory or 0, metrics.peak_memory)
+
+
+class StageMetrics(AggregatedMetrics):
+    """Metrics of a stage.
+
+    :param int stage_id: id of the stage
+    :param int job_id: id of the job running the stage
+    :param str name: name of the RDD computed by the stage
+    """
+
+    def __init__(self, stage_id, job_id, name):
+        super().__init__(name)
+        self.stage_id = stage_id
+        self.job_id = job_id
+
+    def add_task(self, task):
+        self.add(task, 1, task.wall_time)
+
+
+class JobMetrics(AggregatedMetrics):
+    """Metrics of a job.
+
+    :param int job_id: id of the job
+    :param str name: name of the RDD computed by the job
+    """
+
+    def __init__(self, job_id, name):
+        super().__init__(name)
+        self.job_id = job_id
+        self.stage_ids = []
+
+    def add_stage(self, stage):
+        self.stage_ids.append(stage.stage_id)
+        self.add(stage, stage.num_tasks, stage.task_time)
+
+
+class Listener:
+    """Interface of the listeners of the events of a
+    :class:`~pysparkling.Context`.
+
+    The methods are called with the metrics of the job, stage or task. They
+    are not called concurrently but possibly from different threads.
+    Exceptions raised by listeners are logged and ignored.
+    """
+
+    def on_job_start(self, job):
+        """:param JobMetrics job: the job, only with its id and name"""
+
+    def on_job_end(self, job):
+        """:param JobMetrics job: the job"""
+
+    def on_stage_submitted(self, stage):
+        """:param StageMetrics stage: the stage, only with its ids and name"""
+
+    def on_stage_completed(self, stage):
+        """:param StageMetrics stage: the stage"""
+
+    def on_task_start(self, task):
+        """:param TaskMetrics task: the task, only with its ids"""
+
+    def on_task_end(self, task):
+        """:param TaskMetrics task: the task"""
+
+
+class JsonLinesExporter(Listener):
+    """Write every event as a line of JSON.
+
+    The lines are the metrics with the name of the listener method as
+    ``event``, e.g. ``{"event": "on_task_end", "stage_id": 1, ...}``.
+
+    :param file: a path or a text file
+    """
+
+    def __init__(self, file):
+        self._close_file = isinstance(file, str)
+        self.file = (open(file, 'w', encoding='utf8')  # pylint: disable=consider-using-with
+                     if self._close_file else file)
+
+    def write(self, event, metrics):
+        self.file.write(json.dumps({'event': event, **metrics.to_dict()}) + '\n')
+
+    def close(self):
+        if self._close_file:
+            self.file.close()
+
+    def on_job_start(self, job):
+        self.write('on_job_start', job)
+
+    def on_job_end(self, job):
+        self.write('on_job_end', job)
+        self.file.flush()
+
+    def on_stage_submitted(self, stage):
+        self.write('on_stage_submitted', stage)
+
+    def on_stage_completed(self, stage):
+        self.write('on_stage_completed', stage)
+
+    def on_task_start(self, task):
+        self.write('on_task_start', task)
+
+    def on_task_end(self, task):
+        self.write('on_task_end', task)
+
+
+class ChromeTraceExporter(Listener):
+    """Collect jobs, stages and tasks as events of the Chrome trace format.
+
+    The file written by :func:`write` can be opened with ``chrome://tracing``
+    or https://ui.perfetto.dev. Tasks are shown in the process and thread
+    that ran them, jobs and their stages in one lane per job of the driver.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.driver_pid = os.getpid()
+
+    def add_event(self, name, category, metrics, pid, tid):
+        self.events.append({
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': metrics.launch_time * 1e6,
+            'dur': metrics.wall_time * 1e6,
+            'pid': pid,
+            'tid': tid,
+            'args': metrics.to_dict(),
+        })
+
+    def write(self, file):
+        """Write the trace.
+
+        :param file: a path or a text file
+        """
+        if isinstance(file, str):
+            with open(file, 'w', encoding='utf8') as f:
+                self.write(f)
+            return
+        json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, file)
+
+    def on_job_end(self, job):
+        self.events.append({'name': 'thread_name', 'ph': 'M', 'pid': self.driver_pid,
+                            'tid': job.job_id, 'args': {'name': f'job {job.job_id}'}})
+        self.add_event(f'job {job.job_id}: {job.name}', 'job', job, self.driver_pid, job.job_id)
+
+    def on_stage_completed(self, stage):
+        self.add_event(f'stage {stage.stage_id}: {stage.name}', 'stage', stage,
+                       self.driver_pid, stage.job_id)
+
+    def on_task_end(self, task):
+        self.add_event(f'stage {task.stage_id} partition {task.partition_id}', 'task', task,
+                       task.pid, task.thread_id)
+
+
+def serialized_size(data):
+    """Size of the output of a serializer, 0 if it is not bytes."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return len(data)
+    # only needed with the shared memory transport
+    # pylint: disable=import-outside-toplevel
+    from .shared_memory import SharedBuffers
+    if isinstance(data, SharedBuffers):
+        return len(data.data) + sum(data.sizes)
+    return 0
+
+
+def peak_memory():
+    """Peak memory of this process in bytes or None if not available."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes except on macOS
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
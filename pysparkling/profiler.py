@@ -0,0 +1,197 @@
+"""Profiling of tasks.
+
+A :class:`~pysparkling.Context` created with ``profile=True`` runs every
+task under a profiler, in the driver or in the worker running the task. The
+stats of the tasks are sent back with their results and merged per RDD
+computed by their stage:
+
+>>> from pysparkling import Context
+>>> sc = Context(profile=True)
+>>> sc.parallelize(range(1000), 4).map(str).count()
+1000
+>>> sc.show_profiles()  # doctest: +ELLIPSIS
+============================================================
+Profile of RDD<id=...>
+============================================================
+...
+"""
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class Profiler:
+    """Profiler of a task.
+
+    A new instance profiles every task. The stats are in the format of the
+    ``stats`` attribute of :class:`pstats.Stats` so that they can be pickled
+    and merged.
+    """
+
+    def profile(self, func, *args):
+        """Call ``func(*args)`` under the profiler.
+
+        :returns: the result of func
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        """Stats of the profiled calls.
+
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+
+class BasicProfiler(Profiler):
+    """Deterministic profiler using :mod:`cProfile`."""
+
+    def __init__(self):
+        self._profiler = cProfile.Profile()
+
+    def profile(self, func, *args):
+        try:
+            self._profiler.enable()
+        except ValueError:
+            # since Python 3.12, only one profiler can be active in a
+            # process, e.g. not for tasks of concurrent jobs in the driver
+            log.warning('Task not profiled, another profiler is active.')
+            return func(*args)
+        try:
+            return func(*args)
+        finally:
+            self._profiler.disable()
+
+    def stats(self):
+        self._profiler.create_stats()
+        return self._profiler.stats
+
+
+class SamplingProfiler(Profiler):
+    """Statistical profiler sampling the stack of the task.
+
+    A thread samples the stack of the thread running the task every
+    ``interval`` seconds, or less often if the task does not release the
+    GIL for :func:`sys.getswitchinterval` seconds. The times in the stats
+    are estimated from the number of samples in which a function is running
+    (``tottime``) or on the stack (``cumtime``). The number of calls is the
+    number of samples. The overhead does not depend on the number of
+    function calls, which makes it suitable for tasks calling many small
+    functions.
+
+    :param float interval: seconds between samples
+    """
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self._stats = {}
+
+    def profile(self, func, *args):
+        done = threading.Event()
+        # the frames of the callers of the task are not sampled
+        root = sys._getframe()  # pylint: disable=protected-access
+        sampler = threading.Thread(target=self._sample, args=(threading.get_ident(), root, done),
+                                   name='pysparkling-sampler', daemon=True)
+        sampler.start()
+        try:
+            return func(*args)
+        finally:
+            done.set()
+            sampler.join()
+
+    def stats(self):
+        return {f: (cc, nc, tt, ct, dict(callers))
+                for f, (cc, nc, tt, ct, callers) in self._stats.items()}
+
+    def _sample(self, thread_id, root, done):
+        t_last = time.perf_counter()
+        while not done.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)  # pylint: disable=protected-access
+            t_now = time.perf_counter()
+            # done is set before the task waits for this thread
+            if done.is_set():
+                return
+            if frame is not None and frame is not root:
+                self._add_stack(frame, root, t_now - t_last)
+            t_last = t_now
+
+    def _add_stack(self, frame, root, elapsed):
+        on_stack = set()
+        leaf = True
+        while frame is not root and frame is not None:
+            function = code_label(frame.f_code)
+            cc, nc, tt, ct, callers = self._stats.get(function, (0, 0, 0.0, 0.0, {}))
+            if leaf:
+                tt += elapsed
+            # a recursive function is counted once per sample
+            if function not in on_stack:
+                on_stack.add(function)
+                cc, nc, ct = cc + 1, nc + 1, ct + elapsed
+            if frame.f_back is not root:
+                add_caller(callers, code_label(frame.f_back.f_code), elapsed if leaf else 0.0, elapsed)
+            self._stats[function] = (cc, nc, tt, ct, callers)
+            leaf = False
+            frame = frame.f_back
+
+
+class ProfilerCollector:
+    """Merged stats of the profiled tasks per RDD."""
+
+    def __init__(self):
+        self.profiles = {}
+        self._lock = threading.Lock()
+
+    def add(self, rdd_id, stats):
+        """Merge the stats of a task computing a partition of an RDD.
+
+        :param int rdd_id: id of the RDD
+        :param dict stats: stats returned by :func:`Profiler.stats`
+        """
+        with self._lock:
+            if rdd_id in self.profiles:
+                self.profiles[rdd_id].add(RawStats(stats))
+            else:
+                self.profiles[rdd_id] = pstats.Stats(RawStats(stats))
+
+    def show_profiles(self):
+        with self._lock:
+            for rdd_id, stats in sorted(self.profiles.items()):
+                print('=' * 60)
+                print(f'Profile of RDD<id={rdd_id}>')
+                print('=' * 60)
+                stats.stream = sys.stdout
+                stats.sort_stats('time', 'cumulative').print_stats()
+
+    def dump_profiles(self, path):
+        """Write the stats of every RDD to ``rdd_<id>.pstats`` in path."""
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            for rdd_id, stats in self.profiles.items():
+                stats.dump_stats(os.path.join(path, f'rdd_{rdd_id}.pstats'))
+
+
+class RawStats:
+    """Stats in the format of :class:`pstats.Stats` that it can load."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def code_label(code):
+    """Key of a function in the stats, like in the stats of cProfile."""
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+def add_caller(callers, caller, tt, ct):
+    """Add a sample to the times of a function spent in a call by caller."""
+    nc, cc, caller_tt, caller_ct = callers.get(caller, (0, 0, 0.0, 0.0))
+    callers[caller] = (nc + 1, cc + 1, caller_tt + tt, caller_ct + ct)
@@ -1,8 +1,10 @@
 """Provides a Python implementation of RDDs."""
+import bisect
 from builtins import range, zip
 from collections import defaultdict
 import copy
 import functools
+import heapq
 import io
 import itertools
 import logging
@@ -13,6 +15,8 @@ import pickle
 import random
 import subprocess
 import sys
+import threading
+import weakref
 
 try:
     import numpy
@@ -20,10 +24,12 @@ except ImportError:
     numpy = None
 
 from . import fileio
-from .exceptions import ContextIsLockedException, FileAlreadyExistsException
+from .exceptions import FileAlreadyExistsException
+from .partition import Partition
 from .samplers import BernoulliSampler, BernoulliSamplerPerKey, PoissonSampler, PoissonSamplerPerKey
+from .sql.internal_utils.joins import FULL_JOIN, INNER_JOIN, LEFT_ANTI_JOIN, LEFT_JOIN, LEFT_SEMI_JOIN, RIGHT_JOIN
 from .stat_counter import StatCounter
-from .utils import portable_hash
+from .utils import get_range_bounds, murmur3_hash, murmur3_partition_ids, MURMUR3_SEED, portable_hash
 
 maxint = sys.maxint if hasattr(sys, 'maxint') else sys.maxsize  # pylint: disable=no-member
 
@@ -50,8 +56,6 @@ class RDD:
     """
 
     def __init__(self, partitions, ctx):
-        if ctx.locked:
-            raise ContextIsLockedException
         self._p = list(partitions)
         self.context = ctx
         self._name = None
@@ -67,7 +71,7 @@ class RDD:
 
         :param Partition split: a partition
         """
-        return split.x()
+        return task_context.metrics.count_read(split.x())
 
     def partitions(self):
         return self._p
@@ -126,7 +130,8 @@ class RDD:
         """
         return self.aggregate(zeroValue, seqOp, combOp)
 
-    def aggregateByKey(self, zeroValue, seqFunc, combFunc, numPartitions=None):
+    def aggregateByKey(self, zeroValue, seqFunc, combFunc, numPartitions=None,
+                       partitionFunc=None):
         """aggregate by key
 
         :param zeroValue:
@@ -142,7 +147,8 @@ class RDD:
             A reference to a function that combines outputs of seqFunc.
             In the first iteration, the current state is zeroValue.
 
-        :param int numPartitions: Not used.
+        :param int numPartitions: Number of partitions in the resulting RDD.
+        :param partitionFunc: (optional) Partition function.
 
         :returns: An RDD with the output of ``combOp`` operations.
         :rtype: RDD
@@ -160,23 +166,11 @@ class RDD:
         (4, 2)
         """
 
-        def seqFuncByKey(tc, i):
-            r = defaultdict(lambda: copy.deepcopy(zeroValue))
-            for k, v in i:
-                r[k] = seqFunc(r[k], v)
-            return r
-
-        def combFuncByKey(l):
-            r = defaultdict(lambda: copy.deepcopy(zeroValue))
-            for p in l:
-                for k, v in p.items():
-                    r[k] = combFunc(r[k], v)
-            return r
+        def createCombiner(v):
+            return seqFunc(copy.deepcopy(zeroValue), v)
 
-        local_result = self.context.runJob(self, seqFuncByKey,
-                                           resultHandler=combFuncByKey)
-
-        return self.context.parallelize(local_result.items())
+        return self.combineByKey(createCombiner, seqFunc, combFunc,
+                                 numPartitions, partitionFunc)
 
     def cache(self):
         """Once a partition is computed, cache the result.
@@ -235,13 +229,12 @@ class RDD:
     def cartesian(self, other):
         """cartesian product of this RDD with ``other``
 
+        Every pair of a partition of this RDD and a partition of ``other``
+        is a partition of the result.
+
         :param RDD other: Another RDD.
         :rtype: RDD
 
-        .. note::
-            This is currently implemented as a local operation requiring
-            all data to be pulled on one machine.
-
 
         Example:
 
@@ -250,21 +243,20 @@ class RDD:
         >>> sorted(rdd.cartesian(rdd).collect())
         [(1, 1), (1, 2), (2, 1), (2, 2)]
         """
-        v1 = self.toLocalIterator()
-        v2 = other.collect()
-        return self.context.parallelize([(a, b) for a in v1 for b in v2])
+        return CartesianRDD(self, other)
 
     def coalesce(self, numPartitions, shuffle=False):
         """coalesce
 
+        Without a shuffle, consecutive partitions are grouped and computed
+        one after the other in the same task.
+
         :param int numPartitions: Number of partitions in the resulting RDD.
-        :param shuffle: (optional) Not used.
+        :param shuffle: (optional) Whether to redistribute the data, which is
+            currently implemented as a local operation requiring all data to
+            be pulled on one machine.
         :rtype: RDD
 
-        .. note::
-            This is currently implemented as a local operation requiring
-            all data to be pulled on one machine.
-
 
         Example:
 
@@ -299,39 +291,44 @@ class RDD:
         if shuffle:
             return self.context.parallelize(self.toLocalIterator(), numPartitions)
 
-        current_num_partitions = self.getNumPartitions()
-        new_num_partitions = min(numPartitions, current_num_partitions)
+        return CoalescedRDD(self, numPartitions)
 
-        # Group partitions that will be coalesced together
-        # Note: as new_num_partitions may not divide current_num_partitions
-        # some groups are bigger (contains more partitions) than others
-        small_group_size = current_num_partitions // new_num_partitions
-        big_group_size = small_group_size + 1
+    def combineByKey(self, createCombiner, mergeValue, mergeCombiners,
+                     numPartitions=None, partitionFunc=None):
+        """combine values by key
 
-        number_of_big_groups = current_num_partitions % new_num_partitions
-        number_of_small_groups = new_num_partitions - number_of_big_groups
+        The values of every key are first combined within each partition.
+        Only the combiners are shuffled and merged in the partitions of the
+        resulting RDD.
 
-        partition_mapping = (
-            [p for p in range(number_of_big_groups) for _ in range(big_group_size)]
-            + [p for p in range(number_of_big_groups,
-                                number_of_big_groups + number_of_small_groups)
-               for _ in range(small_group_size)]
-        )
-        new_partitions = {i: [] for i in range(new_num_partitions)}
+        :param createCombiner: Creates a combiner from the first value of a key.
+        :param mergeValue: Merges a value into a combiner.
+        :param mergeCombiners: Merges two combiners.
+        :param int numPartitions: Number of partitions in the resulting RDD.
+        :param partitionFunc: (optional) Partition function.
+        :rtype: RDD
 
-        def partitioned():
-            def move_partition_content(partition_index, partition):
-                new_partitions[partition_mapping[partition_index]] += partition
-                return []
 
-            # trigger an evaluation with count
-            self.mapPartitionsWithIndex(move_partition_content).count()
+        Example:
 
-            for p in list(new_partitions.values()):
-                yield p
+        >>> from pysparkling import Context
+        >>> rdd = Context().parallelize([('a', 1), ('b', 2), ('a', 3)], 2)
+        >>> sorted(rdd.combineByKey(
+        ...     lambda v: [v],
+        ...     lambda c, v: c + [v],
+        ...     lambda c1, c2: c1 + c2,
+        ... ).collect())
+        [('a', [1, 3]), ('b', [2])]
+        """
+        if numPartitions is None:
+            numPartitions = self.getNumPartitions()
 
-        # noinspection PyProtectedMember
-        return self.context._parallelize_partitions(partitioned())
+        return (self
+                .mapPartitions(CombineByKey(createCombiner, mergeValue),
+                               preservesPartitioning=True)
+                .partitionBy(numPartitions, partitionFunc)
+                .mapPartitions(CombineByKey(lambda c: c, mergeCombiners),
+                               preservesPartitioning=True))
 
     def cogroup(self, other, numPartitions=None):
         """Groups keys from both RDDs together. Values are nested iterators.
@@ -354,12 +351,11 @@ class RDD:
         [('house', [[1], [3]]), ('tree', [[], [2]])]
         """
 
-        d_self = defaultdict(list, self.groupByKey().collect())
-        d_other = defaultdict(list, other.groupByKey().collect())
-        return self.context.parallelize([
-            (k, [list(d_self[k]), list(d_other[k])])
-            for k in set(d_self.keys()) | set(d_other.keys())
-        ])
+        return ZippedPartitionsRDD(
+            self._co_partition(other, numPartitions),
+            lambda tc, i, left, right: cogroup_partitions(left, right),
+            preservesPartitioning=True,
+        )
 
     def collect(self):
         """returns the entire dataset as a list
@@ -379,6 +375,25 @@ class RDD:
             resultHandler=unit_collect,
         )
 
+    def collectAsync(self):
+        """returns a future of the entire dataset as a list
+
+        The job runs in the background. The result is a
+        :class:`concurrent.futures.Future` or an asyncio future when called
+        from a running event loop. Cancelling it stops the job before its
+        next partition.
+
+        :rtype: concurrent.futures.Future
+
+
+        Example:
+
+        >>> from pysparkling import Context
+        >>> Context().parallelize([1, 2, 3]).collectAsync().result(timeout=10)
+        [1, 2, 3]
+        """
+        return self.context._submit_action(self.collect)
+
     def collectAsMap(self):
         """returns a dictionary for a pair dataset
 
@@ -407,7 +422,23 @@ class RDD:
         3
         """
         return self.context.runJob(self, lambda tc, i: sum(1 for _ in i),
-                                   resultHandler=sum)
+                                   resultHandler=sum, ordered=False)
+
+    def countAsync(self):
+        """returns a future of the number of entries in this dataset
+
+        See :func:`~pysparkling.RDD.collectAsync`.
+
+        :rtype: concurrent.futures.Future
+
+
+        Example:
+
+        >>> from pysparkling import Context
+        >>> Context().parallelize([1, 2, 3], 2).countAsync().result()
+        3
+        """
+        return self.context._submit_action(self.count)
 
     def countApprox(self):
         """same as :func:`~pysparkling.RDD.count()`
@@ -440,7 +471,11 @@ class RDD:
         ... ).countByKey()['b']
         2
         """
-        return self.map(lambda r: r[0]).countByValue()
+        return defaultdict(int, self.combineByKey(
+            lambda _: 1,
+            lambda c, _: c + 1,
+            lambda c1, c2: c1 + c2,
+        ).collect())
 
     def countByValue(self):
         """returns a `dict` containing the count for every value
@@ -467,6 +502,10 @@ class RDD:
     def distinct(self, numPartitions=None):
         """returns only distinct elements
 
+        Duplicates are removed within each partition, the remaining elements
+        are hash partitioned and duplicates are removed again within each
+        resulting partition.
+
         :param int numPartitions: Number of partitions in the resulting RDD.
         :rtype: RDD
 
@@ -481,8 +520,10 @@ class RDD:
         if numPartitions is None:
             numPartitions = self.getNumPartitions()
 
-        return self.context.parallelize(list(set(self.toLocalIterator())),
-                                        numPartitions)
+        return (self
+                .mapPartitions(unique_pairs, preservesPartitioning=True)
+                .partitionBy(numPartitions)
+                .mapPartitions(unique_keys, preservesPartitioning=True))
 
     def filter(self, f):
         """filter elements
@@ -501,7 +542,7 @@ class RDD:
         """
         return MapPartitionsRDD(
             self,
-            lambda tc, i, x: (xx for xx in x if f(xx)),
+            FilterF(f),
             preservesPartitioning=True,
         )
 
@@ -547,7 +588,7 @@ class RDD:
         """
         return MapPartitionsRDD(
             self,
-            lambda tc, i, x: (e for xx in x for e in f(xx)),
+            FlatMapF(f),
             preservesPartitioning=preservesPartitioning,
         )
 
@@ -568,7 +609,7 @@ class RDD:
         """
         return MapPartitionsRDD(
             self,
-            lambda tc, i, x: ((xx[0], e) for xx in x for e in f(xx[1])),
+            FlatMapValuesF(f),
             preservesPartitioning=True,
         )
 
@@ -589,11 +630,13 @@ class RDD:
         """
         return self.aggregate(zeroValue, op, op)
 
-    def foldByKey(self, zeroValue, op):
+    def foldByKey(self, zeroValue, op, numPartitions=None, partitionFunc=None):
         """Fold (or aggregate) value by key.
 
         :param zeroValue: The inital value, for example ``0`` or ``0.0``.
         :param op: The reduce operation.
+        :param int numPartitions: Number of partitions in the resulting RDD.
+        :param partitionFunc: (optional) Partition function.
         :rtype: RDD
 
 
@@ -604,7 +647,7 @@ class RDD:
         >>> my_rdd.foldByKey(0, lambda a, b: a+b).collectAsMap()['a']
         6
         """
-        return self.aggregateByKey(zeroValue, op, op)
+        return self.aggregateByKey(zeroValue, op, op, numPartitions, partitionFunc)
 
     def foreach(self, f):
         """applies ``f`` to every element
@@ -625,7 +668,17 @@ class RDD:
         3
         """
         self.context.runJob(self, lambda tc, x: [f(xx) for xx in x],
-                            resultHandler=None)
+                            resultHandler=None, ordered=False)
+
+    def foreachAsync(self, f):
+        """applies ``f`` to every element in the background
+
+        See :func:`~pysparkling.RDD.collectAsync`.
+
+        :param f: Apply a function to every element.
+        :rtype: concurrent.futures.Future
+        """
+        return self.context._submit_action(functools.partial(self.foreach, f))
 
     def foreachPartition(self, f):
         """applies ``f`` to every partition
@@ -637,7 +690,27 @@ class RDD:
         :rtype: None
         """
         self.context.runJob(self, lambda tc, x: f(x),
-                            resultHandler=None)
+                            resultHandler=None, ordered=False)
+
+    def foreachPartitionAsync(self, f):
+        """applies ``f`` to every partition in the background
+
+        See :func:`~pysparkling.RDD.collectAsync`.
+
+        :param f: Apply a function to every partition.
+        :rtype: concurrent.futures.Future
+
+
+        Example:
+
+        >>> from pysparkling import Context
+        >>> sizes = []
+        >>> future = Context().parallelize([1, 2, 3], 3).foreachPartitionAsync(lambda p: sizes.append(len(list(p))))
+        >>> future.result(timeout=10)
+        >>> sizes
+        [1, 1, 1]
+        """
+        return self.context._submit_action(functools.partial(self.foreachPartition, f))
 
     def fullOuterJoin(self, other, numPartitions=None):
         """returns the full outer join of two RDDs
@@ -649,9 +722,6 @@ class RDD:
         :param int numPartitions: Number of partitions in the resulting RDD.
         :rtype: RDD
 
-        .. note::
-            Creating the new RDD is currently implemented as a local operation.
-
 
         Example:
 
@@ -665,13 +735,7 @@ class RDD:
         [('a', (0, None)), ('b', (1, 2)), ('c', (None, 3))]
         """
 
-        grouped = self.cogroup(other, numPartitions)
-
-        return grouped.flatMap(lambda kv: [
-            (kv[0], (v_self, v_other))
-            for v_self in (kv[1][0] if kv[1][0] else [None])
-            for v_other in (kv[1][1] if kv[1][1] else [None])
-        ])
+        return self._hash_join(other, numPartitions, FULL_JOIN)
 
     def getNumPartitions(self):
         """returns the number of partitions
@@ -694,9 +758,6 @@ class RDD:
         :param int numPartitions: Number of partitions in the resulting RDD.
         :rtype: RDD
 
-        .. note::
-            Creating the new RDD is currently implemented as a local operation.
-
 
         Example:
 
@@ -714,18 +775,24 @@ class RDD:
         :param int numPartitions: Number of partitions in the resulting RDD.
         :rtype: RDD
 
-        .. note::
-            Creating the new RDD is currently implemented as a local operation.
+        The pairs are hash partitioned by key with a shuffle and the groups
+        are built within the partitions of the resulting RDD.
+
+
+        Example:
+
+        >>> from pysparkling import Context
+        >>> rdd = Context().parallelize([('a', 1), ('b', 2), ('a', 3)], 2)
+        >>> sorted(rdd.groupByKey(3).mapValues(sorted).collect())
+        [('a', [1, 3]), ('b', [2])]
         """
 
         if numPartitions is None:
             numPartitions = self.getNumPartitions()
 
-        r = defaultdict(list)
-        for key, value in self.toLocalIterator():
-            r[key].append(value)
-
-        return self.context.parallelize(r.items(), numPartitions)
+        return (self
+                .partitionBy(numPartitions)
+                .mapPartitions(group_by_key, preservesPartitioning=True))
 
     def histogram(self, buckets):
         """histogram
@@ -772,12 +839,13 @@ class RDD:
     def intersection(self, other):
         """intersection of this and other RDD
 
+        The output does not contain duplicates. Both RDDs are hash
+        partitioned in the same way and corresponding partitions are
+        intersected in the same task.
+
         :param RDD other: The other dataset to do the intersection with.
         :rtype: RDD
 
-        .. note::
-            Creating the new RDD is currently implemented as a local operation.
-
 
         Example:
 
@@ -787,9 +855,10 @@ class RDD:
         >>> rdd1.intersection(rdd2).collect()
         [4, 7]
         """
-        return self.context.parallelize(
-            list(set(self.toLocalIterator()) & set(other.toLocalIterator()))
-        )
+        return (self
+                .mapPartitions(unique_pairs, preservesPartitioning=True)
+                ._filterByKeys(other.mapPartitions(unique_pairs, preservesPartitioning=True), True)
+                .mapPartitions(unique_keys, preservesPartitioning=True))
 
     def isCheckpointed(self):
         return False
@@ -801,8 +870,10 @@ class RDD:
         :param int numPartitions: Number of partitions in the resulting RDD.
         :rtype: RDD
 
-        .. note::
-            Creating the new RDD is currently implemented as a local operation.
+        Both RDDs are hash partitioned by key into the same number of
+        partitions and every pair of partitions is joined in its own task.
+        The side with fewer records in a partition is loaded into a hash
+        table and the other side is streamed through it.
 
 
         Example:
@@ -813,17 +884,136 @@ class RDD:
         >>> rdd1.join(rdd2).collect()
         [(1, (1, 3))]
         """
+        return self._hash_join(other, numPartitions, INNER_JOIN)
+
+    def _co_partition(self, other, numPartitions=None):
+        """Hash partition this RDD and ``other`` in the same way.
 
+        :returns: A pair of :class:`ShuffledRDD`.
+        """
         if numPartitions is None:
-            numPartitions = self.getNumPartitions()
+            numPartitions = max(self.getNumPartitions(), other.getNumPartitions())
+
+        return self.partitionBy(numPartitions), other.partitionBy(numPartitions)
+
+    def _hash_join(self, other, numPartitions, how):
+        left, right = self._co_partition(other, numPartitions)
+        return ZippedPartitionsRDD(
+            (left, right),
+            HashJoin(how, left, right),
+            preservesPartitioning=True,
+        )
 
-        d1 = dict(self.collect())
-        d2 = dict(other.collect())
-        keys = set(d1.keys()) & set(d2.keys())
-        return self.context.parallelize((
-            (k, (d1[k], d2[k]))
-            for k in keys
-        ), numPartitions)
+    def _filterByKeys(self, other, keep, numPartitions=None):
+        """Pairs of this RDD whose key is (or is not) a key of ``other``.
+
+        Only the distinct keys of every partition of other are shuffled.
+
+        :param RDD other: The other RDD.
+        :param bool keep: Whether to keep the pairs whose key is in other.
+        :param int numPartitions: Number of partitions in the resulting RDD.
+        :rtype: RDD
+        """
+        left, right = self._co_partition(
+            other.mapPartitions(unique_key_pairs, preservesPartitioning=True),
+            numPartitions,
+        )
+        return ZippedPartitionsRDD(
+            (left, right),
+            FilterByKeys(keep),
+            preservesPartitioning=True,
+        )
+
+    def _sortMergeJoin(self, other, how=INNER_JOIN):
+        """sort merge join
+
+        This function is not part of the official Spark API hence its leading "_"
+
+        Both RDDs must have the same number of partitions, be partitioned
+        in the same way and be sorted by key in ascending order within each
+        partition, for example with
+        :func:`~pysparkling.RDD.repartitionAndSortWithinPartitions`.
+        Corresponding partitions are merged without a shuffle.
+
+        :param RDD other: The other RDD.
+        :param how: One of ``'inner'``, ``'left'``, ``'right'`` and ``'full'``.
+        :rtype: RDD
+
+
+        Example:
+
+        >>> from pysparkling import Context
+        >>> sc = Context()
+        >>> rdd1 = sc.parallelize([(0, 1), (1, 1), (1, 2)])
+        >>> rdd2 = sc.parallelize([(2, 1), (1, 3)])
+        >>> rdd1.repartitionAndSortWithinPartitions(2)._sortMergeJoin(
+        ...     rdd2.repartitionAndSortWithinPartitions(2), 'left'
+        ... ).collect()
+        [(0, (1, None)), (1, (1, 3)), (1, (2, 3))]
+        """
+        return ZippedPartitionsRDD(
+            (self, other),
+            SortMergeJoin(how),
+            preservesPartitioning=True,
+        )
+
+    def _broadcastJoin(self, other, how=INNER_JOIN):
+        """broadcast hash join
+
+        This function is not part of the official Spark API hence its leading "_"
+
+        ``other`` is collected once into a hash table that is broadcast to
+        all tasks, when a job first computes the result. Every partition of
+        this RDD is then probed against it without a shuffle. Use it when
+        ``other`` is small.
+
+        :param RDD other: The other RDD. It is collected to the driver.
+        :param how: One of ``'inner'``, ``'left'``, ``'leftsemi'`` and ``'leftanti'``.
+        :rtype: RDD
+
+
+        Example:
+
+        >>> from pysparkling import Context
+        >>> sc = Context()
+        >>> rdd1 = sc.parallelize([(0, 1), (1, 1), (1, 2)], 2)
+        >>> rdd2 = sc.parallelize([(2, 1), (1, 3)])
+        >>> rdd1._broadcastJoin(rdd2).collect()
+        [(1, (1, 3)), (1, (2, 3))]
+        >>> rdd1._broadcastJoin(rdd2, 'left').collect()
+        [(0, (1, None)), (1, (1, 3)), (1, (2, 3))]
+        """
+        if how not in (INNER_JOIN, LEFT_JOIN, LEFT_SEMI_JOIN, LEFT_ANTI_JOIN):
+            raise ValueError(f'Join type {how} is not supported by a broadcast join')
+
+        return BroadcastHashJoinRDD(self, other, how)
+
+    def _nestedLoopJoin(self, other, condition):
+        """nested loop join
+
+        This function is not part of the official Spark API hence its leading "_"
+
+        Pairs of elements of the :func:`cartesian` product for which
+        ``condition(element, other_element)`` is true. The condition is
+        evaluated in the tasks computing the product, the other pairs are
+        never created.
+
+        :param RDD other: The other RDD.
+        :param condition: Function of an element of this RDD and an element
+            of other.
+        :rtype: RDD
+
+
+        Example:
+
+        >>> from pysparkling import Context
+        >>> sc = Context()
+        >>> rdd1 = sc.parallelize([1, 5, 9], 2)
+        >>> rdd2 = sc.parallelize([2, 6])
+        >>> rdd1._nestedLoopJoin(rdd2, lambda a, b: a < b).collect()
+        [(1, 2), (1, 6), (5, 6)]
+        """
+        return CartesianRDD(self, other, condition)
 
     def keyBy(self, f):
         """key by f
@@ -862,9 +1052,6 @@ class RDD:
         :param int numPartitions: Number of partitions in the resulting RDD.
         :rtype: RDD
 
-        .. note::
-            Creating the new RDD is currently implemented as a local operation.
-
 
         Example:
 
@@ -874,26 +1061,17 @@ class RDD:
         >>> rdd1.leftOuterJoin(rdd2).collect()
         [(0, (1, None)), (1, (1, 3))]
         """
+        return self._hash_join(other, numPartitions, LEFT_JOIN)
 
-        d_other = other.groupByKey().collectAsMap()
-
-        return self.groupByKey().flatMap(lambda kv: [
-            (kv[0], (v_self, v_other))
-            for v_self in kv[1]
-            for v_other in (d_other[kv[0]] if kv[0] in d_other else [None])
-        ])
-
-    def _leftSemiJoin(self, other):
+    def _leftSemiJoin(self, other, numPartitions=None):
         """left semi join
 
         This function is not part of the official Spark API hence its leading "_"
 
         :param RDD other: The other RDD.
+        :param int numPartitions: Number of partitions in the resulting RDD.
         :rtype: RDD
 
-        .. note::
-            Creating the new RDD is currently implemented as a local operation.
-
         Example:
 
         >>> from pysparkling import Context
@@ -903,15 +1081,9 @@ class RDD:
         [(1, (1, ()))]
         """
 
-        d_other = other.groupByKey().collectAsMap()
-
-        return self.groupByKey().flatMap(lambda kv: [
-            (kv[0], (v_self, ()))
-            for v_self in kv[1]
-            if kv[0] in d_other
-        ])
+        return self._filterByKeys(other, True, numPartitions).mapValues(lambda v: (v, ()))
 
-    def _leftAntiJoin(self, other):
+    def _leftAntiJoin(self, other, numPartitions=None):
         """left anti join
 
         This function is not part of the official Spark API hence its leading "_"
@@ -920,10 +1092,6 @@ class RDD:
         :param int numPartitions: Number of partitions in the resulting RDD.
         :rtype: RDD
 
-        .. note::
-            Creating the new RDD is currently implemented as a local operation.
-
-
         Example:
 
         >>> from pysparkling import Context
@@ -933,13 +1101,7 @@ class RDD:
         [(0, (1, None))]
         """
 
-        d_other = other.groupByKey().collectAsMap()
-
-        return self.groupByKey().flatMap(lambda kv: [
-            (kv[0], (v_self, None))
-            for v_self in kv[1]
-            if kv[0] not in d_other
-        ])
+        return self._filterByKeys(other, False, numPartitions).mapValues(lambda v: (v, None))
 
     def lookup(self, key):
         """Return all the (key, value) pairs where the given key matches.
@@ -1027,7 +1189,7 @@ class RDD:
         """
         return MapPartitionsRDD(
             self,
-            lambda tc, i, x: ((e[0], f(e[1])) for e in x),
+            MapValuesF(f),
             preservesPartitioning=True,
         ).setName(f'{self.name()}:{f}')
 
@@ -1099,20 +1261,67 @@ class RDD:
         [2, 8, 1, 3, 7, 5]
         """
 
+        return ShuffledRDD(self, numPartitions, partitionFunc)
+
+    def _skewReport(self, numPartitions, partitionFunc=None):
+        """Number of records per partition of a :func:`partitionBy`
+
+        This function is not part of the official Spark API hence its leading "_"
+
+        Only the keys are hashed and counted. Nothing is shuffled, so it is
+        a cheap way to check the balance of the partitions before running
+        an expensive stage on them.
+
+        :param int numPartitions: Number of partitions.
+        :param function partitionFunc: Partition function.
+        :returns: A dict with the number of records per partition in
+            ``rows_per_bucket``, their ``max`` and ``mean`` and the ratio of
+            the two in ``skew``.
+        :rtype: dict
+
+
+        Example:
+
+        >>> from pysparkling import Context
+        >>> rdd = Context().parallelize([(i % 3, i) for i in range(12)], 2)
+        >>> report = rdd._skewReport(4)
+        >>> report['rows_per_bucket']
+        [4, 4, 4, 0]
+        >>> report['skew']
+        1.3333333333333333
+        """
         if partitionFunc is None:
             partitionFunc = _hash
 
-        new_partitions = [[] for _ in range(numPartitions)]
-        for key_value in self.toLocalIterator():
-            idx = partitionFunc(key_value[0]) % numPartitions
-            new_partitions[idx].append(key_value)
-
-        return self.context._parallelize_partitions(new_partitions)
+        rows_per_bucket = self.context.runJob(
+            self,
+            BucketCounter(numPartitions, partitionFunc),
+            resultHandler=lambda l: [sum(counts) for counts in zip(*l)],
+        )
+        mean = sum(rows_per_bucket) / numPartitions
+        return {
+            'rows_per_bucket': rows_per_bucket,
+            'max': max(rows_per_bucket),
+            'mean': mean,
+            'skew': max(rows_per_bucket) / mean if mean else 1.0,
+        }
 
     def persist(self, storageLevel=None):
         """Cache the results of computed partitions.
 
-        :param storageLevel: Not used.
+        :param StorageLevel storageLevel: (optional) where the partitions are
+            stored by the cache manager of the context, ``MEMORY_ONLY`` by default
+        :rtype: RDD
+
+
+        Example:
+
+        >>> from pysparkling import Context, StorageLevel
+        >>> rdd = Context().parallelize(range(4), 2).persist(StorageLevel.DISK_ONLY)
+        >>> rdd.collect()
+        [0, 1, 2, 3]
+        >>> rdd.context._cache_manager.has((rdd.id(), 0))
+        True
         """
         return PersistedRDD(self, storageLevel=storageLevel)
 
@@ -1220,7 +1429,8 @@ class RDD:
         result = self.context.runJob(
             self,
             lambda tc, x: reducer(x),
-            resultHandler=reducer
+            resultHandler=reducer,
+            ordered=False,
         )
 
         if result is _empty:
@@ -1228,17 +1438,14 @@ class RDD:
 
         return result
 
-    def reduceByKey(self, f, numPartitions=None):
+    def reduceByKey(self, f, numPartitions=None, partitionFunc=None):
         """reduce by key
 
         :param f: A commutative and associative binary operator.
         :param int numPartitions: Number of partitions in the resulting RDD.
+        :param partitionFunc: (optional) Partition function.
         :rtype: RDD
 
-        .. note::
-            This operation includes a :func:`~pysparkling.RDD.groupByKey()`
-            which is a local operation.
-
 
         Example:
 
@@ -1247,15 +1454,15 @@ class RDD:
         >>> rdd.reduceByKey(lambda a, b: a+b).collect()
         [(0, 1), (1, 4)]
         """
-        return (self
-                .groupByKey(numPartitions)
-                .mapValues(lambda x: functools.reduce(f, x)))
+        return self.combineByKey(lambda v: v, f, f, numPartitions, partitionFunc)
 
     def reduceByKeyLocally(self, f):
         """reduce by key and return a dictionnary
 
+        The values are reduced within each partition and the partial results
+        are merged on the driver without a shuffle.
+
         :param f: A commutative and associative binary operator.
-        :param int numPartitions: Number of partitions in the resulting RDD.
         :rtype: dict
 
         >>> from pysparkling import Context
@@ -1264,7 +1471,17 @@ class RDD:
         >>> sorted(rdd.reduceByKeyLocally(lambda a, b: a+b).items())
         [('a', 2), ('b', 1)]
         """
-        return dict(self.reduceByKey(f).collect())
+        combine = CombineByKey(lambda v: v, f)
+
+        def merge_partitions(partial_results):
+            r = {}
+            for partial_result in partial_results:
+                for key, value in partial_result:
+                    r[key] = f(r[key], value) if key in r else value
+            return r
+
+        return self.context.runJob(self, lambda tc, x: combine(x),
+                                   resultHandler=merge_partitions)
 
     def treeReduce(self, f, depth=2):
         """same internal behaviour as :func:`~pysparkling.RDD.reduce()`
@@ -1332,6 +1549,9 @@ class RDD:
         [2, 8, 1, 3, 5, 7]
         """
 
+        if numPartitions is None:
+            numPartitions = self.getNumPartitions()
+
         def partition_sort(data):
             return sorted(data, key=keyfunc, reverse=not ascending)
 
@@ -1346,9 +1566,6 @@ class RDD:
         :param int numPartitions: Number of partitions in new RDD.
         :rtype: RDD
 
-        .. note::
-            Creating the new RDD is currently implemented as a local operation.
-
 
         Example:
 
@@ -1360,13 +1577,7 @@ class RDD:
         [(1, (1, 3)), (2, (None, 1))]
         """
 
-        d_self = self.groupByKey().collectAsMap()
-
-        return other.groupByKey().flatMap(lambda kv: [
-            (kv[0], (v_self, v_other))
-            for v_other in kv[1]
-            for v_self in (d_self[kv[0]] if kv[0] in d_self else [None])
-        ])
+        return self._hash_join(other, numPartitions, RIGHT_JOIN)
 
     def sample(self, withReplacement, fraction, seed=None):
         """randomly sample
@@ -1597,8 +1808,10 @@ class RDD:
             partitions as the input.
         :rtype: RDD
 
-        .. note::
-            Sorting is currently implemented as a local operation.
+        The range of keys of every output partition is determined by
+        sampling the dataset. Elements are then range partitioned with a
+        shuffle and every partition is sorted on its own. Elements with
+        equal keys keep their relative order.
 
 
         Examples:
@@ -1617,10 +1830,17 @@ class RDD:
         if numPartitions is None:
             numPartitions = self.getNumPartitions()
 
-        return self.context.parallelize(
-            sorted(self.collect(), key=keyfunc, reverse=not ascending),
-            numPartitions,
-        )
+        keyed = self.keyBy(keyfunc)
+        bounds = get_range_bounds(keyed.keys(), numPartitions,
+                                  sample_size=min(20 * numPartitions, 10**6))
+
+        return (keyed
+                .partitionBy(len(bounds) + 1, RangePartitioner(bounds, ascending))
+                .mapPartitions(
+                    lambda x: sorted(x, key=itemgetter(0), reverse=not ascending),
+                    preservesPartitioning=True,
+                )
+                .values())
 
     def sortByKey(self, ascending=True, numPartitions=None,
                   keyfunc=itemgetter(0)):
@@ -1632,9 +1852,6 @@ class RDD:
         :param keyfunc: Returns the value that will be sorted.
         :rtype: RDD
 
-        .. note::
-            Sorting is currently implemented as a local operation.
-
 
         Examples:
 
@@ -1691,8 +1908,10 @@ class RDD:
     def subtract(self, other, numPartitions=None):
         """subtract
 
+        Duplicates of elements that are not in other are kept.
+
         :param RDD other: The RDD to subtract from the current RDD.
-        :param int numPartitions: Currently not used. Partitions are preserved.
+        :param int numPartitions: Number of partitions in the resulting RDD.
         :rtype: RDD
 
 
@@ -1704,17 +1923,16 @@ class RDD:
         >>> rdd1.subtract(rdd2).collect()
         [(0, 1)]
         """
-        list_other = other.collect()
-        return MapPartitionsRDD(
-            self,
-            lambda tc, i, x: (e for e in x if e not in list_other),
-            preservesPartitioning=True,
-        )
+        return (self
+                .map(lambda e: (e, None))
+                ._filterByKeys(other.map(lambda e: (e, None)), False, numPartitions)
+                .keys())
 
     def subtractByKey(self, other, numPartitions=None):
         """
         Return each (key, value) pair in C{self} that has no pair with matching
         key in C{other}.
+
         >>> from pysparkling import Context
         >>> sc = Context()
         >>> x = sc.parallelize([("a", 1), ("b", 4), ("b", 5), ("a", 2)])
@@ -1723,11 +1941,7 @@ class RDD:
         [('b', 4), ('b', 5)]
         """
 
-        def filter_func(pair):
-            _, (val1, val2) = pair
-            return val1 and not val2
-
-        return self.cogroup(other, numPartitions).filter(filter_func).flatMapValues(lambda x: x[0])
+        return self._filterByKeys(other, False, numPartitions)
 
     def sum(self):
         """sum of all the elements
@@ -1742,7 +1956,7 @@ class RDD:
         25
         """
         return self.context.runJob(self, lambda tc, x: sum(x),
-                                   resultHandler=sum)
+                                   resultHandler=sum, ordered=False)
 
     def sumApprox(self):
         """same as :func:`~pysparkling.RDD.sum()`
@@ -1783,6 +1997,23 @@ class RDD:
             )),
         )
 
+    def takeAsync(self, n):
+        """returns a future of the first n elements in a list
+
+        See :func:`~pysparkling.RDD.collectAsync`.
+
+        :param int n: Number of elements to return.
+        :rtype: concurrent.futures.Future
+
+
+        Example:
+
+        >>> from pysparkling import Context
+        >>> Context().parallelize([4, 7, 2], 3).takeAsync(2).result()
+        [4, 7]
+        """
+        return self.context._submit_action(functools.partial(self.take, n))
+
     def takeSample(self, withReplacement, num, seed=None):
         # The code of this function is extracted from PySpark RDD counterpart at
         # https://spark.apache.org/docs/1.5.0/api/python/_modules/pyspark/rdd.html
@@ -1918,7 +2149,12 @@ class RDD:
         >>> Context().parallelize([10, 1, 2, 9, 3, 4, 5, 6, 7], 2).takeOrdered(6, key=lambda x: -x)
         [10, 9, 7, 6, 5, 4]
         """
-        return self.sortBy(key).take(n)
+        return self.context.runJob(
+            self,
+            lambda tc, x: heapq.nsmallest(n, x, key=key),
+            resultHandler=lambda l: heapq.nsmallest(
+                n, itertools.chain.from_iterable(l), key=key),
+        )
 
     def toLocalIterator(self):
         """Returns an iterator over the dataset.
@@ -1951,13 +2187,12 @@ class RDD:
         [9, 7]
         """
 
-        def unit(x):
-            return x
-
-        if key is None:
-            key = unit
-
-        return self.sortBy(key, ascending=False).take(num)
+        return self.context.runJob(
+            self,
+            lambda tc, x: heapq.nlargest(num, x, key=key),
+            resultHandler=lambda l: heapq.nlargest(
+                num, itertools.chain.from_iterable(l), key=key),
+        )
 
     def union(self, other):
         """union
@@ -1999,12 +2234,13 @@ class RDD:
     def zip(self, other):
         """zip
 
+        Corresponding partitions are zipped in the same task. Both RDDs
+        must have the same number of partitions and the same number of
+        elements in each partition.
+
         :param RDD other: Other dataset to zip with.
         :rtype: RDD
 
-        .. note::
-            Creating the new RDD is currently implemented as a local operation.
-
 
         Example:
 
@@ -2013,17 +2249,19 @@ class RDD:
         >>> my_rdd.zip(my_rdd).collect()
         [(4, 4), (9, 9), (7, 7), (3, 3), (2, 2), (5, 5)]
         """
-        return self.context.parallelize(
-            zip(self.toLocalIterator(), other.toLocalIterator())
+        return ZippedPartitionsRDD(
+            (self, other),
+            zip_partitions,
+            preservesPartitioning=True,
         )
 
     def zipWithIndex(self):
         """Returns pairs of an original element and its index.
 
-        :rtype: RDD
+        A job counts the elements of all the partitions but the last one to
+        find the index of the first element of every partition.
 
-        .. note::
-            Creating the new RDD is currently implemented as a local operation.
+        :rtype: RDD
 
 
         Example:
@@ -2033,8 +2271,18 @@ class RDD:
         >>> my_rdd.zipWithIndex().collect()
         [(4, 0), (9, 1), (7, 2), (3, 3), (2, 4), (5, 5)]
         """
-        return self.context.parallelize(
-            (d, i) for i, d in enumerate(self.toLocalIterator())
+        partitions = self.partitions()
+        sizes = []
+        if len(partitions) > 1:
+            sizes = self.context.runJob(
+                self,
+                lambda tc, x: sum(1 for _ in x),
+                partitions=partitions[:-1],
+            )
+        return MapPartitionsRDD(
+            self,
+            ZipWithIndexF([0] + list(itertools.accumulate(sizes))),
+            preservesPartitioning=True,
         )
 
     def zipWithUniqueId(self):
@@ -2101,8 +2349,291 @@ class MapPartitionsRDD(RDD):
         return self.f(task_context, split.index,
                       self.prev.compute(split, task_context._create_child()))
 
-    def partitions(self):
-        return self.prev.partitions()
+
+class PipelinedRDD(RDD):
+    def __init__(self, rdd, prev, functions):
+        """Fused chain of :class:`MapPartitionsRDD`.
+
+        Computing a partition applies the functions of the chain one after
+        the other with a single task context, instead of one nested call to
+        ``compute()`` per RDD of the chain. Consecutive element-wise functions
+        (e.g. of ``map()``, ``filter()`` and ``flatMap()``) run in a single
+        loop. The pickled form only contains the first RDD before the chain
+        and a flat list of functions.
+
+        :param RDD rdd: last RDD of the chain, its id and name are kept
+        :param RDD prev: RDD before the first RDD of the chain
+        :param list functions: functions of the chain, first one first
+        """
+        RDD.__init__(self, prev.partitions(), prev.context)
+        self._rdd_id = rdd.id()
+        self._name = rdd.name()
+
+        self.prev = prev
+        self.functions = fuse_functions(functions)
+
+    def compute(self, split, task_context):
+        data = self.prev.compute(split, task_context)
+        for f in self.functions:
+            data = f(task_context, split.index, data)
+        return data
+
+
+def fuse_functions(functions):
+    """Replace runs of element-wise functions with an :class:`ElementPipeline`.
+
+    :param list functions: partition functions, first one first
+    :rtype: list
+    """
+    fused = []
+    for f in functions:
+        if not isinstance(f, MapF):
+            fused.append(f)
+        elif fused and isinstance(fused[-1], ElementPipeline):
+            fused[-1].functions.append(f)
+        else:
+            fused.append(ElementPipeline([f]))
+    return fused
+
+
+class ShuffledRDD(RDD):
+    def __init__(self, prev, numPartitions, partitionFunc=None):
+        """RDD with the pairs of ``prev`` hash partitioned by key.
+
+        The map stage writes the pairs of every partition of ``prev`` into
+        one bucket per partition of this RDD using the shuffle manager of
+        the context. It is run by the :class:`~pysparkling.scheduler.DAGScheduler`
+        as a shuffle map stage of the first job that computes partitions of
+        this RDD and its outputs are reused by the following jobs. They are
+        removed from the shuffle manager when this RDD is garbage collected.
+
+        :param RDD prev: previous RDD with (key, value) pairs
+        :param int numPartitions: number of partitions
+        :param partitionFunc: (optional) function mapping a key to an int
+        """
+        RDD.__init__(self, (Partition([], i) for i in range(numPartitions)),
+                     prev.context)
+
+        self.prev = prev
+        self.numPartitions = numPartitions
+        self.partitionFunc = partitionFunc if partitionFunc is not None else _hash
+        self.shuffle_id = prev.context.newShuffleId()
+        self.map_ids = None
+        self.map_statuses = None
+        self._map_stage_lock = threading.Lock()
+        weakref.finalize(self, prev.context._shuffle_manager.remove, self.shuffle_id)
+
+    def __getstate__(self):
+        r = RDD.__getstate__(self)
+        r['_map_stage_lock'] = None
+        return r
+
+    def is_available(self):
+        """Whether the outputs of the map stage were written."""
+        return self.map_ids is not None
+
+    def map_output_writer(self):
+        """Task function of the map stage."""
+        return ShuffleWriter(self.context._shuffle_manager, self.shuffle_id,
+                             self.numPartitions, self.partitionFunc)
+
+    def register_map_outputs(self, map_statuses):
+        """Make the outputs of the map stage available to reduce tasks.
+
+        :param list map_statuses: number of records written by every map
+            task into every bucket
+        """
+        self.map_statuses = map_statuses
+        self.map_ids = [p.index for p in self.prev.partitions()]
+
+    def partition_sizes(self):
+        """Number of records in every partition after the map stage.
+
+        :rtype: list
+        """
+        if self.map_statuses is None:
+            return None
+        return [sum(sizes) for sizes in zip(*self.map_statuses)]
+
+    def compute(self, split, task_context):
+        return task_context.metrics.count_read(self.context._shuffle_manager.read(
+            self.shuffle_id, self.map_ids, split.index))
+
+
+class ZippedPartitionsRDD(RDD):
+    def __init__(self, prevs, f, preservesPartitioning=False):
+        """RDD computed from corresponding partitions of several RDDs.
+
+        ``f`` is a function with the signature
+        ``(task_context, partition index, *iterators over elements)``
+        with one iterator for every RDD in ``prevs``.
+
+        :param prevs: RDDs with the same number of partitions
+        :param f: function combining the partitions
+        :param bool preservesPartitioning: preserve partitioning (not used)
+        """
+        num_partitions = {prev.getNumPartitions() for prev in prevs}
+        if len(num_partitions) > 1:
+            raise ValueError("Can't zip RDDs with unequal numbers of partitions")
+
+        # the data of a partition are the corresponding partitions of prevs
+        RDD.__init__(self, (
+            Partition(parent_partitions, i)
+            for i, parent_partitions in enumerate(
+                zip(*(prev.partitions() for prev in prevs)))
+        ), prevs[0].context)
+
+        self.prevs = prevs
+        self.f = f
+        self.preservesPartitioning = preservesPartitioning
+
+    def compute(self, split, task_context):
+        return self.f(task_context, split.index, *(
+            prev.compute(parent_split, task_context._create_child())
+            for prev, parent_split in zip(self.prevs, split.x())
+        ))
+
+
+class UnionRDD(RDD):
+    def __init__(self, prevs):
+        """RDD with the partitions of several RDDs one after the other.
+
+        A partition is computed by the RDD it comes from, nothing is
+        computed when the union is created.
+
+        :param list prevs: RDDs of the same context
+        """
+        # the data of a partition are the index of its RDD in prevs and
+        # its partition in that RDD
+        parent_partitions = [(rdd_index, parent_partition)
+                             for rdd_index, prev in enumerate(prevs)
+                             for parent_partition in prev.partitions()]
+        RDD.__init__(self, (
+            Partition([rdd_index, parent_partition], i)
+            for i, (rdd_index, parent_partition) in enumerate(parent_partitions)
+        ), prevs[0].context)
+
+        self.prevs = prevs
+
+    def compute(self, split, task_context):
+        rdd_index, parent_split = split.x()
+        return self.prevs[rdd_index].compute(parent_split, task_context._create_child())
+
+
+class CoalescedRDD(RDD):
+    def __init__(self, prev, numPartitions):
+        """RDD with groups of consecutive partitions of ``prev``.
+
+        If the number of partitions of ``prev`` is not a multiple of
+        ``numPartitions``, the first groups have one more partition.
+
+        :param RDD prev: previous RDD
+        :param int numPartitions: number of partitions, at most the number
+            of partitions of prev
+        """
+        parent_partitions = prev.partitions()
+        num_partitions = min(numPartitions, len(parent_partitions))
+        groups = []
+        start = 0
+        for i in range(num_partitions):
+            size = len(parent_partitions) // num_partitions
+            if i < len(parent_partitions) % num_partitions:
+                size += 1
+            groups.append(parent_partitions[start:start + size])
+            start += size
+
+        # the data of a partition are the partitions of prev in its group
+        RDD.__init__(self, (Partition(group, i) for i, group in enumerate(groups)),
+                     prev.context)
+
+        self.prev = prev
+
+    def compute(self, split, task_context):
+        return itertools.chain.from_iterable(
+            self.prev.compute(parent_split, task_context._create_child())
+            for parent_split in split.x()
+        )
+
+
+class CartesianRDD(RDD):
+    def __init__(self, left, right, predicate=None):
+        """Cartesian product of two RDDs.
+
+        A partition is the product of a partition of ``left`` and a
+        partition of ``right``. The partition of right is computed into a
+        list and the pairs are generated while the partition of left is
+        computed.
+
+        :param RDD left: RDD of the first elements of the pairs
+        :param RDD right: RDD of the second elements of the pairs
+        :param predicate: (optional) function of the two elements of a pair,
+            only the pairs for which it is true are generated
+        """
+        RDD.__init__(self, (
+            Partition([left_partition, right_partition], i)
+            for i, (left_partition, right_partition) in enumerate(
+                itertools.product(left.partitions(), right.partitions()))
+        ), left.context)
+
+        self.prevs = (left, right)
+        self.predicate = predicate
+
+    def compute(self, split, task_context):
+        left_split, right_split = split.x()
+        left, right = self.prevs
+        right_elements = list(right.compute(right_split, task_context._create_child()))
+        left_elements = left.compute(left_split, task_context._create_child())
+        if self.predicate is None:
+            return ((a, b) for a in left_elements for b in right_elements)
+        predicate = self.predicate
+        return ((a, b) for a in left_elements for b in right_elements if predicate(a, b))
+
+
+class BroadcastHashJoinRDD(RDD):
+    def __init__(self, prev, build, how):
+        """Pairs of ``prev`` joined with the pairs of ``build``.
+
+        ``build`` is collected into a hash table in the driver before the
+        tasks of the first job computing partitions of this RDD are sent,
+        see :meth:`broadcast_table`. The tasks probe the partitions of
+        ``prev`` against it.
+
+        :param RDD prev: previous RDD with (key, value) pairs
+        :param RDD build: RDD with (key, value) pairs, collected
+        :param how: One of ``'inner'``, ``'left'``, ``'leftsemi'`` and ``'leftanti'``.
+        """
+        RDD.__init__(self, prev.partitions(), prev.context)
+
+        self.prev = prev
+        self.build = build
+        self.how = how
+        self.table = None
+        self._table_lock = threading.Lock()
+
+    def __getstate__(self):
+        r = RDD.__getstate__(self)
+        # the tasks only use the hash table
+        r['build'] = None
+        r['_table_lock'] = None
+        return r
+
+    def broadcast_table(self):
+        """Collect ``build`` into a broadcast hash table unless done already.
+
+        :rtype: Broadcast
+        """
+        with self._table_lock:
+            if self.table is None:
+                table = defaultdict(list)
+                for key, value in self.build.collect():
+                    table[key].append(value)
+                self.table = self.context.broadcast(dict(table))
+            return self.table
+
+    def compute(self, split, task_context):
+        table = self.table if self.table is not None else self.broadcast_table()
+        return BroadcastHashJoin(self.how, table)(
+            self.prev.compute(split, task_context._create_child()))
 
 
 class PartitionwiseSampledRDD(RDD):
@@ -2135,9 +2666,6 @@ class PartitionwiseSampledRDD(RDD):
             for _ in range(self.sampler(x))
         )
 
-    def partitions(self):
-        return self.prev.partitions()
-
 
 class PersistedRDD(RDD):
     def __init__(self, prev, storageLevel=None):
@@ -2148,28 +2676,28 @@ class PersistedRDD(RDD):
         RDD.__init__(self, prev.partitions(), prev.context)
         self.prev = prev
         self.storageLevel = storageLevel
-        self._cache_manager = None
-        self._cid = None
 
     def compute(self, split, task_context):
         if self._rdd_id is None or split.index is None:
-            self._cid = None
+            cid = None
         else:
-            self._cid = (self._rdd_id, split.index)
+            cid = (self._rdd_id, split.index)
 
-        if not task_context.cache_manager.has(self._cid):
+        # None when not cached, evicted or when its file on disk is corrupt
+        data = task_context.cache_manager.get(cid)
+        if data is None:
+            task_context.metrics.cache_misses += 1
             data = list(self.prev.compute(split, task_context._create_child()))
-            task_context.cache_manager.add(self._cid, data, self.storageLevel)
-            self._cache_manager = task_context.cache_manager
-        else:
-            log.debug('Using cache of RDD %s partition %s.', *self._cid)
-            data = task_context.cache_manager.get(self._cid)
+            task_context.cache_manager.add(cid, data, self.storageLevel)
+            return iter(data)
 
-        return iter(data)
+        log.debug('Using cache of RDD %s partition %s.', *cid)
+        task_context.metrics.cache_hits += 1
+        return task_context.metrics.count_read(data)
 
     def unpersist(self, blocking=False):
-        if self._cache_manager:
-            self._cache_manager.delete(self._cid)
+        self.context._remove_blocks([(self._rdd_id, partition.index)
+                                     for partition in self.partitions()])
 
         unpersisted_rdd = RDD(self.partitions(), self.context)
         return unpersisted_rdd
@@ -2183,6 +2711,10 @@ class EmptyRDD(RDD):
 # pickle-able helpers
 
 class MapF:
+    # statement applying the function to the element x in a fused pipeline,
+    # see ElementPipeline
+    statement = 'x = {f}(x)'
+
     def __init__(self, f):
         self.f = f
 
@@ -2190,6 +2722,335 @@ class MapF:
         return (self.f(xx) for xx in x)
 
 
+class FilterF(MapF):
+    statement = 'if not {f}(x): continue'
+
+    def __call__(self, tc, i, x):
+        return (xx for xx in x if self.f(xx))
+
+
+class FlatMapF(MapF):
+    statement = 'for x in {f}(x):'
+
+    def __call__(self, tc, i, x):
+        return (e for xx in x for e in self.f(xx))
+
+
+class MapValuesF(MapF):
+    statement = 'x = (x[0], {f}(x[1]))'
+
+    def __call__(self, tc, i, x):
+        return ((e[0], self.f(e[1])) for e in x)
+
+
+class FlatMapValuesF(MapF):
+    statement = 'for x in zip(repeat(x[0]), {f}(x[1])):'
+
+    def __call__(self, tc, i, x):
+        return ((xx[0], e) for xx in x for e in self.f(xx[1]))
+
+
+class ElementPipeline:
+    """Consecutive element-wise functions fused into one loop.
+
+    The functions are instances of :class:`MapF` and its subclasses. The
+    loop is generated from their statements the first time it is called,
+    only the functions are pickled.
+    """
+
+    def __init__(self, functions):
+        self.functions = functions
+        self._pipeline = None
+
+    def __getstate__(self):
+        return {'functions': self.functions, '_pipeline': None}
+
+    def __call__(self, tc, i, x):
+        if self._pipeline is None:
+            self._pipeline = self.build()
+        return self._pipeline(x)
+
+    def build(self):
+        lines = ['def pipeline(iterator):', '    for x in iterator:']
+        indent = 2
+        namespace = {'repeat': itertools.repeat}
+        for n, function in enumerate(self.functions):
+            namespace[f'f{n}'] = function.f
+            statement = function.statement.format(f=f'f{n}')
+            lines.append('    ' * indent + statement)
+            if statement.endswith(':'):
+                indent += 1
+        lines.append('    ' * indent + 'yield x')
+        exec(compile('\n'.join(lines), '<pipeline>', 'exec'), namespace)  # pylint: disable=exec-used
+        return namespace['pipeline']
+
+
+class ShuffleWriter:
+    def __init__(self, shuffle_manager, shuffle_id, num_partitions, partition_func):
+        self.shuffle_manager = shuffle_manager
+        self.shuffle_id = shuffle_id
+        self.num_partitions = num_partitions
+        self.partition_func = partition_func
+
+    def __call__(self, tc, x):
+        buckets = [[] for _ in range(self.num_partitions)]
+        x = list(x)
+        keys = [key_value[0] for key_value in x]
+        for key_value, idx in zip(x, get_partition_ids(self.partition_func, keys, self.num_partitions)):
+            buckets[idx].append(key_value)
+        return self.shuffle_manager.write(self.shuffle_id, tc.partition_id, buckets)
+
+
+class BucketCounter:
+    def __init__(self, num_partitions, partition_func):
+        self.num_partitions = num_partitions
+        self.partition_func = partition_func
+
+    def __call__(self, tc, x):
+        counts = [0] * self.num_partitions
+        keys = [key_value[0] for key_value in x]
+        for idx in get_partition_ids(self.partition_func, keys, self.num_partitions):
+            counts[idx] += 1
+        return counts
+
+
+def get_partition_ids(partition_func, keys, num_partitions):
+    """Partition index of every key.
+
+    Partition functions with a ``partition_ids(keys, num_partitions)``
+    method process all the keys in a single call.
+    """
+    batch_partition_ids = getattr(partition_func, 'partition_ids', None)
+    if batch_partition_ids is not None:
+        return batch_partition_ids(keys, num_partitions)
+    return [partition_func(key) % num_partitions for key in keys]
+
+
+class Murmur3Partitioner:
+    """Partition keys by their Murmur3 hash like Spark does for DataFrames.
+
+    The assignment of keys to partitions does not depend on the Python
+    process. Tuples are hashed like the columns of a row.
+    """
+
+    def __init__(self, seed=MURMUR3_SEED):
+        self.seed = seed
+
+    def __call__(self, key):
+        return murmur3_hash(key, self.seed)
+
+    def partition_ids(self, keys, num_partitions):
+        return murmur3_partition_ids(keys, num_partitions, self.seed)
+
+
+class RangePartitioner:
+    def __init__(self, bounds, ascending=True):
+        self.bounds = bounds
+        self.ascending = ascending
+
+    def __call__(self, key):
+        idx = bisect.bisect_left(self.bounds, key)
+        return idx if self.ascending else len(self.bounds) - idx
+
+
+class CombineByKey:
+    def __init__(self, create_combiner, merge_value):
+        self.create_combiner = create_combiner
+        self.merge_value = merge_value
+
+    def __call__(self, x):
+        r = {}
+        for key, value in x:
+            if key in r:
+                r[key] = self.merge_value(r[key], value)
+            else:
+                r[key] = self.create_combiner(value)
+        return list(r.items())
+
+
+class HashJoin:
+    """Join corresponding partitions of two co-partitioned pair RDDs.
+
+    The side with fewer records in the partition is the build side.
+    """
+
+    def __init__(self, how, left, right):
+        self.how = how
+        self.left = left
+        self.right = right
+
+    def __call__(self, tc, i, left, right):
+        left_sizes = self.left.partition_sizes()
+        right_sizes = self.right.partition_sizes()
+        build_left = (left_sizes is not None and right_sizes is not None
+                      and left_sizes[i] < right_sizes[i])
+
+        keep_left = self.how in (LEFT_JOIN, FULL_JOIN)
+        keep_right = self.how in (RIGHT_JOIN, FULL_JOIN)
+        if build_left:
+            return hash_join(right, left, keep_right, keep_left,
+                             lambda stream_v, build_v: (build_v, stream_v))
+        return hash_join(left, right, keep_left, keep_right,
+                         lambda stream_v, build_v: (stream_v, build_v))
+
+
+def hash_join(stream, build, keep_stream, keep_build, pair):
+    table = defaultdict(list)
+    for key, value in build:
+        table[key].append(value)
+
+    matched = set()
+    for key, value in stream:
+        if key in table:
+            if keep_build:
+                matched.add(key)
+            for build_value in table[key]:
+                yield key, pair(value, build_value)
+        elif keep_stream:
+            yield key, pair(value, None)
+
+    if keep_build:
+        for key, values in table.items():
+            if key not in matched:
+                for build_value in values:
+                    yield key, pair(None, build_value)
+
+
+class BroadcastHashJoin:
+    """Probe a partition against a broadcast hash table."""
+
+    def __init__(self, how, table):
+        self.how = how
+        self.table = table
+
+    def __call__(self, partition):
+        table = self.table.value
+        for key, value in partition:
+            build_values = table.get(key)
+            if self.how == LEFT_SEMI_JOIN:
+                if build_values is not None:
+                    yield key, (value, ())
+            elif self.how == LEFT_ANTI_JOIN:
+                if build_values is None:
+                    yield key, (value, None)
+            elif build_values is not None:
+                for build_value in build_values:
+                    yield key, (value, build_value)
+            elif self.how == LEFT_JOIN:
+                yield key, (value, None)
+
+
+class SortMergeJoin:
+    """Join corresponding partitions of two pair RDDs sorted by key."""
+
+    def __init__(self, how):
+        self.how = how
+
+    def __call__(self, tc, i, left, right):
+        keep_left = self.how in (LEFT_JOIN, FULL_JOIN)
+        keep_right = self.how in (RIGHT_JOIN, FULL_JOIN)
+        left_groups = ((k, [v for _, v in g])
+                       for k, g in itertools.groupby(left, key=itemgetter(0)))
+        right_groups = ((k, [v for _, v in g])
+                        for k, g in itertools.groupby(right, key=itemgetter(0)))
+
+        left_group = next(left_groups, None)
+        right_group = next(right_groups, None)
+        while left_group is not None and right_group is not None:
+            if left_group[0] < right_group[0]:
+                if keep_left:
+                    yield from ((left_group[0], (v, None)) for v in left_group[1])
+                left_group = next(left_groups, None)
+            elif right_group[0] < left_group[0]:
+                if keep_right:
+                    yield from ((right_group[0], (None, v)) for v in right_group[1])
+                right_group = next(right_groups, None)
+            else:
+                yield from ((left_group[0], (left_v, right_v))
+                            for left_v in left_group[1]
+                            for right_v in right_group[1])
+                left_group = next(left_groups, None)
+                right_group = next(right_groups, None)
+
+        while keep_left and left_group is not None:
+            yield from ((left_group[0], (v, None)) for v in left_group[1])
+            left_group = next(left_groups, None)
+        while keep_right and right_group is not None:
+            yield from ((right_group[0], (None, v)) for v in right_group[1])
+            right_group = next(right_groups, None)
+
+
+def zip_partitions(task_context, index, left, right):
+    sentinel = object()
+    for pair in itertools.zip_longest(left, right, fillvalue=sentinel):
+        if pair[0] is sentinel or pair[1] is sentinel:
+            raise ValueError('Can only zip RDDs with same number of elements in each partition')
+        yield pair
+
+
+class ZipWithIndexF:
+    def __init__(self, offsets):
+        """Function zipping the elements of a partition with their index.
+
+        :param list offsets: index of the first element of every partition
+        """
+        self.offsets = offsets
+
+    def __call__(self, task_context, index, elements):
+        return zip(elements, itertools.count(self.offsets[index]))
+
+
+class FilterByKeys:
+    """Filter a partition by the keys of the corresponding partition of
+    another co-partitioned pair RDD."""
+
+    def __init__(self, keep):
+        self.keep = keep
+
+    def __call__(self, tc, i, left, right):
+        keys = {key for key, _ in right}
+        return ((key, value) for key, value in left if (key in keys) == self.keep)
+
+
+def unique_pairs(elements):
+    """Pairs of the distinct elements and None, in order of first occurrence."""
+    seen = set()
+    for e in elements:
+        if e not in seen:
+            seen.add(e)
+            yield e, None
+
+
+def unique_key_pairs(pairs):
+    """Pairs of the distinct keys and None, in order of first occurrence."""
+    return unique_pairs(key for key, _ in pairs)
+
+
+def unique_keys(pairs):
+    """Distinct keys in order of first occurrence."""
+    seen = set()
+    for key, _ in pairs:
+        if key not in seen:
+            seen.add(key)
+            yield key
+
+
+def cogroup_partitions(left, right):
+    r = {}
+    for key, value in left:
+        r.setdefault(key, ([], []))[0].append(value)
+    for key, value in right:
+        r.setdefault(key, ([], []))[1].append(value)
+    return ((key, list(values)) for key, values in r.items())
+
+
+def group_by_key(x):
+    r = defaultdict(list)
+    for key, value in x:
+        r[key].append(value)
+    return iter(r.items())
+
+
 def unit_map(task_context, elements):
     return list(elements)
 
@@ -0,0 +1,322 @@
+"""Scheduling of jobs in stages.
+
+The lineage of the RDD computed by a job is cut into stages at shuffle
+boundaries. Every :class:`~pysparkling.rdd.ShuffledRDD` in the lineage
+depends on a shuffle map stage that writes the partitions of its previous
+RDD into buckets. The partitions of the RDD itself are computed by the
+result stage of the job once all the map stages it depends on are done.
+
+Chains of narrow transformations in a stage are fused into
+:class:`~pysparkling.rdd.PipelinedRDD` before its tasks are sent.
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+from .rdd import (
+    BroadcastHashJoinRDD, CartesianRDD, CoalescedRDD, MapPartitionsRDD, PartitionwiseSampledRDD, PersistedRDD,
+    PipelinedRDD, ShuffledRDD, UnionRDD, ZippedPartitionsRDD
+)
+
+log = logging.getLogger(__name__)
+
+# RDDs copied by fuse() to fuse the chains before their parents, their state
+# is their parents and their partitions
+FUSED_THROUGH = (CartesianRDD, CoalescedRDD, PartitionwiseSampledRDD, PersistedRDD, UnionRDD, ZippedPartitionsRDD)
+
+
+class Stage:
+    """A set of tasks computing the partitions of an RDD.
+
+    Within a stage, partitions are only computed from the corresponding
+    partitions of previous RDDs (narrow dependencies).
+
+    :param int stage_id: id of the stage
+    :param RDD rdd: the RDD computed by the tasks of the stage, with its
+        chains of narrow transformations fused
+    :param list parents: the stages whose outputs are read by this stage
+    :param ShuffledRDD shuffled_rdd: the RDD reading the output of this stage
+        if this is a shuffle map stage, None for a result stage
+    """
+
+    def __init__(self, stage_id, rdd, parents, shuffled_rdd=None):
+        self.stage_id = stage_id
+        self.rdd = rdd
+        self.parents = parents
+        self.shuffled_rdd = shuffled_rdd
+
+    def __repr__(self):
+        kind = 'ShuffleMapStage' if self.shuffled_rdd is not None else 'ResultStage'
+        return f'{kind}({self.stage_id}, {self.rdd.name()})'
+
+
+class DAGScheduler:
+    """Run jobs as a graph of stages.
+
+    Shuffle map stages that do not depend on each other are run concurrently,
+    each of them in its own thread that submits its tasks to the pool of the
+    context. Shuffle outputs are kept by their :class:`ShuffledRDD` and the
+    map stages that produced them are skipped by later jobs.
+
+    :param Context context: the context whose jobs are scheduled
+    """
+
+    def __init__(self, context):
+        self.context = context
+
+    def run_job(self, rdd, func, partitions, allow_local, job, stats, ordered=True):
+        """Run the stages of a job.
+
+        :param RDD rdd: the RDD computed by the result stage
+        :param func: function applied to the partitions of the result stage
+        :param list partitions: partitions computed by the result stage
+        :param bool allow_local: whether the result stage runs in the driver
+        :param JobMetrics job: metrics of the job
+        :param dict stats: timings of the result stage
+        :param bool ordered: whether the results are in the order of the
+            partitions
+        :returns: an iterator over the results of the result stage tasks
+        """
+        result_stage = self.new_stage(rdd, {})
+        log.debug('Job %s: %s depends on %s.', job.job_id, result_stage, result_stage.parents)
+
+        self.run_stages(result_stage.parents, job)
+        self.broadcast_tables(result_stage.rdd)
+        return self.context._run_tasks(result_stage.rdd, func, partitions, result_stage.stage_id,
+                                       allow_local, stats, ordered, job)
+
+    def new_stage(self, rdd, shuffle_stages, shuffled_rdd=None):
+        """Create a stage with a new id and the stages it depends on.
+
+        :param RDD rdd: the RDD computed by the stage
+        :param dict shuffle_stages: the shuffle map stages already created for
+            this job by shuffle id
+        :param ShuffledRDD shuffled_rdd: the RDD reading the output of a
+            shuffle map stage
+        :rtype: Stage
+        """
+        parents = []
+        for dependency in self.get_missing_shuffle_dependencies(rdd):
+            if dependency.shuffle_id not in shuffle_stages:
+                shuffle_stages[dependency.shuffle_id] = self.new_stage(
+                    dependency.prev, shuffle_stages, dependency)
+            parents.append(shuffle_stages[dependency.shuffle_id])
+        return Stage(self.context.newStageId(), fuse(rdd), parents, shuffled_rdd)
+
+    def get_missing_shuffle_dependencies(self, rdd):
+        """Find the shuffles whose outputs are needed to compute rdd.
+
+        The lineage is followed through narrow dependencies only. Shuffles with
+        available outputs and persisted RDDs with cached partitions do not
+        need their own lineage to be computed.
+
+        :rtype: list
+        """
+        dependencies = []
+        to_visit = [rdd]
+        visited = set()
+        while to_visit:
+            current = to_visit.pop()
+            if id(current) in visited:
+                continue
+            visited.add(id(current))
+
+            if isinstance(current, ShuffledRDD):
+                if not current.is_available():
+                    dependencies.append(current)
+                continue
+            if isinstance(current, PersistedRDD) and self.is_cached(current):
+                continue
+
+            prev = getattr(current, 'prev', None)
+            if prev is not None:
+                to_visit.append(prev)
+            to_visit += getattr(current, 'prevs', ())
+        return dependencies
+
+    def is_cached(self, rdd):
+        return all(self.context._is_block_stored((rdd.id(), partition.index))
+                   for partition in rdd.partitions())
+
+    def broadcast_tables(self, rdd):
+        """Build the hash tables of the broadcast joins computed by a stage.
+
+        The RDD collected into the hash table of a join is computed by a
+        job of its own, before the tasks of the stage are sent.
+        """
+        for current in narrow_lineage(rdd):
+            if isinstance(current, BroadcastHashJoinRDD):
+                current.broadcast_table()
+
+    def run_stages(self, stages, job):
+        """Run independent shuffle map stages concurrently."""
+        if len(stages) <= 1:
+            for stage in stages:
+                self.run_shuffle_map_stage(stage, job)
+            return
+
+        cancel_requested = getattr(self.context._job_local, 'cancel_requested', None)
+
+        def run(stage):
+            # the stage belongs to the same action as the calling thread
+            self.context._job_local.cancel_requested = cancel_requested
+            try:
+                self.run_shuffle_map_stage(stage, job)
+            finally:
+                self.context._job_local.cancel_requested = None
+
+        with ThreadPoolExecutor(len(stages), thread_name_prefix='pysparkling-stage') as executor:
+            for _ in executor.map(run, stages):
+                pass
+
+    def run_shuffle_map_stage(self, stage, job):
+        """Write the map outputs of a stage unless they are available already.
+
+        Jobs running concurrently in other threads wait for the map stage
+        instead of running it a second time.
+        """
+        shuffled_rdd = stage.shuffled_rdd
+        with shuffled_rdd._map_stage_lock:
+            if shuffled_rdd.is_available():
+                log.debug('Skipping %s, its outputs are available.', stage)
+                return
+
+            self.run_stages(stage.parents, job)
+            self.broadcast_tables(stage.rdd)
+
+            log.debug('Running %s.', stage)
+            stats = defaultdict(float)
+            try:
+                # the map statuses are not used in order of the partitions
+                map_statuses = list(self.context._run_tasks(
+                    stage.rdd, shuffled_rdd.map_output_writer(), stage.rdd.partitions(),
+                    stage.stage_id, False, stats, ordered=False, job=job))
+            finally:
+                self.context._add_stats(stats)
+            shuffled_rdd.register_map_outputs(map_statuses)
+
+
+def narrow_lineage(rdd):
+    """Iterate over rdd and the RDDs it depends on within its stage.
+
+    The :class:`ShuffledRDD` at the boundaries of the stage are included.
+    """
+    to_visit = [rdd]
+    visited = set()
+    while to_visit:
+        current = to_visit.pop()
+        if id(current) in visited:
+            continue
+        visited.add(id(current))
+        yield current
+
+        if isinstance(current, ShuffledRDD):
+            continue
+        prev = getattr(current, 'prev', None)
+        if prev is not None:
+            to_visit.append(prev)
+        to_visit += getattr(current, 'prevs', ())
+
+
+def persisted_blocks(rdd, split):
+    """Idents of the cached partitions that computing a partition may read.
+
+    The partition is followed through the RDDs of its stage, e.g. to the
+    partition of the RDD it comes from in a union or to the pair of
+    partitions of a cartesian product.
+
+    :param RDD rdd: an RDD of the stage
+    :param Partition split: a partition of rdd
+    :returns: (RDD id, partition index) of the partitions of every
+        :class:`~pysparkling.rdd.PersistedRDD` that is read
+    :rtype: list
+    """
+    blocks = []
+    to_visit = [(rdd, split)]
+    while to_visit:
+        current, current_split = to_visit.pop()
+        if isinstance(current, PersistedRDD):
+            blocks.append((current.id(), current_split.index))
+
+        if isinstance(current, ShuffledRDD):
+            continue
+        if isinstance(current, UnionRDD):
+            rdd_index, parent_split = current_split.x()
+            to_visit.append((current.prevs[rdd_index], parent_split))
+        elif isinstance(current, CoalescedRDD):
+            to_visit += [(current.prev, parent_split) for parent_split in current_split.x()]
+        elif isinstance(current, (CartesianRDD, ZippedPartitionsRDD)):
+            to_visit += zip(current.prevs, current_split.x())
+        elif getattr(current, 'prev', None) is not None:
+            # the other RDDs have the partitions of their previous RDD
+            to_visit.append((current.prev, current_split))
+    return blocks
+
+
+def fuse(rdd, fused=None):
+    """Fuse the chains of :class:`MapPartitionsRDD` in the stage of rdd.
+
+    Every maximal chain is replaced by a :class:`PipelinedRDD`, including
+    the chains before the parents of the RDDs in :data:`FUSED_THROUGH`,
+    like the RDDs of a union or a zip. These RDDs are shallow copies with
+    fused parents, the RDDs of the lineage are not modified. The chains
+    before other RDDs, like a :class:`~pysparkling.rdd.BroadcastHashJoinRDD`
+    whose hash table is built by the scheduler, are not fused.
+
+    :param RDD rdd: the RDD computed by the stage
+    :param dict fused: (optional) fused RDDs by id of the RDD they replace,
+        for RDDs reached by several paths
+    :returns: rdd if nothing is fused, an RDD computing the same partitions
+        otherwise, with the same id
+    """
+    if fused is None:
+        fused = {}
+    if id(rdd) in fused:
+        return fused[id(rdd)]
+
+    functions = []
+    prev = rdd
+    while isinstance(prev, MapPartitionsRDD):
+        functions.append(prev.f)
+        prev = prev.prev
+    fused_prev = fuse_parents(prev, fused)
+
+    if fused_prev is prev and len(functions) < 2:
+        result = rdd
+    elif functions:
+        result = PipelinedRDD(rdd, fused_prev, functions[::-1])
+    else:
+        result = fused_prev
+    fused[id(rdd)] = result
+    return result
+
+
+def fuse_parents(rdd, fused):
+    """Fuse the chains before the parents of rdd.
+
+    :returns: a copy of rdd with the fused parents, rdd if nothing is fused
+    """
+    if not isinstance(rdd, FUSED_THROUGH):
+        return rdd
+
+    if hasattr(rdd, 'prevs'):
+        prevs = type(rdd.prevs)(fuse(prev, fused) for prev in rdd.prevs)
+        if all(new is old for new, old in zip(prevs, rdd.prevs)):
+            return rdd
+        return copy_rdd(rdd, prevs=prevs)
+
+    prev = fuse(rdd.prev, fused)
+    if prev is rdd.prev:
+        return rdd
+    return copy_rdd(rdd, prev=prev)
+
+
+def copy_rdd(rdd, **attributes):
+    """Shallow copy of rdd with other values of some attributes.
+
+    Unlike :func:`copy.copy`, the partitions are copied, they are not part
+    of the pickled state of an RDD.
+    """
+    rdd_copy = object.__new__(type(rdd))
+    rdd_copy.__dict__.update(rdd.__dict__, **attributes)
+    return rdd_copy
@@ -0,0 +1,176 @@
+"""Transfer of partitions and results through shared memory.
+
+:func:`dumps` and :func:`loads` can be used as the data serializer and
+deserializer of a :class:`~pysparkling.Context`. They pickle with protocol 5
+and put the large buffers found in the data out-of-band in a shared memory
+block instead of the pickled bytes: ``bytes``, ``bytearray``,
+``array.array`` and objects supporting out-of-band buffers like NumPy
+arrays. Only the name of the block goes through the pipe of the pool.
+Pickling many small objects is slower than with :func:`pickle.dumps`, this
+is meant for partitions and results made of large buffers.
+
+Shared memory and out-of-band buffers require Python 3.8. With older
+versions, :func:`dumps` and :func:`loads` are :func:`pickle.dumps` and
+:func:`pickle.loads`.
+
+The block is copied once by the process loading the data and destroyed,
+which requires that the processes use the same resource tracker, e.g. the
+driver and the workers of a :class:`~pysparkling.executor.ProcessPool`.
+Data that is not loaded, e.g. the results of the other tasks of a failed
+job, is destroyed with :func:`release`.
+
+>>> import array
+>>> data = loads(dumps([array.array('d', range(100000)), b'1' * 100000, 1]))
+>>> data[0][-1], len(data[1]), data[2]
+(99999.0, 100000, 1)
+"""
+import array
+import io
+import pickle
+
+try:
+    from multiprocessing.shared_memory import SharedMemory
+except ImportError:  # Python < 3.8
+    SharedMemory = None
+
+# buffers smaller than this are pickled in-band
+MIN_BUFFER_SIZE = 64 * 1024
+
+BUFFER_TYPES = {bytes, bytearray, array.array}
+
+
+class SharedBuffers:
+    """Pickled data whose large buffers are in a shared memory block.
+
+    :param bytes data: the pickled data
+    :param str name: name of the shared memory block
+    :param list sizes: sizes of the buffers stored one after the other in
+        the block
+    :param list out_of_band: indices of the out-of-band buffers of the
+        pickled data, the others are referenced by persistent ids
+    """
+
+    def __init__(self, data, name, sizes, out_of_band):
+        self.data = data
+        self.name = name
+        self.sizes = sizes
+        self.out_of_band = out_of_band
+
+
+class BufferPickler(pickle.Pickler):
+    """Pickler keeping large buffers out of the pickled data.
+
+    ``bytes``, ``bytearray`` and ``array.array`` are pickled by the pickler
+    itself and are replaced by persistent ids. Other objects supporting
+    out-of-band buffers give them to the buffer callback.
+    """
+
+    def __init__(self, file):
+        super().__init__(file, protocol=5, buffer_callback=self.buffer_callback)
+        self.buffers = []
+        self.out_of_band = []
+
+    def persistent_id(self, obj):
+        # called for every object, most of them are not buffers
+        if type(obj) not in BUFFER_TYPES:
+            return None
+        buffer = memoryview(obj).cast('B')
+        if buffer.nbytes < MIN_BUFFER_SIZE:
+            return None
+        self.buffers.append(buffer)
+        return len(self.buffers) - 1, obj.typecode if isinstance(obj, array.array) else type(obj).__name__
+
+    def buffer_callback(self, buffer):
+        raw = buffer.raw()
+        if raw.nbytes < MIN_BUFFER_SIZE:
+            return True
+        self.out_of_band.append(len(self.buffers))
+        self.buffers.append(raw)
+        return False
+
+
+class BufferUnpickler(pickle.Unpickler):
+    """Unpickler of the output of :class:`BufferPickler`."""
+
+    def __init__(self, file, buffers, out_of_band):
+        super().__init__(file, buffers=[buffers[i] for i in out_of_band])
+        self.loaded_buffers = buffers
+
+    def persistent_load(self, pid):
+        index, kind = pid
+        buffer = self.loaded_buffers[index]
+        if kind == 'bytes':
+            return bytes(buffer)
+        if kind == 'bytearray':
+            return buffer
+        a = array.array(kind)
+        a.frombytes(buffer)
+        return a
+
+
+def dumps(obj):
+    """Pickle obj with its large buffers in a shared memory block.
+
+    :returns: the pickled bytes if obj does not contain large buffers
+    :rtype: bytes or SharedBuffers
+    """
+    if SharedMemory is None:
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    f = io.BytesIO()
+    pickler = BufferPickler(f)
+    pickler.dump(obj)
+    if not pickler.buffers:
+        return f.getvalue()
+
+    sizes = [buffer.nbytes for buffer in pickler.buffers]
+    shm = SharedMemory(create=True, size=sum(sizes))
+    try:
+        offset = 0
+        for buffer in pickler.buffers:
+            shm.buf[offset:offset + buffer.nbytes] = buffer
+            offset += buffer.nbytes
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.close()
+    return SharedBuffers(f.getvalue(), shm.name, sizes, pickler.out_of_band)
+
+
+def loads(data):
+    """Unpickle the output of :func:`dumps` and destroy its shared memory
+    block."""
+    if not isinstance(data, SharedBuffers):
+        # without buffers, the data does not contain persistent ids
+        return pickle.loads(data)
+
+    shm = SharedMemory(data.name)
+    try:
+        buffers = []
+        offset = 0
+        for size in data.sizes:
+            with shm.buf[offset:offset + size] as view:
+                buffers.append(bytearray(view))
+            offset += size
+    finally:
+        shm.close()
+        shm.unlink()
+    return BufferUnpickler(io.BytesIO(data.data), buffers, data.out_of_band).load()
+
+
+def release(data):
+    """Destroy the shared memory block of the output of :func:`dumps`
+    without unpickling it.
+
+    Nothing is done for pickled bytes or if the block was destroyed by
+    :func:`loads` already.
+    """
+    if not isinstance(data, SharedBuffers):
+        return
+    try:
+        shm = SharedMemory(data.name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
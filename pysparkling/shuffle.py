@@ -0,0 +1,115 @@
+"""Storage for the map outputs of shuffles."""
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import weakref
+
+log = logging.getLogger(__name__)
+
+
+class ShuffleManager:
+    """In-memory shuffle storage.
+
+    Map tasks write one bucket per reduce partition and reduce tasks read
+    the buckets of their partition from all map tasks. The buckets are kept
+    in the memory of the current process, which is sufficient when all tasks
+    run in the driver process (e.g. with the default ``DummyPool``).
+    """
+
+    def __init__(self):
+        self.blocks = {}
+
+    def write(self, shuffle_id, map_id, buckets):
+        """Store the output of a map task.
+
+        :param int shuffle_id: id of the shuffle
+        :param int map_id: index of the map partition
+        :param list buckets: a list of records for every reduce partition
+        :returns: number of records in every bucket
+        :rtype: list
+        """
+        for reduce_id, bucket in enumerate(buckets):
+            if bucket:
+                self.blocks[(shuffle_id, map_id, reduce_id)] = bucket
+        return [len(bucket) for bucket in buckets]
+
+    def read(self, shuffle_id, map_ids, reduce_id):
+        """Iterate over the records of a reduce partition.
+
+        :param int shuffle_id: id of the shuffle
+        :param map_ids: indices of the map partitions to read from
+        :param int reduce_id: index of the reduce partition
+        """
+        for map_id in map_ids:
+            yield from self.blocks.get((shuffle_id, map_id, reduce_id), ())
+
+    def remove(self, shuffle_id):
+        """Remove all map outputs of a shuffle.
+
+        It is called when the :class:`~pysparkling.rdd.ShuffledRDD` reading
+        them is garbage collected, possibly while tasks of other shuffles
+        write their outputs.
+        """
+        for ident in [i for i in list(self.blocks) if i[0] == shuffle_id]:
+            self.blocks.pop(ident, None)
+
+
+class DiskShuffleManager(ShuffleManager):
+    """Shuffle storage in spill files.
+
+    Every non-empty bucket is pickled to its own file in a temporary
+    directory that is shared by all worker processes on this machine.
+    Only the location of the directory is pickled with this object, so it
+    can be sent to workers together with the tasks. The directory is removed
+    when the instance that created it is garbage collected.
+
+    :param local_dir: (optional) parent directory for the spill files
+    :param serializer: Use to serialize buckets.
+    :param deserializer: Use to deserialize buckets.
+    """
+
+    def __init__(self, local_dir=None, serializer=None, deserializer=None):
+        super().__init__()
+        self.serializer = serializer if serializer else pickle.dumps
+        self.deserializer = deserializer if deserializer else pickle.loads
+        self.local_dir = tempfile.mkdtemp(prefix='pysparkling-shuffle-',
+                                          dir=local_dir)
+        weakref.finalize(self, shutil.rmtree, self.local_dir, True)
+
+    def _path(self, shuffle_id, map_id, reduce_id):
+        return os.path.join(self.local_dir,
+                            f'shuffle_{shuffle_id}_{map_id}_{reduce_id}')
+
+    def write(self, shuffle_id, map_id, buckets):
+        for reduce_id, bucket in enumerate(buckets):
+            if not bucket:
+                continue
+            path = self._path(shuffle_id, map_id, reduce_id)
+            # write and rename so that retried tasks never leave partial files
+            with open(path + '.tmp', 'wb') as f:
+                f.write(self.serializer(bucket))
+            os.replace(path + '.tmp', path)
+        log.debug('Wrote map output %s of shuffle %s to disk.', map_id, shuffle_id)
+        return [len(bucket) for bucket in buckets]
+
+    def read(self, shuffle_id, map_ids, reduce_id):
+        for map_id in map_ids:
+            path = self._path(shuffle_id, map_id, reduce_id)
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                bucket = self.deserializer(f.read())
+            yield from bucket
+
+    def remove(self, shuffle_id):
+        prefix = f'shuffle_{shuffle_id}_'
+        try:
+            file_names = os.listdir(self.local_dir)
+        except FileNotFoundError:
+            # the directory was removed with its shuffle manager
+            return
+        for file_name in file_names:
+            if file_name.startswith(prefix):
+                os.remove(os.path.join(self.local_dir, file_name))
@@ -1,5 +1,5 @@
 from .expressions.expressions import Expression
-from .expressions.fields import find_position_in_schema
+from .expressions.fields import bind_position
 from .expressions.literals import Literal
 from .expressions.mappers import CaseWhen, StarOperator
 from .expressions.operators import (
@@ -31,6 +31,7 @@ class Column:
 
     def __init__(self, expr):
         self.expr = expr
+        self._binding = None
 
     # arithmetic operators
     def __neg__(self):
@@ -599,7 +600,12 @@ class Column:
         return [schema[self.find_position_in_schema(schema)]]
 
     def find_position_in_schema(self, schema):
-        return find_position_in_schema(schema, self.expr)
+        binding = bind_position(self._binding, schema, self.expr)
+        self._binding = binding
+        return binding[1]
+
+    def __getstate__(self):
+        return {**self.__dict__, "_binding": None}
 
     @property
     def may_output_multiple_cols(self):
@@ -1,5 +1,47 @@
 _sentinel = object()
 
+AUTO_BROADCAST_JOIN_THRESHOLD = "spark.sql.autoBroadcastJoinThreshold"
+COLUMNAR_EXECUTION_ENABLED = "spark.pysparkling.sql.columnarExecution.enabled"
+
+# Values of the supported configurations when they are not set
+_DEFAULTS = {
+    # Maximum size in bytes of a side of a join for it to be broadcast
+    # to all tasks, -1 disables automatic broadcasting
+    AUTO_BROADCAST_JOIN_THRESHOLD: str(10 * 1024 * 1024),
+    # Whether select, filter, withColumn and simple aggregations
+    # process partitions as batches of columns instead of rows
+    COLUMNAR_EXECUTION_ENABLED: "false",
+}
+
+_BYTE_UNITS = {"b": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+
+
+def parse_bytes(value):
+    """Parse a size in bytes with an optional unit suffix as used by Spark.
+
+    >>> parse_bytes("10485760")
+    10485760
+    >>> parse_bytes("10m")
+    10485760
+    >>> parse_bytes(-1)
+    -1
+    """
+    value = str(value).strip().lower()
+    if value.endswith("b") and value[-2:-1] in _BYTE_UNITS:
+        value = value[:-1]
+    if value[-1:] in _BYTE_UNITS:
+        return int(value[:-1]) * _BYTE_UNITS[value[-1]]
+    return int(value)
+
+
+def parse_boolean(value):
+    """Parse a boolean configuration value.
+
+    >>> parse_boolean("true"), parse_boolean(False), parse_boolean("FALSE")
+    (True, False, False)
+    """
+    return str(value).strip().lower() == "true"
+
 
 class RuntimeConfig:
     def __init__(self, jconf=None):
@@ -11,7 +53,7 @@ class RuntimeConfig:
     def get(self, key, default=_sentinel):
         self._checkType(key, "key")
         if default is _sentinel:
-            return self._conf.get(key)
+            return self._conf.get(key, _DEFAULTS.get(key))
         if default is not None:
             self._checkType(default, "default")
         return self._conf.get(key, default)
@@ -1,3 +1,4 @@
+from .conf import _sentinel
 from .session import SparkSession
 
 
@@ -35,3 +36,12 @@ class SQLContext:
         """Sets the given Spark SQL configuration property.
         """
         self.sparkSession.conf.set(key, value)
+
+    def getConf(self, key, defaultValue=_sentinel):
+        """Returns the value of Spark SQL configuration property for the given key.
+
+        If the key is not set and defaultValue is set, return
+        defaultValue. If the key is not set and defaultValue is not set, return
+        the system default value.
+        """
+        return self.sparkSession.conf.get(key, defaultValue)
@@ -1,14 +1,15 @@
+from functools import partial
 import warnings
 
 from ..storagelevel import StorageLevel
 from .column import Column, parse
+from .conf import AUTO_BROADCAST_JOIN_THRESHOLD, COLUMNAR_EXECUTION_ENABLED, parse_boolean, parse_bytes
 from .expressions.fields import FieldAsExpression
 from .group import GroupedData
 from .internal_utils.joins import CROSS_JOIN, JOIN_TYPES
 from .internals import CUBE_TYPE, InternalGroupedDataFrame, ROLLUP_TYPE
 from .types import (
-    _check_series_convert_timestamps_local_tz, ByteType, FloatType, IntegerType, IntegralType, ShortType,
-    TimestampType
+    _check_series_convert_timestamps_local_tz, ByteType, FloatType, IntegerType, IntegralType, ShortType, TimestampType
 )
 from .utils import AnalysisException, IllegalArgumentException, require_minimum_pandas_version
 
@@ -24,6 +25,16 @@ class DataFrame:
     def rdd(self):
         return self._jdf.rdd()
 
+    @property
+    def _execution_jdf(self):
+        """
+        Internal DataFrame on which operators are applied: when columnar execution
+        is enabled, the operators that support it process batches of columns
+        """
+        if parse_boolean(self.sql_ctx.getConf(COLUMNAR_EXECUTION_ENABLED)):
+            return self._jdf.columnar()
+        return self._jdf
+
     @property
     def is_cached(self):
         return self._jdf.is_cached()
@@ -199,6 +210,24 @@ class DataFrame:
         raise NotImplementedError("Streaming is not supported in PySparkling")
 
     def hint(self, name, *parameters):
+        """Specifies some hint on the current DataFrame.
+
+        The ``broadcast`` hint (or its aliases ``broadcastjoin`` and
+        ``mapjoin``) makes joins ship the rows of this DataFrame to every
+        task instead of shuffling both sides. Other hints are ignored.
+
+        >>> from pysparkling import Context, Row
+        >>> from pysparkling.sql.session import SparkSession
+        >>> spark = SparkSession(Context())
+        >>> df = spark.createDataFrame([Row(age=2, name='Alice'), Row(age=5, name='Bob')])
+        >>> df2 = spark.createDataFrame([Row(height=80, name='Tom'), Row(height=85, name='Bob')])
+        >>> df.join(df2.hint("broadcast"), "name").show()
+        +----+---+------+
+        |name|age|height|
+        +----+---+------+
+        | Bob|  5|    85|
+        +----+---+------+
+        """
         if len(parameters) == 1 and isinstance(parameters[0], list):
             parameters = parameters[0]
 
@@ -211,8 +240,7 @@ class DataFrame:
                 raise TypeError(
                     f"all parameters should be in {allowed_types}, got {p} of type {type(p)}")
 
-        # No hint are supported by pysparkling hence nothing is done here
-        jdf = self._jdf
+        jdf = self._jdf.hint(name, parameters)
         return DataFrame(jdf, self.sql_ctx)
 
     def count(self):
@@ -227,6 +255,17 @@ class DataFrame:
         """
         return self._jdf.count()
 
+    def countAsync(self):
+        """Returns a future of the number of rows in this :class:`DataFrame`.
+
+        >>> from pysparkling import Context
+        >>> from pysparkling.sql.session import SparkSession
+        >>> spark = SparkSession(Context())
+        >>> spark.range(2).countAsync().result()
+        2
+        """
+        return self.sql_ctx._sc._submit_action(self.count)
+
     def collect(self):
         """Returns the number of rows in this :class:`DataFrame`.
 
@@ -239,6 +278,20 @@ class DataFrame:
         """
         return self._jdf.collect()
 
+    def collectAsync(self):
+        """Returns a future of the list of the rows of this :class:`DataFrame`.
+
+        The result is a :class:`concurrent.futures.Future`, or an asyncio
+        future when called from a running event loop.
+
+        >>> from pysparkling import Context
+        >>> from pysparkling.sql.session import SparkSession
+        >>> spark = SparkSession(Context())
+        >>> spark.range(2).collectAsync().result()
+        [Row(id=0), Row(id=1)]
+        """
+        return self.sql_ctx._sc._submit_action(self.collect)
+
     def toLocalIterator(self):
         """Returns an iterator on the content of this DataFrame
 
@@ -278,6 +331,17 @@ class DataFrame:
         """
         return self._jdf.take(n)
 
+    def takeAsync(self, n):
+        """Return a future of a list with the first n items of the DataFrame
+
+        >>> from pysparkling import Context
+        >>> from pysparkling.sql.session import SparkSession
+        >>> spark = SparkSession(Context())
+        >>> spark.range(2).takeAsync(1).result()
+        [Row(id=0)]
+        """
+        return self.sql_ctx._sc._submit_action(partial(self.take, n))
+
     def foreach(self, f):
         """Execute a function for each item of the DataFrame
 
@@ -307,6 +371,21 @@ class DataFrame:
         """
         self._jdf.foreachPartition(f)
 
+    def foreachPartitionAsync(self, f):
+        """Return a future of the execution of a function for each partition of the DataFrame
+
+        >>> from pysparkling import Context
+        >>> from pysparkling.sql.session import SparkSession
+        >>> spark = SparkSession(Context())
+        >>> partitions = []
+        >>> (spark.range(4, numPartitions=2)
+        ...       .foreachPartitionAsync(lambda partition: partitions.append(list(partition)))
+        ...       .result())
+        >>> partitions
+        [[Row(id=0), Row(id=1)], [Row(id=2), Row(id=3)]]
+        """
+        return self.sql_ctx._sc._submit_action(partial(self.foreachPartition, f))
+
     def cache(self):
         """Cache the DataFrame
 
@@ -331,10 +410,6 @@ class DataFrame:
         >>> df.storageLevel == StorageLevel.MEMORY_ONLY
         True
         """
-        if storageLevel != StorageLevel.MEMORY_ONLY:
-            raise NotImplementedError(
-                "Pysparkling currently only supports memory as the storage level"
-            )
         return DataFrame(self._jdf.persist(storageLevel), self.sql_ctx)
 
     @property
@@ -433,9 +508,9 @@ class DataFrame:
         ...   [[0], [1], [1], [2]],
         ...   ["v"]
         ... ).repartition(3, "v").rdd.foreachPartition(lambda x: print((list(x))))
+        []
         [Row(v=0)]
-        [Row(v=1), Row(v=1)]
-        [Row(v=2)]
+        [Row(v=1), Row(v=1), Row(v=2)]
         """
         if isinstance(numPartitions, int):
             if not cols:
@@ -744,7 +819,8 @@ class DataFrame:
                 "Use the CROSS JOIN syntax to allow cartesian products"
             )
 
-        return DataFrame(self._jdf.join(other._jdf, on, how), self.sql_ctx)
+        broadcast_threshold = parse_bytes(self.sql_ctx.getConf(AUTO_BROADCAST_JOIN_THRESHOLD))
+        return DataFrame(self._jdf.join(other._jdf, on, how, broadcast_threshold), self.sql_ctx)
 
     def sortWithinPartitions(self, *cols, **kwargs):
         """
@@ -1056,7 +1132,7 @@ class DataFrame:
         +---+---+
         +---+---+
         """
-        jdf = self._jdf.select(*cols)
+        jdf = self._execution_jdf.select(*cols)
         return DataFrame(jdf, self.sql_ctx)
 
     def selectExpr(self, *expr):
@@ -1085,14 +1161,14 @@ class DataFrame:
             expr = expr[0]
         # pylint: disable=fixme
         # todo: handle expr like abs(age)
-        jdf = self._jdf.select(*expr)
+        jdf = self._execution_jdf.select(*expr)
         return DataFrame(jdf, self.sql_ctx)
 
     def filter(self, condition):
         if isinstance(condition, str):
-            jdf = self._jdf.filter(parse(condition))
+            jdf = self._execution_jdf.filter(parse(condition))
         elif isinstance(condition, Column):
-            jdf = self._jdf.filter(condition)
+            jdf = self._execution_jdf.filter(condition)
         else:
             raise TypeError("condition should be string or Column")
         return DataFrame(jdf, self.sql_ctx)
@@ -1120,7 +1196,7 @@ class DataFrame:
         | Carl|  5|    1|
         +-----+---+-----+
         """
-        jgd = InternalGroupedDataFrame(self._jdf, [parse(c) for c in cols])
+        jgd = InternalGroupedDataFrame(self._execution_jdf, [parse(c) for c in cols])
         return GroupedData(jgd, self)
 
     def rollup(self, *cols):
@@ -1309,7 +1385,7 @@ class DataFrame:
         ...     Row(name='Alice', age=5, height=80), \\
         ...     Row(name='Alice', age=5, height=80), \\
         ...     Row(name='Alice', age=10, height=80)]).toDF()
-        >>> df.dropDuplicates().show()
+        >>> df.dropDuplicates().orderBy('age').show()
         +---+------+-----+
         |age|height| name|
         +---+------+-----+
@@ -1549,7 +1625,7 @@ class DataFrame:
         +---+-----+-----------+
         """
         assert isinstance(col, Column), "col should be Column"
-        return DataFrame(self._jdf.withColumn(colName, col), self.sql_ctx)
+        return DataFrame(self._execution_jdf.withColumn(colName, col), self.sql_ctx)
 
     def withColumnRenamed(self, existing, new):
         return DataFrame(self._jdf.withColumnRenamed(existing, new), self.sql_ctx)
@@ -197,8 +197,12 @@ class TypeSafeBinaryOperation(BinaryOperation):
     """
 
     def eval(self, row, schema):
-        value_1 = self.arg1.eval(row, schema)
-        value_2 = self.arg2.eval(row, schema)
+        return self.operate(self.arg1.eval(row, schema), self.arg2.eval(row, schema))
+
+    def operate(self, value_1, value_2):
+        """
+        Apply the operation to the values of both arguments
+        """
         if value_1 is None or value_2 is None:
             return None
 
@@ -241,8 +245,12 @@ class NullSafeBinaryOperation(BinaryOperation):
     """
 
     def eval(self, row, schema):
-        value_1 = self.arg1.eval(row, schema)
-        value_2 = self.arg2.eval(row, schema)
+        return self.operate(self.arg1.eval(row, schema), self.arg2.eval(row, schema))
+
+    def operate(self, value_1, value_2):
+        """
+        Apply the operation to the values of both arguments
+        """
         if value_1 is None or value_2 is None:
             return None
 
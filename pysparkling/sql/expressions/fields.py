@@ -7,9 +7,15 @@ class FieldAsExpression(Expression):
     def __init__(self, field):
         super().__init__()
         self.field = field
+        self._binding = None
 
     def eval(self, row, schema):
-        return row[find_position_in_schema(schema, self.field)]
+        binding = bind_position(self._binding, schema, self.field)
+        self._binding = binding
+        return row[binding[1]]
+
+    def __getstate__(self):
+        return {**self.__dict__, "_binding": None}
 
     def __str__(self):
         return self.field.name
@@ -21,6 +27,19 @@ class FieldAsExpression(Expression):
         return (self.field,)
 
 
+def bind_position(binding, schema, expr):
+    """
+    Return a (schema, position) pair with the position of expr in schema
+
+    The same schema object is used to evaluate all the rows of a partition,
+    hence the position looked up for the first row is reused as long as
+    ``binding`` was computed for this schema.
+    """
+    if binding is not None and binding[0] is schema:
+        return binding
+    return schema, find_position_in_schema(schema, expr)
+
+
 def find_position_in_schema(schema, expr):
     if isinstance(expr, str):
         show_id = False
@@ -731,11 +731,24 @@ def create_map(*exprs):
 
 
 def broadcast(df):
-    """
-    :rtype: Column
-    """
-    # Broadcast is not implemented as Pysparkling is not distributed
-    return df
+    """Marks a DataFrame as small enough to be broadcast in joins.
+
+    >>> from pysparkling import Context, Row
+    >>> from pysparkling.sql.session import SparkSession
+    >>> spark = SparkSession(Context())
+    >>> df = spark.createDataFrame([Row(age=2, name='Alice'), Row(age=5, name='Bob')])
+    >>> df2 = spark.createDataFrame([Row(height=80, name='Tom'), Row(height=85, name='Bob')])
+    >>> broadcast(df).join(df2, "name", "right").orderBy("name").show()
+    +----+----+------+
+    |name| age|height|
+    +----+----+------+
+    | Bob|   5|    85|
+    | Tom|null|    80|
+    +----+----+------+
+
+    :rtype: DataFrame
+    """
+    return df.hint("broadcast")
 
 
 def coalesce(*exprs):
@@ -0,0 +1,218 @@
+"""
+Columnar execution of DataFrame operators
+
+In columnar mode, each partition of a DataFrame is stored as a ColumnBatch:
+one list of values per column instead of one Row per line. Operators whose
+expressions can be compiled run on whole columns and Row objects are only
+created when the rows themselves are needed, e.g. by collect() or take().
+"""
+from itertools import compress, repeat
+
+from ..column import Column
+from ..expressions.aggregate.stat_aggregations import Avg, Count, Max, Min, Sum
+from ..expressions.expressions import Expression
+from ..expressions.fields import FieldAsExpression, find_position_in_schema
+from ..expressions.mappers import StarOperator
+from ..expressions.operators import Alias
+from ..types import create_row
+from ..utils import AnalysisException
+from .compiler import compile_batch_columns
+
+
+class ColumnBatch:
+    """
+    Rows of a partition stored column by column
+
+    :param columns: list of the lists of values of each column
+    :param size: number of rows
+    :param metadata: list of the metadata of each row, None if no row has metadata
+    """
+
+    def __init__(self, columns, size, metadata=None):
+        self.columns = columns
+        self.size = size
+        self.metadata = metadata
+
+    def __len__(self):
+        return self.size
+
+    @classmethod
+    def from_rows(cls, rows, nb_columns):
+        rows = list(rows)
+        if rows:
+            columns = [list(column) for column in zip(*rows)]
+        else:
+            columns = [[] for _ in range(nb_columns)]
+        metadata = [row.get_metadata() for row in rows]
+        if all(row_metadata is None for row_metadata in metadata):
+            metadata = None
+        return cls(columns, len(rows), metadata)
+
+    def to_rows(self, names):
+        metadata = self.metadata if self.metadata is not None else repeat(None, self.size)
+        return [
+            create_row(names, values, row_metadata)
+            for values, row_metadata in zip(zip(*self.columns), metadata)
+        ]
+
+    def compress(self, mask):
+        """
+        Return a batch with the rows for which mask is true
+        """
+        columns = [list(compress(column, mask)) for column in self.columns]
+        metadata = list(compress(self.metadata, mask)) if self.metadata is not None else None
+        return ColumnBatch(columns, sum(map(bool, mask)), metadata)
+
+
+def rows_to_batches(nb_columns, rows):
+    return [ColumnBatch.from_rows(rows, nb_columns)]
+
+
+def batches_to_rows(names, batches):
+    for batch in batches:
+        yield from batch.to_rows(names)
+
+
+def get_field_position(col, schema):
+    """
+    Return the position in schema of the field referenced by col,
+    None if col is not a (possibly aliased) field
+    """
+    expr = col
+    while isinstance(expr, (Column, Alias)):
+        expr = expr.expr
+    if isinstance(expr, Expression) and not isinstance(expr, FieldAsExpression):
+        return None
+    try:
+        return find_position_in_schema(schema, expr)
+    except (AnalysisException, NotImplementedError):
+        return None
+
+
+def is_star(col):
+    return isinstance(col, Column) and isinstance(col.expr, StarOperator)
+
+
+def select_batch_mapper(cols, schema):
+    """
+    Return a function that applies a select of cols to the batches of a partition,
+    None if cols cannot be computed on batches
+    """
+    if not schema.fields or any(col.may_output_multiple_rows for col in cols):
+        return None
+    positions = [None if is_star(col) else get_field_position(col, schema) for col in cols]
+    computed_cols = [
+        col for col, position in zip(cols, positions)
+        if position is None and not is_star(col)
+    ]
+    if any(col.may_output_multiple_cols for col in computed_cols):
+        return None
+    if compile_batch_columns(computed_cols, schema) is None:
+        return None
+
+    def mapper(partition_index, batches):
+        compute = compile_batch_columns(
+            [col.initialize(partition_index) for col in computed_cols],
+            schema
+        )
+        for batch in batches:
+            computed_columns = compute(batch.columns, batch.size)
+            columns = []
+            for col, position in zip(cols, positions):
+                if is_star(col):
+                    columns += batch.columns
+                elif position is not None:
+                    columns.append(batch.columns[position])
+                else:
+                    columns.append(computed_columns.pop(0))
+            yield ColumnBatch(columns, batch.size, batch.metadata)
+
+    return mapper
+
+
+def filter_batch_mapper(condition, schema):
+    """
+    Return a function that filters the batches of a partition on condition,
+    None if condition cannot be computed on batches
+    """
+    if not schema.fields or compile_batch_columns([condition], schema) is None:
+        return None
+
+    def mapper(partition_index, batches):
+        compute = compile_batch_columns([condition.initialize(partition_index)], schema)
+        for batch in batches:
+            mask = compute(batch.columns, batch.size)[0]
+            yield batch.compress(mask)
+
+    return mapper
+
+
+# Functions that compute the result of an aggregation
+# from the count, sum, min and max of the non null values
+SIMPLE_AGGREGATIONS = {
+    Count: lambda count, total, minimum, maximum: count,
+    Sum: lambda count, total, minimum, maximum: total if count else None,
+    Min: lambda count, total, minimum, maximum: minimum if count else None,
+    Max: lambda count, total, minimum, maximum: maximum if count else None,
+    Avg: lambda count, total, minimum, maximum: total / count if count and total is not None else None,
+}
+
+
+def get_simple_aggregation(stat):
+    """
+    Return the aggregation computed by stat if it is a count, sum, min, max or avg, None otherwise
+    """
+    expr = stat
+    while isinstance(expr, (Column, Alias)):
+        expr = expr.expr
+    if type(expr) in SIMPLE_AGGREGATIONS:
+        return expr
+    return None
+
+
+def aggregate_columns(batch):
+    """
+    Return the number of rows of batch and the count, sum, min and max
+    of the non null values of each of its columns
+    """
+    return batch.size, [
+        aggregate_values([value for value in column if value is not None])
+        for column in batch.columns
+    ]
+
+
+# Count, sum, min and max of no values
+EMPTY_AGGREGATE = (0, 0, None, None)
+
+
+def aggregate_values(values):
+    if not values:
+        return EMPTY_AGGREGATE
+    try:
+        total = sum(values)
+    except TypeError:
+        total = None
+    return len(values), total, min(values), max(values)
+
+
+def merge_aggregates(aggregates_1, aggregates_2):
+    size_1, column_aggregates_1 = aggregates_1
+    size_2, column_aggregates_2 = aggregates_2
+    return size_1 + size_2, [
+        merge_aggregate(aggregate_1, aggregate_2)
+        for aggregate_1, aggregate_2 in zip(column_aggregates_1, column_aggregates_2)
+    ]
+
+
+def merge_aggregate(aggregate_1, aggregate_2):
+    count_1, total_1, min_1, max_1 = aggregate_1
+    count_2, total_2, min_2, max_2 = aggregate_2
+    if not count_2:
+        return aggregate_1
+    if not count_1:
+        return aggregate_2
+    try:
+        total = total_1 + total_2
+    except TypeError:
+        total = None
+    return count_1 + count_2, total, min(min_1, min_2), max(max_1, max_2)
@@ -1,10 +1,20 @@
-def resolve_column(col, row, schema, allow_generator=True):
+def get_output_cols(col, schema):
+    """
+    Return the list of column names corresponding to a column and a schema
+    """
+    return [field.name for field in col.output_fields(schema)]
+
+
+def resolve_column(col, row, schema, allow_generator=True, output_cols=None):
     """
     Return the list of column names corresponding to a column value and a schema and:
     If allow generator is False, a list of values corresponding to a row
     If allow generator is True, a list of list of values, each list correspond to a row
+
+    output_cols can be given when the column names were already computed with get_output_cols
     """
-    output_cols = [field.name for field in col.output_fields(schema)]
+    if output_cols is None:
+        output_cols = get_output_cols(col, schema)
 
     output_values = col.eval(row, schema)
 
@@ -0,0 +1,503 @@
+"""
+Compile trees of expressions into Python functions
+
+Evaluating a Column calls ``eval`` on each node of its expression tree for
+each row. When a transformation is applied to a partition, the expressions it
+uses are instead compiled once into a single generated Python function that
+takes a row and computes all of them:
+
+- fields are resolved to their position in the schema at compile time
+- literals and pure expressions that only depend on literals are evaluated
+  at compile time (constant folding)
+- identical pure subexpressions are computed only once
+  (common subexpression elimination)
+- expression types without a compiled form are evaluated with their own
+  ``eval`` method, as usual
+
+>>> from pysparkling.sql.functions import col, lit, upper
+>>> from pysparkling.sql.types import LongType, Row, StringType, StructField, StructType
+>>> schema = StructType([StructField("name", StringType()), StructField("age", LongType())])
+>>> f = compile_columns([upper(col("name")), col("age") + lit(1) * lit(2)], schema)
+>>> f(Row("Alice", 2))
+['ALICE', 4]
+"""
+from contextlib import contextmanager
+import math
+
+from ..column import Column
+from ..expressions.expressions import Expression, NullSafeColumnOperation
+from ..expressions.fields import FieldAsExpression, find_position_in_schema
+from ..expressions.literals import Literal
+from ..expressions.mappers import (
+    Abs, Acos, Asin, Atan, CaseWhen, Ceil, Coalesce, Cos, Cosh, Exp, ExpM1, Factorial, Floor, Length, Log1p, Log10,
+    Lower, Otherwise, Rint, Sin, Sinh, Sqrt, StarOperator, Tan, Tanh, ToDegrees, ToRadians, Upper
+)
+from ..expressions.operators import (
+    Add, Alias, And, BitwiseAnd, BitwiseNot, BitwiseOr, BitwiseXor, Cast, Contains, Divide, EndsWith, EqNullSafe,
+    Equal, GreaterThan, GreaterThanOrEqual, Invert, IsIn, IsNotNull, IsNull, LessThan, LessThanOrEqual, Minus, Mod,
+    Negate, Or, Pow, StartsWith, Substring, Time, UnaryPositive
+)
+from ..expressions.strings import StringLTrim, StringRTrim, StringTrim
+from ..utils import AnalysisException
+
+# Null and type safe binary operations, as applied to values of the same type
+CHECKED_BINARY_OPERATIONS = {
+    Add: "{0} + {1}",
+    Minus: "{0} - {1}",
+    Time: "{0} * {1}",
+    Divide: "{0} / {1} if {1} != 0 else None",
+    Mod: "{0} % {1}",
+    Pow: "float({0} ** {1})",
+    Equal: "{0} == {1}",
+    LessThan: "{0} < {1}",
+    LessThanOrEqual: "{0} <= {1}",
+    GreaterThan: "{0} > {1}",
+    GreaterThanOrEqual: "{0} >= {1}",
+    And: "{0} and {1}",
+    Or: "{0} or {1}",
+}
+
+# Binary operations that are applied as is
+BINARY_OPERATIONS = {
+    BitwiseOr: "{0} | {1}",
+    BitwiseAnd: "{0} & {1}",
+    BitwiseXor: "{0} ^ {1}",
+    EqNullSafe: "{0} == {1}",
+}
+
+# Unary operations, either as a template or as a function applied to the value
+UNARY_OPERATIONS = {
+    Negate: "-{0}",
+    UnaryPositive: "{0}",
+    Invert: "None if {0} is None else not {0}",
+    BitwiseNot: "~{0}",
+    IsNull: "{0} is None",
+    IsNotNull: "{0} is not None",
+    Length: "len(str({0}))",
+    Lower: "str({0}).lower()",
+    Upper: "str({0}).upper()",
+    StringTrim: "{0}.strip()",
+    StringLTrim: "{0}.lstrip()",
+    StringRTrim: "{0}.rstrip()",
+    Abs: abs,
+    Rint: round,
+    Sqrt: math.sqrt,
+    Exp: math.exp,
+    ExpM1: math.expm1,
+    Factorial: math.factorial,
+    Floor: math.floor,
+    Ceil: math.ceil,
+    Log10: math.log10,
+    Log1p: math.log1p,
+    Cos: math.cos,
+    Cosh: math.cosh,
+    Sin: math.sin,
+    Sinh: math.sinh,
+    Tan: math.tan,
+    Tanh: math.tanh,
+    Acos: math.acos,
+    Asin: math.asin,
+    Atan: math.atan,
+    ToDegrees: math.degrees,
+    ToRadians: math.radians,
+}
+
+# Above this number of branches, conditional expressions are not compiled
+# as their nested blocks would exceed the indentation limit of Python
+MAX_COMPILED_BRANCHES = 30
+
+_NO_VALUE = object()
+
+
+class CompiledValue:
+    """
+    Result of the compilation of an expression
+
+    :param code: Python code of a variable or constant holding the value
+    :param key: Structural key of a pure expression used to share its value
+        with identical expressions, None if the value must not be shared
+    :param value: Value of the expression if it is known at compile time
+    """
+
+    def __init__(self, code, key=None, value=_NO_VALUE):
+        self.code = code
+        self.key = key
+        self.value = value
+
+    @property
+    def is_constant(self):
+        return self.value is not _NO_VALUE
+
+
+class ExpressionCompiler:
+    def __init__(self, schema):
+        self.schema = schema
+        self.lines = []
+        self.indentation = 1
+        self.scopes = [{}]
+        self.constants = {}
+        self.constant_names = {}
+        self.variable_count = 0
+
+    def compile(self, expr):  # pylint: disable=too-many-return-statements, too-many-branches
+        """
+        Emit the code computing expr and return the corresponding CompiledValue
+        """
+        if isinstance(expr, Column):
+            if isinstance(expr.expr, Expression):
+                return self.compile(expr.expr)
+            return self.compile_field(expr, expr.expr)
+        if isinstance(expr, FieldAsExpression):
+            return self.compile_field(expr, expr)
+        if isinstance(expr, Literal):
+            return self.constant_value(expr.value)
+        if isinstance(expr, Alias):
+            return self.compile(expr.expr)
+
+        expression_type = type(expr)
+        if expression_type in CHECKED_BINARY_OPERATIONS:
+            return self.compile_checked_binary_operation(expr, CHECKED_BINARY_OPERATIONS[expression_type])
+        if expression_type in BINARY_OPERATIONS:
+            return self.compile_operation(expr, BINARY_OPERATIONS[expression_type], expr.arg1, expr.arg2)
+        if expression_type in UNARY_OPERATIONS:
+            template = UNARY_OPERATIONS[expression_type]
+            if callable(template):
+                template = self.constant(template) + "({0})"
+            return self.compile_operation(expr, template, expr.column)
+        if expression_type in (StartsWith, EndsWith):
+            template = "str({0})." + expr.pretty_name + "(" + self.constant(expr.substr) + ")"
+            return self.compile_operation(expr, template, expr.arg1, extra_key=hashable_key(expr.substr))
+        if expression_type is Contains:
+            # value is evaluated before expr
+            return self.compile_operation(expr, "{0} in {1}", expr.value, expr.expr)
+        if expression_type is Substring:
+            start = expr.start - 1
+            template = f"str({{0}})[{self.constant(start)}:{self.constant(start + expr.length)}]"
+            return self.compile_operation(expr, template, expr.expr, extra_key=(expr.start, expr.length))
+        if expression_type is IsIn:
+            template = "{0} in " + self.constant(expr.cols)
+            return self.compile_operation(expr, template, expr.arg1, extra_key=id(expr.cols))
+        if expression_type is Cast:
+            template = self.constant(expr.caster) + "({0})"
+            return self.compile_operation(expr, template, expr.column, extra_key=id(expr.caster))
+        if (isinstance(expr, NullSafeColumnOperation)
+                and type(expr).eval is NullSafeColumnOperation.eval):
+            template = self.constant(expr) + ".unsafe_operation({0})"
+            return self.compile_operation(expr, template, expr.column, extra_key=id(expr))
+        if expression_type in (CaseWhen, Otherwise) and len(expr.conditions) <= MAX_COMPILED_BRANCHES:
+            default = expr.default if expression_type is Otherwise else None
+            return self.compile_case_when(expr.conditions, expr.values, default)
+        if expression_type is Coalesce and len(expr.columns) <= MAX_COMPILED_BRANCHES:
+            return self.compile_coalesce(expr.columns)
+        return self.compile_fallback(expr)
+
+    def compile_field(self, expr, field):
+        try:
+            position = find_position_in_schema(self.schema, field)
+        except (AnalysisException, NotImplementedError):
+            # Let the evaluation raise the error when a row is processed
+            return self.compile_fallback(expr)
+        return self.assign(f"row[{position}]", key=("field", position))
+
+    def compile_fallback(self, expr):
+        code = f"{self.constant(expr)}.eval(row, {self.constant(self.schema)})"
+        return self.assign(code)
+
+    def compile_operation(self, expr, template, *args, extra_key=None):
+        values = [self.compile(arg) for arg in args]
+        key = self.get_key(expr, values, extra_key)
+        folded = self.fold(expr, values)
+        if folded is not None:
+            return folded
+        shared = self.lookup(key)
+        if shared is not None:
+            return shared
+        return self.assign(template.format(*(value.code for value in values)), key=key)
+
+    def compile_checked_binary_operation(self, expr, template):
+        value_1 = self.compile(expr.arg1)
+        value_2 = self.compile(expr.arg2)
+        if (value_1.is_constant and value_1.value is None) or (value_2.is_constant and value_2.value is None):
+            return self.constant_value(None)
+        key = self.get_key(expr, (value_1, value_2))
+        folded = self.fold(expr, (value_1, value_2))
+        if folded is not None:
+            return folded
+        shared = self.lookup(key)
+        if shared is not None:
+            return shared
+
+        a, b = value_1.code, value_2.code
+        if value_1.is_constant and value_2.is_constant:
+            # The operation could not be folded as it raises an error
+            return self.assign(f"{self.constant(expr)}.operate({a}, {b})")
+
+        null_checks = [f"{value.code} is None" for value in (value_1, value_2) if not value.is_constant]
+        if value_1.is_constant:
+            same_type = f"{b}.__class__ is {self.constant(value_1.value.__class__)}"
+        elif value_2.is_constant:
+            same_type = f"{a}.__class__ is {self.constant(value_2.value.__class__)}"
+        else:
+            same_type = f"{a}.__class__ is {b}.__class__"
+
+        result = self.new_variable()
+        self.emit(f"if {' or '.join(null_checks)}:")
+        self.emit(f"    {result} = None")
+        self.emit(f"elif {same_type}:")
+        self.emit(f"    {result} = {template.format(a, b)}")
+        self.emit("else:")
+        # Values of different types are cast or rejected by the expression itself
+        self.emit(f"    {result} = {self.constant(expr)}.operate({a}, {b})")
+        return self.share(CompiledValue(result, key=key))
+
+    def compile_case_when(self, conditions, values, default):
+        result = self.new_variable()
+        self.emit_branches(result, conditions, values, default)
+        return CompiledValue(result)
+
+    def emit_branches(self, result, conditions, values, default):
+        if not conditions:
+            value = self.compile(default) if default is not None else self.constant_value(None)
+            self.emit(f"{result} = {value.code}")
+            return
+
+        condition = self.compile(conditions[0])
+        if condition.is_constant:
+            if condition.value:
+                self.emit(f"{result} = {self.compile(values[0]).code}")
+            else:
+                self.emit_branches(result, conditions[1:], values[1:], default)
+            return
+
+        self.emit(f"if {condition.code}:")
+        with self.block():
+            self.emit(f"{result} = {self.compile(values[0]).code}")
+        self.emit("else:")
+        with self.block():
+            self.emit_branches(result, conditions[1:], values[1:], default)
+
+    def compile_coalesce(self, columns):
+        result = self.new_variable()
+        self.emit_coalesce(result, columns)
+        return CompiledValue(result)
+
+    def emit_coalesce(self, result, columns):
+        value = self.compile(columns[0])
+        self.emit(f"{result} = {value.code}")
+        if len(columns) > 1 and not (value.is_constant and value.value is not None):
+            self.emit(f"if {result} is None:")
+            with self.block():
+                self.emit_coalesce(result, columns[1:])
+
+    def fold(self, expr, values):
+        """
+        Return the value of a pure expression when all its arguments are constants
+        """
+        if not all(value.is_constant for value in values):
+            return None
+        try:
+            value = expr.eval(None, self.schema)
+        except Exception:  # pylint: disable=broad-except
+            # The error will be raised if the expression is evaluated
+            return None
+        return self.constant_value(value)
+
+    @staticmethod
+    def get_key(expr, values, extra_key=None):
+        if any(value.key is None for value in values):
+            return None
+        return (type(expr), extra_key) + tuple(value.key for value in values)
+
+    def lookup(self, key):
+        if key is None:
+            return None
+        for scope in reversed(self.scopes):
+            if key in scope:
+                return scope[key]
+        return None
+
+    def share(self, value):
+        if value.key is not None:
+            self.scopes[-1][value.key] = value
+        return value
+
+    def assign(self, code, key=None):
+        shared = self.lookup(key)
+        if shared is not None:
+            return shared
+        variable = self.new_variable()
+        self.emit(f"{variable} = {code}")
+        return self.share(CompiledValue(variable, key=key))
+
+    def constant_value(self, value):
+        if value is None or value is True or value is False:
+            code = repr(value)
+        else:
+            code = self.constant(value)
+        return CompiledValue(code, key=("constant", value.__class__, hashable_key(value)), value=value)
+
+    def constant(self, value):
+        """
+        Return the name of a variable holding value in the compiled function
+        """
+        value_id = id(value)
+        if value_id not in self.constant_names:
+            name = f"_c{len(self.constants)}"
+            self.constant_names[value_id] = name
+            self.constants[name] = value
+        return self.constant_names[value_id]
+
+    def new_variable(self):
+        self.variable_count += 1
+        return f"_v{self.variable_count}"
+
+    def emit(self, line):
+        self.lines.append("    " * self.indentation + line)
+
+    @contextmanager
+    def block(self):
+        """
+        Indent the emitted lines, values computed in this block are only shared inside it
+        """
+        self.indentation += 1
+        self.scopes.append({})
+        try:
+            yield
+        finally:
+            self.scopes.pop()
+            self.indentation -= 1
+
+    def build(self, output):
+        """
+        Return a function that takes a row and returns output
+        """
+        return self.build_function("row", self.lines + [f"    return {output}"])
+
+    def build_function(self, parameters, lines):
+        names = list(self.constants)
+        body = "\n".join("    " + line for line in lines)
+        source = (
+            f"def make({', '.join(names)}):\n"
+            f"    def compiled({parameters}):\n"
+            f"{body}\n"
+            "    return compiled\n"
+        )
+        namespace = {}
+        exec(compile(source, "<compiled expression>", "exec"), namespace)  # pylint: disable=exec-used
+        compiled = namespace["make"](*(self.constants[name] for name in names))
+        compiled.source = source
+        return compiled
+
+
+class NotCompilable(Exception):
+    pass
+
+
+class BatchExpressionCompiler(ExpressionCompiler):
+    """
+    Compile expressions into a function that computes them for all the rows
+    of a batch of columns
+
+    Batches contain values instead of Row objects, hence expressions
+    without a compiled form cannot be evaluated and raise NotCompilable
+    """
+
+    def __init__(self, schema):
+        super().__init__(schema)
+        self.indentation = 2
+        self.positions = []
+
+    def compile_field(self, expr, field):
+        try:
+            position = find_position_in_schema(self.schema, field)
+        except (AnalysisException, NotImplementedError) as e:
+            raise NotCompilable(f"{field} cannot be resolved") from e
+        if position not in self.positions:
+            self.positions.append(position)
+        return CompiledValue(f"_f{position}", key=("field", position))
+
+    def compile_fallback(self, expr):
+        raise NotCompilable(f"{expr!r} has no compiled form")
+
+    def build_batch(self, outputs):
+        """
+        Return a function that takes the columns of a batch and its size
+        and returns the columns of the values of outputs
+        """
+        if not outputs:
+            return self.build_function("columns, size", ["    return []"])
+
+        fields = ", ".join(f"_f{position}" for position in self.positions)
+        columns = ", ".join(f"columns[{position}]" for position in self.positions)
+        if not self.positions:
+            loop = "for _ in range(size):"
+        elif len(self.positions) == 1:
+            loop = f"for {fields} in {columns}:"
+        else:
+            loop = f"for {fields} in zip({columns}):"
+
+        lines = []
+        for i in range(len(outputs)):
+            lines += [f"    _o{i} = []", f"    _a{i} = _o{i}.append"]
+        lines.append(f"    {loop}")
+        lines += self.lines
+        lines += [f"        _a{i}({output})" for i, output in enumerate(outputs)]
+        lines.append(f"    return [{', '.join(f'_o{i}' for i in range(len(outputs)))}]")
+        return self.build_function("columns, size", lines)
+
+
+def hashable_key(value):
+    """
+    Return value if it can be used in a key, its identity otherwise
+    """
+    try:
+        hash(value)
+    except TypeError:
+        return id(value)
+    return value
+
+
+def compile_expression(col, schema):
+    """
+    Return a function that takes a row of schema and returns the value of col
+
+    It returns the same value as ``col.eval(row, schema)``
+    """
+    compiler = ExpressionCompiler(schema)
+    value = compiler.compile(col)
+    return compiler.build(value.code)
+
+
+def compile_columns(cols, schema):
+    """
+    Return a function that takes a row of schema and returns the list
+    of the values of all the output columns of cols
+
+    cols must not contain generators. Values of columns that output multiple
+    columns are inlined in the list.
+    """
+    compiler = ExpressionCompiler(schema)
+    outputs = []
+    for col in cols:
+        if not col.may_output_multiple_cols:
+            outputs.append(compiler.compile(col).code)
+        elif isinstance(col, Column) and isinstance(col.expr, StarOperator):
+            outputs.append("*row")
+        else:
+            outputs.append(f"*{compiler.compile(col).code}")
+    return compiler.build(f"[{', '.join(outputs)}]")
+
+
+def compile_batch_columns(cols, schema):
+    """
+    Return a function that takes the columns of a batch of rows of schema and
+    its size and returns the columns of the values of cols
+
+    Return None if one of the cols cannot be evaluated on batches.
+    """
+    compiler = BatchExpressionCompiler(schema)
+    try:
+        outputs = [compiler.compile(col).code for col in cols]
+    except NotCompilable:
+        return None
+    return compiler.build_batch(outputs)
@@ -22,3 +22,6 @@ JOIN_TYPES = dict(
     leftsemi=LEFT_SEMI_JOIN,
     leftanti=LEFT_ANTI_JOIN,
 )
+
+# Names of the hints that mark a DataFrame to be broadcast in joins
+BROADCAST_HINTS = ("broadcast", "broadcastjoin", "mapjoin")
@@ -1,22 +1,28 @@
 from collections import Counter
 from copy import deepcopy
-from functools import partial
+from functools import partial, reduce
 import itertools
 import json
-import math
 import warnings
 
+from ..cache_manager import estimate_size
+from ..rdd import Murmur3Partitioner, ZippedPartitionsRDD
 from ..stat_counter import CovarianceCounter, RowStatHelper
 from ..storagelevel import StorageLevel
 from ..utils import (
-    compute_weighted_percentiles, format_cell, get_keyfunc, merge_rows, merge_rows_joined_on_values, pad_cell,
-    portable_hash, reservoir_sample_and_size, str_half_width
+    format_cell, get_keyfunc, get_range_bounds, merge_rows, merge_rows_joined_on_values, pad_cell, portable_hash,
+    str_half_width, strhash
 )
 from .column import parse
 from .functions import array, collect_set, count, lit, map_from_arrays, rand, struct
-from .internal_utils.column import resolve_column
+from .internal_utils.batches import (
+    aggregate_columns, batches_to_rows, EMPTY_AGGREGATE, filter_batch_mapper, get_simple_aggregation, merge_aggregates,
+    rows_to_batches, select_batch_mapper, SIMPLE_AGGREGATIONS
+)
+from .internal_utils.column import get_output_cols, resolve_column
+from .internal_utils.compiler import compile_columns, compile_expression
 from .internal_utils.joins import (
-    CROSS_JOIN, FULL_JOIN, INNER_JOIN, LEFT_ANTI_JOIN, LEFT_JOIN, LEFT_SEMI_JOIN, RIGHT_JOIN
+    BROADCAST_HINTS, CROSS_JOIN, FULL_JOIN, INNER_JOIN, LEFT_ANTI_JOIN, LEFT_JOIN, LEFT_SEMI_JOIN, RIGHT_JOIN
 )
 from .schema_utils import get_schema_from_cols, infer_schema_from_rdd, merge_schemas
 from .types import create_row, DataType, LongType, Row, row_from_keyed_values, StringType, StructField, StructType
@@ -74,9 +80,11 @@ class FieldIdGenerator:
 
 
 class DataFrameInternal:
-    def __init__(self, sc, rdd, cols=None, convert_to_row=False, schema=None):
+    def __init__(self, sc, rdd, cols=None, convert_to_row=False, schema=None, size_in_bytes=None):
         """
         :type rdd: RDD
+        :param size_in_bytes: (optional) estimated size of the rows in memory,
+            None if it is not known without computing them
         """
         if convert_to_row:
             if cols is None:
@@ -85,6 +93,10 @@ class DataFrameInternal:
 
         self._sc = sc
         self._rdd = rdd
+        # RDD of ColumnBatch computing the same rows as _rdd, set in columnar mode
+        self._batches = None
+        self.broadcast_hint = False
+        self.size_in_bytes = size_in_bytes
         if schema is None and convert_to_row is False:
             raise NotImplementedError(
                 "Schema cannot be None when creating DataFrameInternal from another. "
@@ -106,15 +118,50 @@ class DataFrameInternal:
         return FieldIdGenerator.unbind_schema(schema)
 
     def _with_rdd(self, rdd, schema):
+        # as in Spark, the estimated size of the output of an operator
+        # is the one of its input
         return DataFrameInternal(
             self._sc,
             rdd,
-            schema=schema
+            schema=schema,
+            size_in_bytes=self.size_in_bytes
         )
 
+    def _with_batches(self, batches, schema):
+        """
+        Return a DataFrameInternal whose partitions are computed as ColumnBatch objects
+
+        Rows are only created when the DataFrame is used by an operator
+        that does not support batches or when they are collected.
+        """
+        names = [field.name for field in schema.fields]
+        df = self._with_rdd(batches.mapPartitions(partial(batches_to_rows, names)), schema)
+        df._batches = batches
+        return df
+
+    def columnar(self):
+        """
+        Return a DataFrameInternal that applies the operators which support it
+        on batches of columns instead of rows
+        """
+        if self._batches is not None:
+            return self
+        df = self._with_rdd(self._rdd, self.bound_schema)
+        df._batches = self._rdd.mapPartitions(partial(rows_to_batches, len(self.bound_schema.fields)))
+        return df
+
     def rdd(self):
         return self._rdd
 
+    def hint(self, name, parameters):
+        hinted = self._with_rdd(self._rdd, self.bound_schema)
+        hinted.broadcast_hint = self.broadcast_hint
+        if name.lower() in BROADCAST_HINTS:
+            hinted.broadcast_hint = True
+        else:
+            warnings.warn(f"Unrecognized hint: {name}{tuple(parameters)}")
+        return hinted
+
     @staticmethod
     def range(sc, start, end=None, step=1, numPartitions=None):
         if end is None:
@@ -124,9 +171,12 @@ class DataFrameInternal:
             ([i] for i in range(start, end, step)),
             numSlices=numPartitions
         )
-        return DataFrameInternal(sc, rdd, ["id"], True)
+        size_in_bytes = len(range(start, end, step)) * estimate_size([end])
+        return DataFrameInternal(sc, rdd, ["id"], True, size_in_bytes=size_in_bytes)
 
     def count(self):
+        if self._batches is not None:
+            return self._batches.map(len).sum()
         return self._rdd.count()
 
     def collect(self):
@@ -149,9 +199,11 @@ class DataFrameInternal:
         self._rdd.foreachPartition(f)
 
     def cache(self):
-        return self._with_rdd(self._rdd.cache(), self.bound_schema)
+        return self.persist(StorageLevel.MEMORY_ONLY)
 
     def persist(self, storageLevel=StorageLevel.MEMORY_ONLY):
+        if self._batches is not None:
+            return self._with_batches(self._batches.persist(storageLevel), self.bound_schema)
         return self._with_rdd(self._rdd.persist(storageLevel), self.bound_schema)
 
     def unpersist(self, blocking=False):
@@ -196,125 +248,30 @@ class DataFrameInternal:
         )
 
     def repartition(self, numPartitions, cols):
-        def partitioner(row):
-            return sum(hash(c.eval(row, self.bound_schema)) for c in cols)
+        def get_key(row):
+            return tuple(c.eval(row, self.bound_schema) for c in cols)
 
-        return self.repartitionByValues(numPartitions, partitioner)
+        return self._with_rdd(
+            self._rdd.keyBy(get_key).partitionBy(numPartitions, Murmur3Partitioner()).values(),
+            self.bound_schema
+        )
 
     def repartitionByRange(self, numPartitions, *cols):
         key = get_keyfunc(cols, self.bound_schema)
-        bounds = self._get_range_bounds(self._rdd, numPartitions, key=key)
+        bounds = get_range_bounds(self._rdd, numPartitions, key=key)
 
         def get_range_id(value):
             return sum(1 for bound in bounds if key(bound) < key(value))
 
         return self.repartitionByValues(numPartitions, partitioner=get_range_id)
 
-    @staticmethod
-    def _get_range_bounds(rdd, numPartitions, key):
-        if numPartitions == 0:
-            return []
-
-        # pylint: disable=W0511
-        # todo: check if sample_size is set in SQLConf.get.rangeExchangeSampleSizePerPartition
-        # sample_size = min(
-        #   SQLConf.get.rangeExchangeSampleSizePerPartition * rdd.getNumPartitions(),
-        #   1e6
-        # )
-        sample_size = 1e6
-        sample_size_per_partition = math.ceil(3 * sample_size / numPartitions)
-        sketched_rdd = DataFrameInternal.sketch_rdd(rdd, sample_size_per_partition)
-        rdd_size = sum(partition_size for partition_size, sample in sketched_rdd.values())
-
-        if rdd_size == 0:
-            return []
-
-        fraction = sample_size / rdd_size
-
-        candidates, imbalanced_partitions = DataFrameInternal._get_initial_candidates(
-            sketched_rdd,
-            sample_size_per_partition,
-            fraction
-        )
-
-        additional_candidates = DataFrameInternal._get_additional_candidates(
-            rdd,
-            imbalanced_partitions,
-            fraction
-        )
-
-        candidates += additional_candidates
-        bounds = compute_weighted_percentiles(
-            candidates,
-            min(numPartitions, len(candidates)) + 1,
-            key=key
-        )[1:-1]
-        return bounds
-
-    @staticmethod
-    def _get_initial_candidates(sketched_rdd, sample_size_per_partition, fraction):
-        candidates = []
-        imbalanced_partitions = set()
-        for idx, (partition_size, sample) in sketched_rdd.items():
-            # Partition is bigger than (3 times) average and more than sample_size_per_partition
-            # is needed to get accurate information on its distribution
-            if fraction * partition_size > sample_size_per_partition:
-                imbalanced_partitions.add(idx)
-            else:
-                # The weight is 1 over the sampling probability.
-                weight = partition_size / len(sample)
-                candidates += [(key, weight) for key in sample]
-        return candidates, imbalanced_partitions
-
-    @staticmethod
-    def _get_additional_candidates(rdd, imbalanced_partitions, fraction):
-        additional_candidates = []
-        if imbalanced_partitions:
-            # Re-sample imbalanced partitions with the desired sampling probability.
-            def keep_imbalanced_partitions(partition_id, x):
-                return x if partition_id in imbalanced_partitions else []
-
-            resampled = (rdd.mapPartitionsWithIndex(keep_imbalanced_partitions)
-                         .sample(withReplacement=False, fraction=fraction, seed=rdd.id())
-                         .collect())
-            weight = (1.0 / fraction).toFloat
-            additional_candidates += [(x, weight) for x in resampled]
-        return additional_candidates
-
-    @staticmethod
-    def sketch_rdd(rdd, sample_size_per_partition):
-        """
-        Get a subset per partition of an RDD
-
-        Sampling algorithm is reservoir sampling.
-
-        :param rdd:
-        :param sample_size_per_partition:
-        :return:
-        """
-
-        def sketch_partition(idx, x):
-            sample, original_size = reservoir_sample_and_size(
-                x,
-                sample_size_per_partition,
-                seed=rdd.id() + idx
-            )
-            return [(idx, (original_size, sample))]
-
-        sketched_rdd_content = rdd.mapPartitionsWithIndex(sketch_partition).collect()
-
-        return dict(sketched_rdd_content)
-
     def sampleBy(self, col, fractions, seed):
         fractions_as_col = map_from_arrays(
             array(*(map(lit, fractions.keys()))),
             array(*map(lit, fractions.values()))
         )
 
-        return self._with_rdd(
-            self.filter(rand(seed) < fractions_as_col[col]),
-            self.bound_schema
-        )
+        return self.filter(rand(seed) < fractions_as_col[col])
 
     def toJSON(self, use_unicode):
         """
@@ -356,6 +313,12 @@ class DataFrameInternal:
             df_as_group = InternalGroupedDataFrame(self, [])
             return df_as_group.agg(exprs)
 
+        new_schema = get_schema_from_cols(cols, self.bound_schema)
+        if self._batches is not None:
+            batch_mapper = select_batch_mapper(cols, self.bound_schema)
+            if batch_mapper is not None:
+                return self._with_batches(self._batches.mapPartitionsWithIndex(batch_mapper), new_schema)
+
         def select_mapper(partition_index, partition):
             # Initialize non deterministic functions so that they are reproducible
             initialized_cols = [col.initialize(partition_index) for col in cols]
@@ -375,7 +338,6 @@ class DataFrameInternal:
                 generators[0] if generators else None
             )
 
-        new_schema = get_schema_from_cols(cols, self.bound_schema)
         return self._with_rdd(
             self._rdd.mapPartitionsWithIndex(select_mapper),
             schema=new_schema
@@ -383,11 +345,15 @@ class DataFrameInternal:
 
     def get_select_output_field_lists(self, partition, non_generators, initialized_cols, generator):
         output_rows = []
+        # column names only depend on the schema, they are computed once for all rows
+        non_generators_output_cols = [
+            output_col
+            for col in non_generators
+            for output_col in get_output_cols(col, self.bound_schema)
+        ]
+        compute_non_generators = compile_columns(non_generators, self.bound_schema)
         for row in partition:
-            base_row_fields = []
-            for col in non_generators:
-                output_cols, output_values = resolve_column(col, row, schema=self.bound_schema)
-                base_row_fields += zip(output_cols, output_values[0])
+            base_row_fields = list(zip(non_generators_output_cols, compute_non_generators(row)))
 
             if generator is not None:
                 generated_row_fields = self.get_generated_row_fields(
@@ -422,9 +388,15 @@ class DataFrameInternal:
     def filter(self, condition):
         condition = parse(condition)
 
+        if self._batches is not None:
+            batch_mapper = filter_batch_mapper(condition, self.bound_schema)
+            if batch_mapper is not None:
+                return self._with_batches(self._batches.mapPartitionsWithIndex(batch_mapper), self.bound_schema)
+
         def mapper(partition_index, partition):
             initialized_condition = condition.initialize(partition_index)
-            return (row for row in partition if initialized_condition.eval(row, self.bound_schema))
+            compute_condition = compile_expression(initialized_condition, self.bound_schema)
+            return (row for row in partition if compute_condition(row))
 
         return self._with_rdd(
             self._rdd.mapPartitionsWithIndex(mapper),
@@ -447,10 +419,12 @@ class DataFrameInternal:
             ])
 
         # This behavior (keeping the columns of self) is the same as in PySpark
-        return self._with_rdd(
+        union = self._with_rdd(
             self._rdd.union(other.rdd().map(change_col_names)),
             self.bound_schema
         )
+        union.size_in_bytes = sum_sizes(self.size_in_bytes, other.size_in_bytes)
+        return union
 
     def unionByName(self, other):
         self_field_names = [field.name for field in self.bound_schema.fields]
@@ -480,10 +454,12 @@ class DataFrameInternal:
             ])
 
         # This behavior (keeping the columns of self) is the same as in PySpark
-        return self._with_rdd(
+        union = self._with_rdd(
             self._rdd.union(other.rdd().map(change_col_order)),
             self.bound_schema
         )
+        union.size_in_bytes = sum_sizes(self.size_in_bytes, other.size_in_bytes)
+        return union
 
     def withColumn(self, colName, col):
         return self.select(parse("*"), parse(col).alias(colName))
@@ -491,8 +467,8 @@ class DataFrameInternal:
     def withColumnRenamed(self, existing, new):
         def mapper(row):
             keyed_values = [
-                (new, row[col]) if col == existing else (col, row[col])
-                for col in row.__fields__
+                (new, value) if col == existing else (col, value)
+                for col, value in zip(row.__fields__, row)
             ]
             return row_from_keyed_values(keyed_values)
 
@@ -508,10 +484,7 @@ class DataFrameInternal:
 
     def toDF(self, new_names):
         def mapper(row):
-            keyed_values = [
-                (new_name, row[old])
-                for new_name, old in zip(new_names, row.__fields__)
-            ]
+            keyed_values = list(zip(new_names, row))
             return row_from_keyed_values(keyed_values)
 
         new_schema = StructType([
@@ -567,6 +540,35 @@ class DataFrameInternal:
     def aggregate(self, zeroValue, seqOp, combOp):
         return self._rdd.aggregate(zeroValue, seqOp, combOp)
 
+    def aggregate_batches(self, stats):
+        """
+        Compute the value of stats on all the batches of a columnar DataFrame
+
+        Return the list of the aggregated rows values, which like for other aggregations
+        is empty if the DataFrame is empty, or None if the DataFrame is not columnar
+        or if stats are not all a count, sum, min, max or avg of a column that supports batches.
+        """
+        if self._batches is None:
+            return None
+        aggregations = [get_simple_aggregation(stat) for stat in stats]
+        if None in aggregations:
+            return None
+        batch_mapper = select_batch_mapper(
+            [aggregation.column for aggregation in aggregations],
+            self.bound_schema
+        )
+        if batch_mapper is None:
+            return None
+
+        partial_aggregates = self._batches.mapPartitionsWithIndex(batch_mapper).map(aggregate_columns)
+        size, aggregates = reduce(merge_aggregates, partial_aggregates.collect(), (0, [EMPTY_AGGREGATE] * len(stats)))
+        if not size:
+            return []
+        return [[
+            SIMPLE_AGGREGATIONS[type(aggregation)](*aggregate)
+            for aggregation, aggregate in zip(aggregations, aggregates)
+        ]]
+
     def showString(self, n, truncate=20, vertical=False):
         n = max(0, n)
         if n:
@@ -722,7 +724,7 @@ class DataFrameInternal:
 
         return schema, table
 
-    def join(self, other, on, how):
+    def join(self, other, on, how, broadcast_threshold=-1):
         if on is None and how == "cross":
             merged_schema = merge_schemas(self.bound_schema, other.bound_schema, how)
             output_rdd = self.cross_join(other)
@@ -733,7 +735,7 @@ class DataFrameInternal:
                 how,
                 on=on
             )
-            output_rdd = self.join_on_values(other, on, how)
+            output_rdd = self.join_on_values(other, on, how, broadcast_threshold)
         elif not isinstance(on, list):
             merged_schema = merge_schemas(self.bound_schema, other.bound_schema, how)
             output_rdd = self.join_on_condition(other, on, how, merged_schema)
@@ -742,7 +744,9 @@ class DataFrameInternal:
                 "Pysparkling only supports str, Column and list of str for on"
             )
 
-        return self._with_rdd(output_rdd, schema=merged_schema)
+        joined = self._with_rdd(output_rdd, schema=merged_schema)
+        joined.size_in_bytes = None
+        return joined
 
     def join_on_condition(self, other, on, how, new_schema):
         """
@@ -750,13 +754,12 @@ class DataFrameInternal:
         :type other: DataFrameInternal
         """
 
-        def condition(couple):
-            left, right = couple
+        def condition(left, right):
             merged_rows = merge_rows(left, right)
             condition_value = on.eval(merged_rows, schema=new_schema)
             return condition_value
 
-        joined_rdd = self.rdd().cartesian(other.rdd()).filter(condition)
+        joined_rdd = self.rdd()._nestedLoopJoin(other.rdd(), condition)
 
         def format_output(entry):
             left, right = entry
@@ -781,31 +784,32 @@ class DataFrameInternal:
         output_rdd = joined_rdd.map(format_output)
         return output_rdd
 
-    def join_on_values(self, other, on, how):
+    def join_on_values(self, other, on, how, broadcast_threshold=-1):
         if how != CROSS_JOIN:
-            def add_key(row):
-                # When joining on value, no check on schema (and lack of duplicated col) is done
-                return tuple(row[on_column] for on_column in on), row
-        else:
-            def add_key(row):
-                return True, row
-
-        keyed_self = self.rdd().map(add_key)
-        keyed_other = other.rdd().map(add_key)
-        if how == LEFT_JOIN:
-            joined_rdd = keyed_self.leftOuterJoin(keyed_other)
-        elif how == RIGHT_JOIN:
-            joined_rdd = keyed_self.rightOuterJoin(keyed_other)
-        elif how == FULL_JOIN:
-            joined_rdd = keyed_self.fullOuterJoin(keyed_other)
-        elif how in (INNER_JOIN, CROSS_JOIN):
-            joined_rdd = keyed_self.join(keyed_other)
-        elif how == LEFT_ANTI_JOIN:
-            joined_rdd = keyed_self._leftAntiJoin(keyed_other)
-        elif how == LEFT_SEMI_JOIN:
-            joined_rdd = keyed_self._leftSemiJoin(keyed_other)
+            # When joining on value, no check on schema (and lack of duplicated col) is done
+            self_add_key = partial(add_key_at_positions, [self.bound_schema.names.index(c) for c in on])
+            other_add_key = partial(add_key_at_positions, [other.bound_schema.names.index(c) for c in on])
         else:
-            raise IllegalArgumentException(f"Invalid how argument in join: {how}")
+            self_add_key = other_add_key = add_true_key
+
+        joined_rdd = self.broadcast_join(other, self_add_key, other_add_key, how, broadcast_threshold)
+        if joined_rdd is None:
+            keyed_self = self.rdd().map(self_add_key)
+            keyed_other = other.rdd().map(other_add_key)
+            if how == LEFT_JOIN:
+                joined_rdd = keyed_self.leftOuterJoin(keyed_other)
+            elif how == RIGHT_JOIN:
+                joined_rdd = keyed_self.rightOuterJoin(keyed_other)
+            elif how == FULL_JOIN:
+                joined_rdd = keyed_self.fullOuterJoin(keyed_other)
+            elif how in (INNER_JOIN, CROSS_JOIN):
+                joined_rdd = keyed_self.join(keyed_other)
+            elif how == LEFT_ANTI_JOIN:
+                joined_rdd = keyed_self._leftAntiJoin(keyed_other)
+            elif how == LEFT_SEMI_JOIN:
+                joined_rdd = keyed_self._leftSemiJoin(keyed_other)
+            else:
+                raise IllegalArgumentException(f"Invalid how argument in join: {how}")
 
         def format_output(entry):
             _, (left, right) = entry
@@ -822,6 +826,44 @@ class DataFrameInternal:
         output_rdd = joined_rdd.map(format_output)
         return output_rdd
 
+    def broadcast_join(self, other, self_add_key, other_add_key, how, broadcast_threshold):
+        """Join by broadcasting one side to the tasks processing the other.
+
+        A side can be broadcast if it is hinted with
+        :func:`~pysparkling.sql.functions.broadcast` or if it is the right
+        side (the left side for right joins) and its estimated size does
+        not exceed ``broadcast_threshold`` bytes. A negative threshold
+        disables the latter. No job is run to choose the side: the size is
+        only known for DataFrames created from local data and the
+        operators with a single input applied to them.
+
+        :returns: An RDD of joined keyed rows or None if no side can be broadcast.
+        """
+        if how == CROSS_JOIN:
+            how = INNER_JOIN
+        # the rows of the broadcast side are only output when they match
+        can_broadcast_right = how in (INNER_JOIN, LEFT_JOIN, LEFT_SEMI_JOIN, LEFT_ANTI_JOIN)
+        can_broadcast_left = how in (INNER_JOIN, RIGHT_JOIN)
+
+        if can_broadcast_right and other.broadcast_hint:
+            build_left = False
+        elif can_broadcast_left and self.broadcast_hint:
+            build_left = True
+        elif broadcast_threshold < 0 or not (can_broadcast_right or can_broadcast_left):
+            return None
+        else:
+            build_left = not can_broadcast_right
+            size_in_bytes = (self if build_left else other).size_in_bytes
+            if size_in_bytes is None or size_in_bytes > broadcast_threshold:
+                return None
+
+        if build_left:
+            return other.rdd().map(other_add_key)._broadcastJoin(
+                self.rdd().map(self_add_key),
+                LEFT_JOIN if how == RIGHT_JOIN else INNER_JOIN
+            ).mapValues(lambda rows: rows[::-1])
+        return self.rdd().map(self_add_key)._broadcastJoin(other.rdd().map(other_add_key), how)
+
     def crossJoin(self, other):
         return self.join(other, on=None, how="cross")
 
@@ -897,11 +939,10 @@ class DataFrameInternal:
     def applyFunctionOnHashPartitionedRdds(self, other, func):
         self_prepared_rdd, other_prepared_rdd = self.hash_partition_and_sort(other)
 
-        def filter_partition(partition_id, self_partition):
-            other_partition = other_prepared_rdd.partitions()[partition_id].x()
+        def filter_partition(task_context, partition_id, self_partition, other_partition):
             return func(iter(self_partition), iter(other_partition))
 
-        filtered_rdd = self_prepared_rdd.mapPartitionsWithIndex(filter_partition)
+        filtered_rdd = ZippedPartitionsRDD((self_prepared_rdd, other_prepared_rdd), filter_partition)
         return self._with_rdd(filtered_rdd, self.bound_schema)
 
     def hash_partition_and_sort(self, other):
@@ -959,6 +1000,21 @@ ROLLUP_TYPE = "ROLLUP_TYPE"
 CUBE_TYPE = "CUBE_TYPE"
 
 
+def add_key_at_positions(positions, row):
+    return tuple(row[position] for position in positions), row
+
+
+def add_true_key(row):
+    return True, row
+
+
+def sum_sizes(size, other_size):
+    """Estimated size of two DataFrames, None if one of them is unknown."""
+    if size is None or other_size is None:
+        return None
+    return size + other_size
+
+
 class SubTotalValue:
     """
     Some grouping type (rollup and cube) compute subtotals on all statistics,
@@ -967,6 +1023,14 @@ class SubTotalValue:
     def __repr__(self):
         return "SubTotal"
 
+    def __hash__(self):
+        # Group keys are hash partitioned, their hash must not depend on the process
+        return strhash(repr(self))
+
+    def __reduce__(self):
+        # Unpickling returns the unique instance
+        return "GROUPED"
+
 
 GROUPED = SubTotalValue()
 
@@ -988,43 +1052,16 @@ class InternalGroupedDataFrame:
             for field in col.find_fields_in_schema(self.jdf.bound_schema)
         ])
 
-        aggregated_stats = self.jdf.aggregate(
-            GroupedStats(self.grouping_cols,
-                         stats,
-                         pivot_col=self.pivot_col,
-                         pivot_values=self.pivot_values),
-            lambda grouped_stats, row: grouped_stats.merge(
-                row,
-                self.jdf.bound_schema
-            ),
-            lambda grouped_stats_1, grouped_stats_2: grouped_stats_1.mergeStats(
-                grouped_stats_2,
-                self.jdf.bound_schema
-            )
-        )
-
-        data = []
-        all_stats = self.add_subtotals(aggregated_stats)
-        for group_key in all_stats.group_keys:
-            key = [(str(key), None if value is GROUPED else value)
-                   for key, value in zip(self.grouping_cols, group_key)]
-            grouping = tuple(value is GROUPED for value in group_key)
-
-            key_as_row = row_from_keyed_values(key).set_grouping(grouping)
-            data.append(row_from_keyed_values(
-                key + [
-                    (str(stat),
-                     stat.with_pre_evaluation_schema(self.jdf.bound_schema).eval(
-                         key_as_row,
-                         grouping_schema)
-                     )
-                    for pivot_value in all_stats.pivot_values
-                    for stat in get_pivoted_stats(
-                        all_stats.groups[group_key][pivot_value],
-                        pivot_value
-                    )
-                ]
-            ))
+        simple_aggregations = None
+        if not self.grouping_cols and self.pivot_col is None:
+            simple_aggregations = self.jdf.aggregate_batches(stats)
+        if simple_aggregations is not None:
+            data = self.jdf._sc.parallelize([
+                row_from_keyed_values(zip([str(stat) for stat in stats], values))
+                for values in simple_aggregations
+            ])
+        else:
+            data = self.get_aggregated_rows(stats, grouping_schema)
 
         if self.pivot_col is not None:
             if len(stats) == 1:
@@ -1061,7 +1098,35 @@ class InternalGroupedDataFrame:
             )
 
         # noinspection PyProtectedMember
-        return self.jdf._with_rdd(self.jdf._sc.parallelize(data), schema=new_schema)
+        return self.jdf._with_rdd(data, schema=new_schema)
+
+    def get_aggregated_rows(self, stats, grouping_schema):
+        """
+        Return an RDD with the aggregated rows
+
+        Aggregation is done in two phases: stats are aggregated for each group
+        of each partition, then these partial aggregates are shuffled by group key
+        and merged so that each group is finalized in one partition.
+        """
+        schema = self.jdf.bound_schema
+        partial_aggregates = self.jdf.rdd().mapPartitions(
+            partial(self.aggregate_partition, stats, schema)
+        )
+        aggregates = partial_aggregates.reduceByKey(
+            partial(merge_group_stats, schema),
+            numPartitions=self.jdf.rdd().getNumPartitions()
+        )
+        pivot_values = self.pivot_values if self.pivot_values is not None else [None]
+        return aggregates.map(partial(get_aggregated_row, self.grouping_cols, pivot_values, schema, grouping_schema))
+
+    def aggregate_partition(self, stats, schema, partition):
+        grouped_stats = GroupedStats(self.grouping_cols,
+                                     stats,
+                                     pivot_col=self.pivot_col,
+                                     pivot_values=self.pivot_values)
+        for row in partition:
+            grouped_stats.merge(row, schema)
+        return self.add_subtotals(grouped_stats).groups.items()
 
     def add_subtotals(self, aggregated_stats):
         """
@@ -1144,15 +1209,8 @@ class GroupedStats:
         self.stats = stats
         self.pivot_col = pivot_col
         self.pivot_values = pivot_values if pivot_values is not None else [None]
-        if groups is None:
-            self.groups = {}
-            # As python < 3.6 does not guarantee dict ordering
-            # we need to keep track of in which order the columns were
-            self.group_keys = []
-        else:
-            self.groups = groups
-            # The order is not used when initialized directly
-            self.group_keys = list(groups.keys())
+        # Stats of each group by pivot value, in the order in which groups were found
+        self.groups = groups if groups is not None else {}
 
     def merge(self, row, schema):
         group_key = tuple(col.eval(row, schema) for col in self.grouping_cols)
@@ -1162,7 +1220,6 @@ class GroupedStats:
                 for pivot_value in self.pivot_values
             }
             self.groups[group_key] = group_stats
-            self.group_keys.append(group_key)
         else:
             group_stats = self.groups[group_key]
 
@@ -1174,23 +1231,48 @@ class GroupedStats:
         return self
 
     def mergeStats(self, other, schema):
-        for group_key in other.group_keys:
-            if group_key not in self.group_keys:
-                self.groups[group_key] = other.groups[group_key]
-                self.group_keys.append(group_key)
+        for group_key, other_stats in other.groups.items():
+            if group_key not in self.groups:
+                self.groups[group_key] = other_stats
             else:
-                group_stats = self.groups[group_key]
-                other_stats = other.groups[group_key]
-                for pivot_value in self.pivot_values:
-                    for (stat, other_stat) in zip(
-                            group_stats[pivot_value],
-                            other_stats[pivot_value]
-                    ):
-                        stat.mergeStats(other_stat, schema)
+                merge_group_stats(schema, self.groups[group_key], other_stats)
 
         return self
 
 
+def merge_group_stats(schema, group_stats, other_group_stats):
+    """
+    Merge the stats of a group, grouped by pivot value, into group_stats
+    """
+    for pivot_value, stats in group_stats.items():
+        for stat, other_stat in zip(stats, other_group_stats[pivot_value]):
+            stat.mergeStats(other_stat, schema)
+    return group_stats
+
+
+def get_aggregated_row(grouping_cols, pivot_values, schema, grouping_schema, group):
+    group_key, group_stats = group
+    key = [(str(key), None if value is GROUPED else value)
+           for key, value in zip(grouping_cols, group_key)]
+    grouping = tuple(value is GROUPED for value in group_key)
+
+    key_as_row = row_from_keyed_values(key).set_grouping(grouping)
+    return row_from_keyed_values(
+        key + [
+            (str(stat),
+             stat.with_pre_evaluation_schema(schema).eval(
+                 key_as_row,
+                 grouping_schema)
+             )
+            for pivot_value in pivot_values
+            for stat in get_pivoted_stats(
+                group_stats[pivot_value],
+                pivot_value
+            )
+        ]
+    )
+
+
 def get_pivoted_stats(stats, pivot_value):
     if pivot_value is None:
         return stats
@@ -29,7 +29,7 @@ class DataFrameReader(OptionUtils):
         self._spark = spark
 
     def _df(self, jdf):
-        return DataFrame(jdf, self._spark)
+        return DataFrame(jdf, self._spark._wrapped)
 
     def _generic_read(self, path, method_to_read_if_rdd):
         if isinstance(path, str):
@@ -1,6 +1,7 @@
 from threading import RLock
 
 from ..__version__ import __version__
+from ..cache_manager import estimate_size
 from ..context import Context
 from ..rdd import RDD
 from .conf import RuntimeConfig
@@ -263,14 +264,18 @@ class SparkSession:
 
         if isinstance(data, RDD):
             rdd, schema = self._createFromRDD(data.map(prepare), schema, samplingRatio)
+            size_in_bytes = None
         else:
             rdd, schema = self._createFromLocal(map(prepare, data), schema)
+            # the rows are in the partitions already, their size is known
+            # without running a job
+            size_in_bytes = estimate_size([partition.x() for partition in rdd.partitions()])
 
         cols = [
             col_type.name if hasattr(col_type, "name") else "_" + str(i)
             for i, col_type in enumerate(schema)
         ]
-        df = DataFrame(DataFrameInternal(self._sc, rdd, cols, True, schema), self._wrapped)
+        df = DataFrame(DataFrameInternal(self._sc, rdd, cols, True, schema, size_in_bytes), self._wrapped)
         return df
 
     def parse_pandas_dataframe(self, data, schema):
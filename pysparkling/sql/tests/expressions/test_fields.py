@@ -0,0 +1,26 @@
+from copy import deepcopy
+import pickle
+from unittest import TestCase
+
+from pysparkling.sql.column import Column
+from pysparkling.sql.types import LongType, Row, StructField, StructType
+
+
+class ColumnBindingTests(TestCase):
+    schema_ab = StructType([StructField("a", LongType()), StructField("b", LongType())])
+    schema_ba = StructType([StructField("b", LongType()), StructField("a", LongType())])
+
+    def test_eval_with_several_schemas(self):
+        col = Column("a")
+        self.assertEqual(col.eval(Row(a=1, b=2), self.schema_ab), 1)
+        self.assertEqual(col.eval(Row(a=3, b=4), self.schema_ab), 3)
+        self.assertEqual(col.eval(Row(4, 3), self.schema_ba), 3)
+        self.assertEqual(col.eval(Row(1, 2), self.schema_ab), 1)
+
+    def test_copies_are_unbound(self):
+        col = Column("b")
+        col.eval(Row(a=1, b=2), self.schema_ab)
+
+        for copied in (pickle.loads(pickle.dumps(col)), deepcopy(col)):
+            self.assertIsNone(copied._binding)
+            self.assertEqual(copied.eval(Row(2, 1), self.schema_ba), 2)
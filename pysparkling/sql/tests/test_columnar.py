@@ -0,0 +1,47 @@
+from unittest import TestCase
+
+from pysparkling import Context
+from pysparkling.sql import functions
+from pysparkling.sql.conf import COLUMNAR_EXECUTION_ENABLED
+from pysparkling.sql.functions import col, input_file_name, lit, upper, when
+from pysparkling.sql.session import SparkSession
+from pysparkling.sql.types import LongType, StringType, StructField, StructType
+
+
+class ColumnarExecutionTests(TestCase):
+    def setUp(self):
+        self.spark = SparkSession(Context())
+        self.df = self.spark.createDataFrame(
+            [(f"n{i}" if i % 4 else None, i) for i in range(20)],
+            StructType([StructField("name", StringType()), StructField("age", LongType())])
+        ).repartition(3)
+
+    def assert_same_results(self, operation):
+        self.spark.conf.set(COLUMNAR_EXECUTION_ENABLED, "false")
+        expected = operation(self.df).collect()
+        self.spark.conf.set(COLUMNAR_EXECUTION_ENABLED, "true")
+        result = operation(self.df)
+        self.assertEqual(result.collect(), expected)
+        self.assertEqual([row.__fields__ for row in result.collect()], [row.__fields__ for row in expected])
+        return result
+
+    def test_select_filter_withColumn(self):
+        result = self.assert_same_results(lambda df: df
+                                          .filter((col("age") % 3 == 1) | col("name").isNull())
+                                          .select("*", upper(col("name")).alias("upper"), col("age").alias("a"))
+                                          .withColumn("old", when(col("age") > 10, lit(True)).otherwise(False)))
+        # noinspection PyProtectedMember
+        self.assertIsNotNone(result._jdf._batches)
+        self.assertEqual(result.count(), 10)
+
+    def test_simple_aggregations(self):
+        self.assert_same_results(lambda df: df.agg(
+            functions.sum("age"), functions.count("*"), functions.min("age"),
+            functions.max(col("age") * 2), functions.avg("age")
+        ))
+        self.assert_same_results(lambda df: df.filter(col("age") > 100).agg(functions.sum("age")))
+
+    def test_unsupported_expressions_use_rows(self):
+        result = self.assert_same_results(lambda df: df.select(col("age"), input_file_name()))
+        # noinspection PyProtectedMember
+        self.assertIsNone(result._jdf._batches)
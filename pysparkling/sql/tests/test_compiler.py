@@ -0,0 +1,90 @@
+import datetime
+from unittest import TestCase
+
+from pysparkling.sql.column import parse
+from pysparkling.sql.functions import coalesce, col, lit, lower, rand, sqrt, upper, when
+from pysparkling.sql.internal_utils.compiler import compile_columns, compile_expression
+from pysparkling.sql.types import DateType, LongType, Row, StringType, StructField, StructType
+from pysparkling.sql.utils import AnalysisException
+
+
+class ExpressionCompilerTests(TestCase):
+    schema = StructType([
+        StructField("name", StringType()),
+        StructField("age", LongType()),
+        StructField("birth", DateType()),
+    ])
+    rows = [
+        Row("Alice", 2, datetime.date(2019, 1, 1)),
+        Row("Bob", 5, datetime.date(2016, 4, 12)),
+        Row(None, None, None),
+        Row("Carl", 0, datetime.date(2021, 7, 30)),
+    ]
+
+    def assert_compiled_as_evaluated(self, column):
+        compiled = compile_expression(column, self.schema)
+        for row in self.rows:
+            self.assertEqual(outcome(compiled, row), outcome(column.eval, row, self.schema), column)
+
+    def test_same_values_as_eval(self):
+        age = col("age")
+        for column in [
+            age + 1,
+            (age * 2 - 1) / age,
+            age % 3 == 1,
+            (age > 1) & (age <= 4) | ~(age == 5),
+            -age,
+            age.isNull(),
+            age.isin(0, 2),
+            age.cast("string"),
+            sqrt(age + 1),
+            upper(col("name")),
+            lower(col("name")).startswith("b"),
+            col("name").substr(2, 2),
+            col("birth") == lit("2019-01-01"),
+            age.bitwiseOR(8),
+            age.eqNullSafe(2),
+            when(age > 3, "old").when(age > 1, age).otherwise("young"),
+            when(age > 3, "old"),
+            coalesce(col("name"), age, lit("unknown")),
+            (age + 1).alias("next"),
+        ]:
+            self.assert_compiled_as_evaluated(column)
+
+    def test_constant_folding(self):
+        compiled = compile_expression(col("age") + lit(1) * lit(2), self.schema)
+        self.assertEqual(compiled(Row("Alice", 2, None)), 4)
+        self.assertNotIn("*", compiled.source)
+
+    def test_shared_subexpressions(self):
+        incremented = col("age") + 1
+        compiled = compile_columns([incremented * 2, (col("age") + 1) * 3, incremented], self.schema)
+        self.assertEqual(compiled(Row("Alice", 2, None)), [6, 9, 3])
+        self.assertEqual(compiled.source.count("row["), 1)
+        self.assertEqual(compiled.source.count(" + "), 1)
+
+    def test_branches_are_evaluated_lazily(self):
+        age = col("age")
+        compiled = compile_expression(when(age > 1, age + 1).otherwise(age + 1), self.schema)
+        self.assertEqual(compiled(Row("Alice", 2, None)), 3)
+        self.assertEqual(compiled(Row("Alice", 0, None)), 1)
+
+    def test_star_and_fallback(self):
+        random_column = rand(42)
+        random_column.initialize(0)
+        compiled = compile_columns([parse("*"), random_column], self.schema)
+        values = compiled(Row("Alice", 2, None))
+        self.assertEqual(values[:3], ["Alice", 2, None])
+        self.assertIsInstance(values[3], float)
+
+    def test_errors_are_raised_on_evaluation(self):
+        compiled = compile_expression(col("unknown") + lit(1) - lit("a"), self.schema)
+        with self.assertRaises(AnalysisException):
+            compiled(Row("Alice", 2, None))
+
+
+def outcome(function, *args):
+    try:
+        return function(*args)
+    except Exception as e:  # pylint: disable=broad-except
+        return type(e)
@@ -0,0 +1,42 @@
+import pickle
+from unittest import TestCase
+
+from pysparkling import Context
+from pysparkling.sql import functions
+from pysparkling.sql.functions import col
+from pysparkling.sql.internals import GROUPED
+from pysparkling.sql.session import SparkSession
+from pysparkling.sql.types import LongType, StructField, StructType
+
+
+class GroupedAggregationTests(TestCase):
+    def setUp(self):
+        self.spark = SparkSession(Context())
+        self.df = self.spark.createDataFrame(
+            [(i % 1000, i % 7, i) for i in range(5000)],
+            StructType([
+                StructField("key", LongType()),
+                StructField("other", LongType()),
+                StructField("value", LongType()),
+            ])
+        ).repartition(4)
+
+    def test_groups_split_across_partitions(self):
+        result = self.df.groupBy("key").agg(functions.sum("value"), functions.count("*")).collect()
+        self.assertEqual(len(result), 1000)
+        self.assertEqual(
+            sorted(tuple(row) for row in result),
+            [(key, 5 * key + 10000, 5) for key in range(1000)]
+        )
+
+    def test_rollup_across_partitions(self):
+        result = self.df.filter(col("key") < 2).rollup("key", "other").agg(functions.count("*")).collect()
+        counts = {(row.key, row.other): row[2] for row in result}
+        self.assertEqual(counts[(None, None)], 10)
+        self.assertEqual(counts[(0, None)], 5)
+        self.assertEqual(counts[(1, None)], 5)
+        self.assertEqual(len(counts), 3 + 10)
+
+    def test_grouped_value_is_unique_after_pickling(self):
+        self.assertIs(pickle.loads(pickle.dumps(GROUPED)), GROUPED)
+        self.assertEqual(hash(pickle.loads(pickle.dumps(GROUPED))), hash(GROUPED))
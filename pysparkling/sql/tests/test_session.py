@@ -3,6 +3,9 @@ from unittest import TestCase
 import pytest
 
 from pysparkling import Context, StorageLevel
+from pysparkling.rdd import BroadcastHashJoinRDD
+from pysparkling.scheduler import narrow_lineage
+from pysparkling.sql.functions import broadcast
 from pysparkling.sql.session import SparkSession
 from pysparkling.sql.types import (
     ArrayType, DoubleType, IntegerType, LongType, MapType, Row, row_from_keyed_values, StringType, StructField,
@@ -128,3 +131,24 @@ class SessionTests(TestCase):
         persisted_df = df.persist()
         self.assertEqual(persisted_df.is_cached, True)
         self.assertEqual(repr(persisted_df.storageLevel), repr(StorageLevel.MEMORY_ONLY))
+
+    def test_session_broadcast_join(self):
+        computed = []
+        rdd = self.spark.sparkContext.parallelize([(1, "one"), (2, "two")], 2)
+        df = self.spark.createDataFrame(rdd.map(lambda row: computed.append(row) or row), ["id", "name"])
+        small_df = self.spark.createDataFrame([(2, 20)], ["id", "value"])
+        # rows inferring the schema
+        computed.clear()
+
+        # the size of small_df is known, df is not computed to choose the join strategy
+        joined = df.join(small_df, "id")
+        self.assertEqual(computed, [])
+        self.assertTrue(any(isinstance(rdd, BroadcastHashJoinRDD) for rdd in narrow_lineage(joined.rdd)))
+        self.assertEqual(joined.collect(), [Row(id=2, name='two', value=20)])
+
+        # the size of df is not known, it is only broadcast with a hint
+        self.assertFalse(any(isinstance(rdd, BroadcastHashJoinRDD)
+                             for rdd in narrow_lineage(small_df.join(df, "id").rdd)))
+        hinted = small_df.join(broadcast(df), "id")
+        self.assertTrue(any(isinstance(rdd, BroadcastHashJoinRDD) for rdd in narrow_lineage(hinted.rdd)))
+        self.assertEqual([row.asDict() for row in hinted.collect()], [{'id': 2, 'value': 20, 'name': 'two'}])
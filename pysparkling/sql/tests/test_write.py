@@ -50,7 +50,7 @@ class DataFrameWriterTests(TestCase):
             get_folder_content(".tmp/wonderland"),
             {
                 '_SUCCESS': [],
-                'part-00000-8447389540241120843.csv': [
+                'part-00000-2519983717406141950.csv': [
                     f'2,Alice,2017-01-01T00:00:00.000{self.tz}\n',
                     f'5,Bob,2014-03-02T00:00:00.000{self.tz}\n'
                 ]
@@ -69,7 +69,7 @@ class DataFrameWriterTests(TestCase):
             get_folder_content(".tmp/wonderland"),
             {
                 '_SUCCESS': [],
-                'part-00000-4061950540148431296.csv': [
+                'part-00000-7657018068366382577.csv': [
                     'age^name^occupation\n',
                     '2^Alice^null\n',
                     '5^Bob^\n',
@@ -90,7 +90,7 @@ class DataFrameWriterTests(TestCase):
             get_folder_content(".tmp/wonderland"),
             {
                 '_SUCCESS': [],
-                'part-00000-3434325560268771971.csv': [
+                'part-00000-3430372340592148516.csv': [
                     '2,Alice\n',
                     '5,Bob\n',
                 ],
@@ -107,7 +107,7 @@ class DataFrameWriterTests(TestCase):
             get_folder_content(".tmp/wonderland"),
             {
                 '_SUCCESS': [],
-                'part-00000-8447389540241120843.json': [
+                'part-00000-2519983717406141950.json': [
                     f'{{"age":2,"name":"Alice","time":"2017-01-01T00:00:00.000{self.tz}"}}\n',
                     f'{{"age":5,"name":"Bob","time":"2014-03-02T00:00:00.000{self.tz}"}}\n',
                 ],
@@ -126,7 +126,7 @@ class DataFrameWriterTests(TestCase):
             get_folder_content(".tmp/wonderland"),
             {
                 '_SUCCESS': [],
-                'part-00000-2819354714706678872.json': [
+                'part-00000-7850013449627176644.json': [
                     '{"age":2,"animals":['
                     '{"name":"Chessur","type":"cat"},'
                     '{"name":"The White Rabbit","type":"Rabbit"}'
@@ -26,9 +26,14 @@ class StorageLevel:
     in a JAVA-specific serialized format, and whether to replicate the RDD partitions on multiple
     nodes. Also contains static constants for some commonly used storage levels, MEMORY_ONLY.
     Since the data is always serialized on the Python side, all the constants use the serialized
-    formats.
+    formats. The cache manager of pysparkling keeps the partitions of the levels using memory as
+    Python objects, except for the ``*_SER`` levels, which have ``cacheSerialized`` set.
     """
 
+    # whether the cache manager of pysparkling keeps the partitions in memory serialized,
+    # an attribute of the instance is kept when the level is pickled into a task
+    cacheSerialized = False
+
     def __init__(self, useDisk, useMemory, useOffHeap, deserialized, replication=1):
         self.useDisk = useDisk
         self.useMemory = useMemory
@@ -54,6 +59,15 @@ StorageLevel.DISK_ONLY = StorageLevel(True, False, False, False)
 StorageLevel.DISK_ONLY_2 = StorageLevel(True, False, False, False, 2)
 StorageLevel.MEMORY_ONLY = StorageLevel(False, True, False, False)
 StorageLevel.MEMORY_ONLY_2 = StorageLevel(False, True, False, False, 2)
+StorageLevel.MEMORY_ONLY_SER = StorageLevel(False, True, False, False)
+StorageLevel.MEMORY_ONLY_SER_2 = StorageLevel(False, True, False, False, 2)
 StorageLevel.MEMORY_AND_DISK = StorageLevel(True, True, False, False)
 StorageLevel.MEMORY_AND_DISK_2 = StorageLevel(True, True, False, False, 2)
+StorageLevel.MEMORY_AND_DISK_SER = StorageLevel(True, True, False, False)
+StorageLevel.MEMORY_AND_DISK_SER_2 = StorageLevel(True, True, False, False, 2)
 StorageLevel.OFF_HEAP = StorageLevel(True, True, True, False, 1)
+
+for _level in (StorageLevel.MEMORY_ONLY_SER, StorageLevel.MEMORY_ONLY_SER_2,
+               StorageLevel.MEMORY_AND_DISK_SER, StorageLevel.MEMORY_AND_DISK_SER_2):
+    _level.cacheSerialized = True
+del _level
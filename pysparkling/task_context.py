@@ -1,17 +1,23 @@
 import logging
 
+from .metrics import TaskMetrics
+
 log = logging.getLogger(__name__)
 
 
 class TaskContext:
     def __init__(self, cache_manager, catch_exceptions,
-                 stage_id=0, partition_id=0, max_retries=3, retry_wait=0):
+                 stage_id=0, partition_id=0, max_retries=3, retry_wait=0,
+                 metrics=None, profiler_cls=None):
         self.cache_manager = cache_manager
         self.catch_exceptions = catch_exceptions
         self.stage_id = stage_id
         self.partition_id = partition_id
         self.max_retries = max_retries
         self.retry_wait = retry_wait
+        self.metrics = metrics if metrics is not None else TaskMetrics(stage_id, partition_id)
+        # the task runs under an instance of this profiler if it is set
+        self.profiler_cls = profiler_cls
 
         self.attempt_number = 0
         self.is_completed = False
@@ -19,9 +25,11 @@ class TaskContext:
         self.task_completion_listeners = []
 
     def _create_child(self):
+        # narrow dependencies are computed in the same stage
         return TaskContext(self.cache_manager, self.catch_exceptions,
-                           stage_id=self.stage_id + 1,
-                           partition_id=self.partition_id)
+                           stage_id=self.stage_id,
+                           partition_id=self.partition_id,
+                           metrics=self.metrics)
 
     def attemptNumber(self):
         return self.attempt_number
@@ -0,0 +1,51 @@
+import asyncio
+from concurrent.futures import CancelledError
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import threading
+import unittest
+
+import pysparkling
+
+
+class AsyncActions(unittest.TestCase):
+    def test_futures(self):
+        sc = pysparkling.Context()
+        rdd = sc.parallelize(range(10), 3)
+        futures = [rdd.collectAsync(), rdd.countAsync(), rdd.takeAsync(2)]
+        self.assertEqual([f.result(timeout=10) for f in futures], [list(range(10)), 10, [0, 1]])
+
+    def test_timeout_and_cancel(self):
+        sc = pysparkling.Context()
+        started = threading.Event()
+        release = threading.Event()
+        computed = []
+
+        def wait(partition):
+            started.set()
+            release.wait(10)
+            computed.append(list(partition))
+
+        future = sc.parallelize(range(10), 5).foreachPartitionAsync(wait)
+        started.wait(10)
+        with self.assertRaises(FutureTimeoutError):
+            future.result(timeout=0.01)
+
+        future.cancel()
+        release.set()
+        with self.assertRaises(CancelledError):
+            future.result(timeout=10)
+        # the running partition completes, the next ones are not computed
+        self.assertEqual(computed, [[0, 1]])
+
+    def test_awaitable_in_event_loop(self):
+        sc = pysparkling.Context()
+        rdd = sc.parallelize(range(10), 3)
+
+        async def run():
+            return await asyncio.gather(rdd.countAsync(), rdd.map(lambda x: x * 2).collectAsync())
+
+        loop = asyncio.new_event_loop()
+        try:
+            self.assertEqual(loop.run_until_complete(run()), [10, list(range(0, 20, 2))])
+        finally:
+            loop.close()
@@ -52,6 +52,71 @@ def test_timed_cache():
     assert m.count > count_after
 
 
+def test_storage_levels():
+    for level in (pysparkling.StorageLevel.MEMORY_ONLY, pysparkling.StorageLevel.MEMORY_ONLY_SER,
+                  pysparkling.StorageLevel.DISK_ONLY, pysparkling.StorageLevel.MEMORY_AND_DISK):
+        m = Manip()
+        cm = pysparkling.CacheManager()
+        c = pysparkling.Context(cache_manager=cm)
+        rdd = c.parallelize(range(10), 2).map(m.trivial_manip_with_debug).persist(level)
+        assert rdd.collect() == list(range(10))
+        assert rdd.collect() == list(range(10))
+        assert m.count == 10
+        # the first job misses both partitions
+        assert (cm.cache_hits, cm.cache_misses) == (2, 2)
+
+        entry = cm.cache_obj[(rdd.id(), 0)]
+        serialized = level is pysparkling.StorageLevel.MEMORY_ONLY_SER
+        assert (entry['mem_obj'] is not None) == (level.useMemory and not serialized)
+        assert (entry['mem_ser'] is not None) == serialized
+        assert (entry['disk_location'] is not None) == (not level.useMemory)
+
+
+def test_lru_eviction():
+    partition = list(range(1000))
+    partition_size = pysparkling.cache_manager.estimate_size(partition)
+    # room for two partitions
+    cm = pysparkling.CacheManager(max_mem=2.5 * partition_size / 1e9)
+    cm.add('a', partition)
+    cm.add('b', partition)
+    cm.get('a')
+    cm.add('c', partition)
+    assert (cm.has('a'), cm.has('b'), cm.has('c')) == (True, False, True)
+    assert cm.cache_evictions == 1
+    assert cm.cache_mem_size <= 2.5 * partition_size
+
+
+def test_spill_to_disk():
+    m = Manip()
+    partition_size = pysparkling.cache_manager.estimate_size(list(range(1000)))
+    cm = pysparkling.CacheManager(max_mem=2.5 * partition_size / 1e9)
+    c = pysparkling.Context(cache_manager=cm)
+    rdd = (c.parallelize(range(3000), 3)
+           .map(m.trivial_manip_with_debug)
+           .persist(pysparkling.StorageLevel.MEMORY_AND_DISK))
+    rdd.collect()
+    assert cm.cache_evictions == 1
+    assert cm.cache_obj[(rdd.id(), 0)]['disk_location'] is not None
+
+    assert rdd.collect() == list(range(3000))
+    assert m.count == 3000
+
+
+def test_corrupt_disk_cache():
+    m = Manip()
+    cm = pysparkling.CacheManager()
+    # the partition is recomputed by the same attempt of the task
+    c = pysparkling.Context(cache_manager=cm, max_retries=1)
+    rdd = c.parallelize(range(10)).map(m.trivial_manip_with_debug).persist(pysparkling.StorageLevel.DISK_ONLY)
+    rdd.collect()
+    with open(cm.cache_obj[(rdd.id(), 0)]['disk_location'], 'ab') as f:
+        f.write(b'corrupt')
+
+    assert rdd.collect() == list(range(10))
+    assert m.count == 20
+    assert cm.cache_misses == 2
+
+
 if __name__ == '__main__':
     logging.basicConfig(level=logging.DEBUG)
     # test_cache_empty_partition()
@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import unittest
 
@@ -9,29 +10,26 @@ class Context(unittest.TestCase):
         b = pysparkling.Context().broadcast([1, 2, 3])
         self.assertEqual(b.value[0], 1)
 
-    def test_lock1(self):
-        """Should not be able to create a new RDD inside a map operation."""
+    def test_rdd_in_task(self):
+        """RDDs can be created and computed inside a map operation."""
         sc = pysparkling.Context()
-        self.assertRaises(
-            pysparkling.exceptions.ContextIsLockedException,
-            lambda: (sc
-                     .parallelize(range(5))
-                     .map(lambda _: sc.parallelize([1]))
-                     .collect())
+        self.assertEqual(
+            sc.parallelize(range(5)).map(lambda x: sc.parallelize(range(x)).sum()).collect(),
+            [0, 0, 1, 3, 6]
         )
 
-    def test_lock2(self):
-        """Should not be able to create RDDs containing RDDs."""
+    def test_concurrent_jobs(self):
         sc = pysparkling.Context()
+        rdd = sc.parallelize(range(100), 4).map(lambda x: (x % 10, x)).reduceByKey(lambda a, b: a + b).cache()
 
-        def parallelize_in_parallelize():
-            o = sc.parallelize(sc.parallelize(range(x)) for x in range(5))
-            print(o.map(lambda x: x.collect()).collect())
+        def job(i):
+            return i, rdd.collectAsMap(), sc.parallelize(range(i), 3).map(lambda x: x + 1).count()
 
-        self.assertRaises(
-            pysparkling.exceptions.ContextIsLockedException,
-            parallelize_in_parallelize
-        )
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(job, range(40)))
+
+        expected = {k: sum(range(k, 100, 10)) for k in range(10)}
+        self.assertEqual(results, [(i, expected, i) for i in range(40)])
 
     def test_parallelize_single_element(self):
         my_rdd = pysparkling.Context().parallelize([7], 100)
@@ -73,6 +71,20 @@ class Context(unittest.TestCase):
         print(union)
         self.assertEqual(union, ['Hello', 'World'])
 
+    def test_union_is_lazy(self):
+        computed = []
+        sc = pysparkling.Context()
+        rdd1 = sc.parallelize(range(4), 2).map(lambda x: computed.append(x) or x)
+        rdd2 = sc.parallelize(range(4, 10), 3).cache()
+        union = rdd1.union(rdd2).union(rdd1)
+        self.assertEqual(computed, [])
+        self.assertEqual(union.getNumPartitions(), 7)
+        self.assertEqual(union.mapPartitions(lambda p: [sum(p)]).collect(),
+                         [1, 5, 9, 13, 17, 1, 5])
+        self.assertEqual(sorted(union.keyBy(lambda x: x % 2).reduceByKey(lambda a, b: a + b).collect()),
+                         [(0, 22), (1, 29)])
+        self.assertEqual(rdd2.union(rdd2).collect(), list(range(4, 10)) * 2)
+
     def test_version(self):
         self.assertIsInstance(pysparkling.Context().version, str)
 
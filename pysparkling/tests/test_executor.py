@@ -0,0 +1,244 @@
+import array
+from collections import defaultdict
+from concurrent.futures.process import BrokenProcessPool
+import os
+import pickle
+import sys
+import unittest
+
+import cloudpickle
+
+import pysparkling
+from pysparkling import context, executor, shared_memory
+from pysparkling.executor import ProcessPool
+
+
+class ProcessPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.pool = ProcessPool(3)
+        self.sc = pysparkling.Context(pool=self.pool,
+                                      serializer=cloudpickle.dumps,
+                                      deserializer=pickle.loads)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_submit_to_worker(self):
+        pids = [self.pool.submit(worker_pid, None, worker=i % 3).result() for i in range(6)]
+        self.assertEqual(pids[:3], pids[3:])
+        self.assertEqual(len(set(pids)), 3)
+        self.assertEqual(self.pool.map(abs, [-1, 2, -3]), [1, 2, 3])
+
+    def test_payloads(self):
+        payloads = [str(i).encode() for i in range(executor.MAX_PAYLOADS + 1)]
+        for _ in range(2):
+            # more payloads than the workers keep
+            futures = [self.pool.submit(read_payload, 1, worker=0, payload=p) for p in payloads]
+            self.assertEqual([f.result() for f in futures], [p + b'1' for p in payloads])
+
+    def test_payload_key(self):
+        # a payload is identified by the given key, it is not hashed
+        first = self.pool.submit(read_payload, 1, worker=0, payload=b'a', payload_key='key')
+        second = self.pool.submit(read_payload, 2, worker=0, payload=b'b', payload_key='key')
+        self.assertEqual([first.result(), second.result()], [b'a1', b'a2'])
+
+    def test_func_deserialized_once_per_worker(self):
+        marker = DeserializationCounter()
+        rdd = self.sc.parallelize(range(30), 15).map(lambda x: (marker, x)[1])
+        self.assertEqual(rdd.collect(), list(range(30)))
+        counts = [self.pool.submit(deserialization_count, None, worker=i).result() for i in range(3)]
+        self.assertLessEqual(max(counts), 1)
+        self.assertGreaterEqual(sum(counts), 1)
+
+    def test_unordered_actions(self):
+        rdd = self.sc.parallelize(range(100), 20)
+        self.assertEqual(rdd.count(), 100)
+        self.assertEqual(rdd.sum(), 4950)
+        self.assertEqual(rdd.reduce(max), 99)
+        self.assertEqual(sorted(self.pool.imap_unordered(abs, [-1, 2, -3])), [1, 2, 3])
+
+    def test_large_tasks_and_results(self):
+        # larger than the buffers of the pipes between the driver and the workers
+        rdd = self.sc.parallelize([b'x' * 10**6] * 8, 8).map(lambda x: x + b'y')
+        self.assertEqual([len(x) for x in rdd.collect()], [10**6 + 1] * 8)
+
+    def test_exceptions(self):
+        with self.assertRaises(ZeroDivisionError):
+            self.pool.submit(divide_by_zero, 1).result()
+        self.assertEqual(self.sc.parallelize(range(10), 3).map(lambda x: x * 2).sum(), 90)
+
+    def test_task_not_unpickled(self):
+        # the task fails when the worker unpickles it
+        with self.assertRaises(ZeroDivisionError):
+            self.pool.submit(abs, NotUnpickled(), worker=0).result()
+        self.assertEqual(self.pool.submit(read_payload, 1, worker=0, payload=b'a').result(), b'a1')
+        self.assertEqual(self.pool.submit(worker_pid, None, worker=0).result(),
+                         self.pool.submit(worker_pid, None, worker=0).result())
+
+    def test_terminated_worker(self):
+        rdd = self.sc.parallelize(range(4), 2).map(exit_on_three)
+        with self.assertRaises(BrokenProcessPool):
+            rdd.collect()
+        with self.assertRaises(BrokenProcessPool):
+            self.pool.submit(abs, -1)
+
+    def test_resident_cache(self):
+        cached = self.sc.parallelize(range(12), 6).map(lambda x: (x, os.getpid())).cache()
+        first = cached.collect()
+        # the partitions stay in the workers, only their locations are known by the driver
+        self.assertFalse(self.sc._cache_manager.cache_obj)
+        self.assertEqual(len(self.sc._block_locations), 6)
+
+        # tasks reading a cached partition run in the worker holding it
+        self.assertEqual(cached.collect(), first)
+        self.assertEqual(cached.map(lambda x: (x[1], os.getpid())).collect(),
+                         [(pid, pid) for _, pid in first])
+
+        cached.unpersist()
+        self.assertFalse(self.sc._block_locations)
+
+    def test_resident_cache_serialized(self):
+        cached = self.sc.parallelize(range(12), 6).persist(pysparkling.StorageLevel.MEMORY_ONLY_SER)
+        self.assertEqual(cached.collect(), list(range(12)))
+        entries = {}
+        for worker in range(3):
+            entries.update(self.pool.submit(resident_entries, None, worker=worker).result())
+        self.assertEqual(entries, {(cached.id(), i): True for i in range(6)})
+
+    def test_resident_cache_read_by_other_partitions(self):
+        cached = self.sc.parallelize(range(4), 2).map(lambda x: (x, os.getpid())).cache()
+        first = cached.collect()
+        other = self.sc.parallelize(range(4), 2).map(lambda x: (x, None))
+
+        # the partitions of cached are the last partitions of the union
+        union = other.union(cached).map(lambda x: (x[1], os.getpid())).collect()
+        self.assertEqual(union[4:], [(pid, pid) for _, pid in first])
+        self.assertEqual(cached.cartesian(cached).count(), 16)
+        self.assertEqual(self.resident_blocks(), self.sc._block_locations)
+
+        cached.unpersist()
+        self.assertFalse(self.sc._block_locations)
+        self.assertEqual(self.resident_blocks(), {})
+
+    def resident_blocks(self):
+        """Workers holding every partition cached in the workers."""
+        blocks = defaultdict(set)
+        for worker in range(3):
+            for ident in self.pool.submit(resident_entries, None, worker=worker).result():
+                blocks[ident].add(worker)
+        return dict(blocks)
+
+
+class SharedMemoryTests(unittest.TestCase):
+    def test_transfer_buffers(self):
+        with ProcessPool(2) as pool:
+            sc = pysparkling.Context(pool=pool,
+                                     serializer=cloudpickle.dumps,
+                                     deserializer=pickle.loads,
+                                     data_serializer=shared_memory.dumps,
+                                     data_deserializer=shared_memory.loads)
+            rdd = sc.parallelize([array.array('i', range(10**5)), bytearray(10**5), b'x' * 10**5, 1], 2)
+            result = rdd.map(lambda x: x * 2).collect()
+
+        self.assertEqual(result, [array.array('i', range(10**5)) * 2, bytearray(2 * 10**5),
+                                  b'x' * (2 * 10**5), 2])
+        self.assertGreater(sc._stats['driver_serialize_data'], 0)
+
+    @unittest.skipIf(sys.version_info < (3, 8), 'shared memory requires Python 3.8')
+    def test_small_data_in_band(self):
+        self.assertIsInstance(shared_memory.dumps([b'x' * 100, 1]), bytes)
+        data = shared_memory.dumps([b'x' * 10**5, 1])
+        self.assertIsInstance(data, shared_memory.SharedBuffers)
+        self.assertEqual(shared_memory.loads(data), [b'x' * 10**5, 1])
+
+    @unittest.skipIf(sys.version_info < (3, 8), 'shared memory requires Python 3.8')
+    @unittest.skipUnless(os.path.isdir('/dev/shm'), 'requires /dev/shm')
+    def test_release_after_failed_job(self):
+        before = set(os.listdir('/dev/shm'))
+        with ProcessPool(2) as pool:
+            sc = shared_memory_context(pool)
+            # the results of the other tasks are not loaded
+            rdd = sc.parallelize([(i, b'x' * 10**5) for i in range(4)], 4).map(lambda x: x[1] if x[0] else 1 / 0)
+            with self.assertRaises(ZeroDivisionError):
+                rdd.collect()
+        self.assertEqual(set(os.listdir('/dev/shm')) - before, set())
+
+    @unittest.skipIf(sys.version_info < (3, 8), 'shared memory requires Python 3.8')
+    @unittest.skipUnless(os.path.isdir('/dev/shm'), 'requires /dev/shm')
+    def test_release_tasks_not_run(self):
+        before = set(os.listdir('/dev/shm'))
+        with ProcessPool(1) as pool:
+            sc = shared_memory_context(pool)
+            # the partitions of the tasks after the first one are not loaded
+            rdd = sc.parallelize([(i, b'x' * 10**5) for i in range(4)], 4).map(exit_on_first)
+            with self.assertRaises(BrokenProcessPool):
+                rdd.collect()
+        self.assertEqual(set(os.listdir('/dev/shm')) - before, set())
+
+
+def shared_memory_context(pool):
+    return pysparkling.Context(pool=pool,
+                               serializer=cloudpickle.dumps,
+                               deserializer=pickle.loads,
+                               data_serializer=shared_memory.dumps,
+                               data_deserializer=shared_memory.loads,
+                               max_retries=1)
+
+
+def worker_pid(_):
+    return os.getpid()
+
+
+def resident_entries(_):
+    """Whether the partitions cached in this worker are serialized."""
+    cache_manager = context._resident_cache_manager  # pylint: disable=protected-access
+    if cache_manager is None:
+        return {}
+    return {ident: entry['mem_ser'] is not None for ident, entry in cache_manager.cache_obj.items()}
+
+
+class NotUnpickled:
+    def __reduce__(self):
+        return divide_by_zero, (0,)
+
+
+def exit_on_three(x):
+    if x == 3:
+        os._exit(1)  # pylint: disable=protected-access
+    return x
+
+
+def exit_on_first(x):
+    if x[0] == 0:
+        os._exit(1)  # pylint: disable=protected-access
+    return x[1]
+
+
+def divide_by_zero(x):
+    return x / 0
+
+
+def read_payload(x, payload):
+    # the data is replaced by its value once used
+    if payload.value is None:
+        payload.value = payload.data
+        payload.data = None
+    return payload.value + str(x).encode()
+
+
+DESERIALIZATIONS = 0
+
+
+def deserialized():
+    global DESERIALIZATIONS  # pylint: disable=global-statement
+    DESERIALIZATIONS += 1
+    return DeserializationCounter()
+
+
+def deserialization_count(_):
+    return DESERIALIZATIONS
+
+
+class DeserializationCounter:
+    def __reduce__(self):
+        return deserialized, ()
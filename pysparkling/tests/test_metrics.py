@@ -0,0 +1,128 @@
+from io import StringIO
+import json
+import os
+import pickle
+import unittest
+
+import cloudpickle
+
+import pysparkling
+from pysparkling.metrics import ChromeTraceExporter, JsonLinesExporter, Listener
+
+
+class RecordEvents(Listener):
+    def __init__(self):
+        self.events = []
+
+    def on_job_start(self, job):
+        self.events.append(('job_start', job))
+
+    def on_job_end(self, job):
+        self.events.append(('job_end', job))
+
+    def on_stage_submitted(self, stage):
+        self.events.append(('stage_submitted', stage))
+
+    def on_stage_completed(self, stage):
+        self.events.append(('stage_completed', stage))
+
+    def on_task_start(self, task):
+        self.events.append(('task_start', task))
+
+    def on_task_end(self, task):
+        self.events.append(('task_end', task))
+
+    def get(self, name):
+        return [metrics for event, metrics in self.events if event == name]
+
+
+class Metrics(unittest.TestCase):
+    def setUp(self):
+        self.sc = pysparkling.Context()
+        self.listener = RecordEvents()
+        self.sc.addListener(self.listener)
+
+    def test_job_with_shuffle(self):
+        rdd = self.sc.parallelize(range(10), 2).map(lambda x: (x % 3, x)).reduceByKey(lambda a, b: a + b, 3)
+        self.assertEqual(sorted(rdd.collect()), [(0, 18), (1, 12), (2, 15)])
+
+        events = [event for event, _ in self.listener.events]
+        self.assertEqual(events[0], 'job_start')
+        self.assertEqual(events[-1], 'job_end')
+        self.assertEqual(events.count('stage_completed'), 2)
+        self.assertEqual(events.count('task_end'), 5)
+
+        map_stage, result_stage = self.listener.get('stage_completed')
+        # the values are combined in the map stage before the shuffle
+        self.assertEqual((map_stage.num_tasks, map_stage.records_read, map_stage.records_written), (2, 10, 6))
+        self.assertEqual((result_stage.num_tasks, result_stage.records_read), (3, 6))
+        self.assertTrue(map_stage.succeeded and result_stage.succeeded)
+
+        job = self.listener.get('job_end')[0]
+        self.assertTrue(job.succeeded)
+        self.assertEqual(job.stage_ids, [map_stage.stage_id, result_stage.stage_id])
+        self.assertEqual(job.num_tasks, 5)
+        self.assertEqual(job.records_read, 16)
+        self.assertGreaterEqual(job.wall_time, job.task_time / 5)
+
+        for task in self.listener.get('task_end'):
+            self.assertEqual(task.pid, os.getpid())
+            self.assertLessEqual(task.launch_time, task.end_time)
+
+    def test_cache_and_retries(self):
+        failed = set()
+
+        def fail_once(x):
+            if x not in failed:
+                failed.add(x)
+                raise ValueError(x)
+            return x
+
+        rdd = self.sc.parallelize([1, 2], 2).map(fail_once).cache()
+        rdd.collect()
+        rdd.collect()
+
+        first, second = self.listener.get('job_end')
+        self.assertEqual((first.retries, first.cache_misses, first.cache_hits), (2, 2, 0))
+        self.assertEqual((second.retries, second.cache_misses, second.cache_hits), (0, 0, 2))
+
+    def test_failed_job(self):
+        with self.assertRaises(ZeroDivisionError):
+            self.sc.parallelize([0], 1).map(lambda x: 1 / x).collect()
+        self.assertFalse(self.listener.get('stage_completed')[0].succeeded)
+        self.assertFalse(self.listener.get('job_end')[0].succeeded)
+
+    def test_exporters(self):
+        lines = StringIO()
+        trace = ChromeTraceExporter()
+        self.sc.addListener(JsonLinesExporter(lines))
+        self.sc.addListener(trace)
+        self.sc.parallelize(range(4), 2).count()
+
+        events = [json.loads(line)['event'] for line in lines.getvalue().splitlines()]
+        self.assertEqual(events, ['on_job_start', 'on_stage_submitted',
+                                  'on_task_start', 'on_task_end', 'on_task_start', 'on_task_end',
+                                  'on_stage_completed', 'on_job_end'])
+
+        f = StringIO()
+        trace.write(f)
+        trace_events = json.loads(f.getvalue())['traceEvents']
+        self.assertEqual(sorted(e['cat'] for e in trace_events if e['ph'] == 'X'),
+                         ['job', 'stage', 'task', 'task'])
+
+    def test_process_pool(self):
+        with pysparkling.ProcessPool(2) as pool:
+            sc = pysparkling.Context(pool=pool,
+                                     serializer=cloudpickle.dumps,
+                                     deserializer=pickle.loads,
+                                     data_serializer=pickle.dumps,
+                                     data_deserializer=pickle.loads)
+            sc.addListener(self.listener)
+            self.assertEqual(sc.parallelize(range(4), 2).map(lambda x: x * 2).sum(), 12)
+
+        tasks = self.listener.get('task_end')
+        self.assertEqual(len(tasks), 2)
+        for task in tasks:
+            self.assertNotEqual(task.pid, os.getpid())
+            self.assertGreater(task.bytes_serialized, 0)
+            self.assertEqual(task.records_read, 2)
@@ -124,6 +124,29 @@ class ProcessPool(unittest.TestCase):  # cannot work here: LazyTestInjection):
              .collect())
         self.assertIn((4, 2), r)
 
+    def test_groupByKey(self):
+        r = (self.sc
+             .parallelize([(i % 3, i) for i in range(12)], 4)
+             .groupByKey(2)
+             .mapValues(sorted)
+             .collect())
+        self.assertEqual(sorted(r), [(0, [0, 3, 6, 9]),
+                                     (1, [1, 4, 7, 10]),
+                                     (2, [2, 5, 8, 11])])
+
+    def test_join(self):
+        rdd1 = self.sc.parallelize([(i % 4, i) for i in range(8)], 3)
+        rdd2 = self.sc.parallelize([(1, 'a'), (1, 'b'), (3, 'c')], 2)
+        self.assertEqual(sorted(rdd1.join(rdd2).collect()),
+                         [(1, (1, 'a')), (1, (1, 'b')), (1, (5, 'a')), (1, (5, 'b')),
+                          (3, (3, 'c')), (3, (7, 'c'))])
+
+    def test_broadcastJoin(self):
+        rdd1 = self.sc.parallelize([(i % 4, i) for i in range(8)], 3)
+        rdd2 = self.sc.parallelize([(1, 'a'), (1, 'b'), (3, 'c')], 2)
+        self.assertEqual(sorted(rdd1._broadcastJoin(rdd2).collect()),
+                         sorted(rdd1.join(rdd2).collect()))
+
     def test_cache(self):
         to_check = list(range(5))
         r = self.sc.parallelize(to_check, 3)
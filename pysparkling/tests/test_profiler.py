@@ -0,0 +1,78 @@
+from contextlib import redirect_stdout
+from io import StringIO
+import os
+import pickle
+import pstats
+import tempfile
+import unittest
+
+import cloudpickle
+
+import pysparkling
+from pysparkling.profiler import SamplingProfiler
+
+
+def slow_square(x):
+    return sum(x for _ in range(20000))
+
+
+class Profiler(unittest.TestCase):
+    def test_not_enabled(self):
+        sc = pysparkling.Context()
+        sc.parallelize(range(4), 2).count()
+        self.assertIsNone(sc._profiler_collector)
+        with self.assertRaises(RuntimeError):
+            sc.show_profiles()
+
+    def test_profiles_per_rdd(self):
+        sc = pysparkling.Context(profile=True)
+        rdd = sc.parallelize(range(10), 2).map(lambda x: (x % 3, slow_square(x)))
+        reduced = rdd.reduceByKey(lambda a, b: a + b, 3)
+        reduced.collect()
+        reduced.collect()
+
+        # the map stage computes the RDD combining the values before the shuffle
+        map_rdd_id, result_rdd_id = sorted(sc._profiler_collector.profiles)
+        self.assertEqual(result_rdd_id, reduced.id())
+        stats = sc._profiler_collector.profiles[map_rdd_id].stats
+        calls = [nc for (_, _, name), (_, nc, _, _, _) in stats.items() if name == 'slow_square']
+        # the map stage ran once, the shuffle is reused by the second job
+        self.assertEqual(calls, [10])
+
+        f = StringIO()
+        with redirect_stdout(f):
+            sc.show_profiles()
+        self.assertIn(f'Profile of RDD<id={map_rdd_id}>', f.getvalue())
+        self.assertIn('slow_square', f.getvalue())
+
+        with tempfile.TemporaryDirectory() as path:
+            sc.dump_profiles(path)
+            self.assertEqual(sorted(os.listdir(path)),
+                             sorted(f'rdd_{i}.pstats' for i in (map_rdd_id, result_rdd_id)))
+            loaded = pstats.Stats(os.path.join(path, f'rdd_{map_rdd_id}.pstats'))
+            self.assertEqual(loaded.total_calls, sc._profiler_collector.profiles[map_rdd_id].total_calls)
+
+    def test_sampling_profiler(self):
+        sc = pysparkling.Context(profile=True, profiler_cls=SamplingProfiler)
+        rdd = sc.parallelize(range(200), 2).map(slow_square)
+        rdd.count()
+
+        stats = sc._profiler_collector.profiles[rdd.id()].stats
+        samples = [ct for (_, _, name), (_, _, _, ct, _) in stats.items() if name == 'slow_square']
+        self.assertEqual(len(samples), 1)
+        self.assertGreater(samples[0], 0.0)
+
+    def test_process_pool(self):
+        with pysparkling.ProcessPool(2) as pool:
+            sc = pysparkling.Context(pool=pool,
+                                     serializer=cloudpickle.dumps,
+                                     deserializer=pickle.loads,
+                                     data_serializer=pickle.dumps,
+                                     data_deserializer=pickle.loads,
+                                     profile=True)
+            rdd = sc.parallelize(range(4), 2).map(slow_square)
+            self.assertEqual(rdd.count(), 4)
+
+        stats = sc._profiler_collector.profiles[rdd.id()].stats
+        calls = [nc for (_, _, name), (_, nc, _, _, _) in stats.items() if name == 'slow_square']
+        self.assertEqual(calls, [4])
@@ -2,6 +2,8 @@ from operator import add
 import unittest
 
 from pysparkling import Context
+from pysparkling.rdd import Murmur3Partitioner
+from pysparkling.utils import murmur3_hash
 
 
 class RDDTest(unittest.TestCase):
@@ -137,6 +139,66 @@ class RDDTest(unittest.TestCase):
                               ('c', ('xc2', 'zc2')),
                               ('d', (None, 'zd'))])
 
+    def testJoinDuplicate(self):
+        """Test the inner join keeps all values of duplicate keys"""
+        x = self.context.parallelize([('a', 1), ('c', 2), ('c', 3), ('d', 4)], 2)
+        y = self.context.parallelize([('c', 5), ('c', 6), ('a', 7), ('b', 8)], 3)
+        expected = [('a', (1, 7)),
+                    ('c', (2, 5)), ('c', (2, 6)),
+                    ('c', (3, 5)), ('c', (3, 6))]
+
+        joined = x.join(y, numPartitions=4)
+        self.assertEqual(joined.getNumPartitions(), 4)
+        self.assertEqual(sorted(joined.collect()), expected)
+
+        # the build side is chosen per partition, the output is the same
+        small = self.context.parallelize([('c', 0)])
+        large = self.context.parallelize([('c', i) for i in range(1, 6)] + [('e', 9)])
+        self.assertEqual(sorted(small.join(large).collect()),
+                         [('c', (0, i)) for i in range(1, 6)])
+        self.assertEqual(sorted(large.join(small).collect()),
+                         [('c', (i, 0)) for i in range(1, 6)])
+        self.assertEqual(sorted(small.rightOuterJoin(large).collect()),
+                         [('c', (0, i)) for i in range(1, 6)] + [('e', (None, 9))])
+        self.assertEqual(sorted(large.leftOuterJoin(small).collect()),
+                         [('c', (i, 0)) for i in range(1, 6)] + [('e', (9, None))])
+
+    def testSortMergeJoin(self):
+        x = self.context.parallelize([('a', 'xa'), ('c', 'xc1'), ('c', 'xc2')])
+        z = self.context.parallelize([('c', 'zc1'), ('c', 'zc2'), ('d', 'zd')])
+        sorted_x = x.repartitionAndSortWithinPartitions(3)
+        sorted_z = z.repartitionAndSortWithinPartitions(3)
+
+        for how, join in (('inner', x.join),
+                          ('left', x.leftOuterJoin),
+                          ('right', x.rightOuterJoin),
+                          ('full', x.fullOuterJoin)):
+            self.assertEqual(sorted(sorted_x._sortMergeJoin(sorted_z, how).collect()),
+                             sorted(join(z).collect()))
+
+    def testBroadcastJoin(self):
+        x = self.context.parallelize([('a', 'xa'), ('c', 'xc1'), ('c', 'xc2')], 2)
+        z = self.context.parallelize([('c', 'zc1'), ('c', 'zc2'), ('d', 'zd')])
+
+        for how, join in (('inner', x.join),
+                          ('left', x.leftOuterJoin),
+                          ('leftsemi', x._leftSemiJoin),
+                          ('leftanti', x._leftAntiJoin)):
+            joined = x._broadcastJoin(z, how)
+            self.assertEqual(joined.getNumPartitions(), 2)
+            self.assertEqual(sorted(joined.collect()), sorted(join(z).collect()))
+
+        with self.assertRaises(ValueError):
+            x._broadcastJoin(z, 'full')
+
+        # the other RDD is collected once, by the first job computing the join
+        collected = []
+        joined = x._broadcastJoin(z.map(lambda kv: collected.append(kv) or kv))
+        self.assertEqual(collected, [])
+        joined.collect()
+        joined.collect()
+        self.assertEqual(len(collected), 3)
+
     def test_cartesian(self):
         x = self.context.parallelize(range(0, 2))
         y = self.context.parallelize(range(3, 6))
@@ -145,6 +207,64 @@ class RDDTest(unittest.TestCase):
         expected = sorted([(0, 3), (0, 4), (0, 5), (1, 3), (1, 4), (1, 5)])
         self.assertListEqual(result, expected)
 
+    def test_cartesian_partitions(self):
+        computed = []
+        x = self.context.parallelize(range(4), 2).map(lambda v: computed.append(v) or v)
+        y = self.context.parallelize('abc', 3)
+        c = x.cartesian(y)
+        self.assertEqual(computed, [])
+        self.assertEqual(c.getNumPartitions(), 6)
+        self.assertEqual(c.glom().collect()[:2], [[(0, 'a'), (1, 'a')], [(0, 'b'), (1, 'b')]])
+
+        joined = x._nestedLoopJoin(y, lambda v, w: 'abc'.index(w) == v)
+        self.assertEqual(joined.collect(), [(0, 'a'), (1, 'b'), (2, 'c')])
+
+    def test_coalesce_is_lazy(self):
+        computed = []
+        x = self.context.parallelize(range(10), 5).map(lambda v: computed.append(v) or v)
+        coalesced = x.coalesce(2)
+        self.assertEqual(computed, [])
+        self.assertEqual(coalesced.glom().collect(), [[0, 1, 2, 3, 4, 5], [6, 7, 8, 9]])
+        self.assertEqual(self.context.parallelize([], 2).filter(bool).coalesce(0).collect(), [])
+
+    def test_zip(self):
+        x = self.context.parallelize(range(6), 3)
+        zipped = x.zip(x.map(lambda v: v * 2))
+        self.assertEqual(zipped.getNumPartitions(), 3)
+        self.assertEqual(zipped.glom().collect(), [[(0, 0), (1, 2)], [(2, 4), (3, 6)], [(4, 8), (5, 10)]])
+
+        with self.assertRaises(ValueError):
+            x.zip(self.context.parallelize(range(6), 2))
+        with self.assertRaises(ValueError):
+            x.zip(x.filter(lambda v: v != 3)).collect()
+
+    def test_zipWithIndex(self):
+        x = self.context.parallelize('abcdefg', 3).filter(lambda v: v != 'b')
+        indexed = x.zipWithIndex()
+        self.assertEqual(indexed.getNumPartitions(), 3)
+        self.assertEqual(indexed.glom().collect(),
+                         [[('a', 0)], [('c', 1), ('d', 2)], [('e', 3), ('f', 4), ('g', 5)]])
+        self.assertEqual(self.context.parallelize('ab', 1).zipWithIndex().collect(), [('a', 0), ('b', 1)])
+
+    def test_set_operations(self):
+        x = self.context.parallelize([1, 2, 2, 3, 1, 4, 5, 5], 3)
+        y = self.context.parallelize([5, 2, 6, 2], 2)
+
+        distinct = x.distinct(2)
+        self.assertEqual(distinct.getNumPartitions(), 2)
+        self.assertEqual(sorted(distinct.collect()), [1, 2, 3, 4, 5])
+        self.assertEqual(sorted(x.intersection(y).collect()), [2, 5])
+        self.assertEqual(sorted(x.subtract(y).collect()), [1, 1, 3, 4])
+        self.assertEqual(x.subtract(y, 4).getNumPartitions(), 4)
+
+        pairs = x.map(lambda v: (v, v * 10))
+        other_pairs = y.map(lambda v: (v, None))
+        self.assertEqual(sorted(pairs.subtractByKey(other_pairs).collect()),
+                         [(1, 10), (1, 10), (3, 30), (4, 40)])
+        self.assertEqual(sorted(pairs._leftSemiJoin(other_pairs).collect()),
+                         [(2, (20, ())), (2, (20, ())), (5, (50, ())), (5, (50, ()))])
+        self.assertEqual(pairs._leftAntiJoin(other_pairs, 5).getNumPartitions(), 5)
+
     def test_sample(self):
         rdd = self.context.parallelize(range(100), 4)
         self.assertTrue(6 <= rdd.sample(False, 0.1, 81).count() <= 14)
@@ -191,6 +311,89 @@ class RDDTest(unittest.TestCase):
             for vv in v:
                 self.assertIn(vv, grouped_dict[k])
 
+    def test_groupByKey_numPartitions(self):
+        k_rdd = self.context.parallelize([(i % 7, i) for i in range(100)], 4)
+        grouped = k_rdd.groupByKey(3)
+        self.assertEqual(grouped.getNumPartitions(), 3)
+
+        partitions = grouped.mapValues(sorted).glom().collect()
+        self.assertEqual(sorted(kv for p in partitions for kv in p),
+                         [(k, list(range(k, 100, 7))) for k in range(7)])
+        # every key lands in exactly one partition
+        self.assertEqual(sum(len(p) for p in partitions), 7)
+
+    def test_partitionBy_string_keys(self):
+        k_rdd = self.context.parallelize([(f'user_{i}', i) for i in range(1000)], 4)
+        report = k_rdd._skewReport(8)
+        self.assertEqual(sum(report['rows_per_bucket']), 1000)
+        self.assertLess(report['skew'], 1.2)
+
+        sizes = [len(p) for p in k_rdd.partitionBy(8).glom().collect()]
+        self.assertEqual(sizes, report['rows_per_bucket'])
+
+    def test_partitionBy_murmur3(self):
+        k_rdd = self.context.parallelize([((i % 5, str(i % 3)), i) for i in range(100)], 3)
+        partitioner = Murmur3Partitioner()
+        partitions = k_rdd.partitionBy(4, partitioner).glom().collect()
+        for i, partition in enumerate(partitions):
+            for key, _ in partition:
+                self.assertEqual(murmur3_hash(key) % 4, i)
+        self.assertEqual(k_rdd._skewReport(4, partitioner)['rows_per_bucket'],
+                         [len(p) for p in partitions])
+
+    def test_combineByKey(self):
+        words = self.context.parallelize(
+            ['a', 'b', 'a', 'c', 'a', 'b', 'd', 'a'] * 5, 4
+        ).map(lambda w: (w, 1))
+
+        combined = words.combineByKey(lambda v: v, add, add, numPartitions=2)
+        self.assertEqual(combined.getNumPartitions(), 2)
+        self.assertEqual(sorted(combined.collect()),
+                         [('a', 20), ('b', 10), ('c', 5), ('d', 5)])
+
+        # only one combiner per key and input partition is shuffled
+        shuffled = combined.prev
+        self.assertEqual(sum(sum(s) for s in shuffled.map_statuses), 4 * 4)
+
+    def test_foldByKey_aggregateByKey(self):
+        rdd = self.context.parallelize([(i % 3, i) for i in range(30)], 5)
+        expected = [(k, sum(range(k, 30, 3))) for k in range(3)]
+        self.assertEqual(sorted(rdd.foldByKey(0, add, 2).collect()), expected)
+        self.assertEqual(sorted(rdd.aggregateByKey(0, add, add, 4).collect()), expected)
+        self.assertEqual(rdd.reduceByKeyLocally(add), dict(expected))
+        self.assertEqual(rdd.countByKey(), {0: 10, 1: 10, 2: 10})
+
+    def test_sortBy(self):
+        data = [(i * 7919) % 1000 for i in range(1000)]
+        rdd = self.context.parallelize(data, 5)
+
+        ascending = rdd.sortBy(lambda x: x, numPartitions=4)
+        self.assertEqual(ascending.getNumPartitions(), 4)
+        partitions = ascending.glom().collect()
+        self.assertEqual([x for p in partitions for x in p], sorted(data))
+        # range partitioning spreads the data over all partitions
+        self.assertTrue(all(len(p) > 100 for p in partitions))
+
+        descending = rdd.sortBy(lambda x: x, ascending=False, numPartitions=3)
+        self.assertEqual(descending.collect(), sorted(data, reverse=True))
+
+        # one range per partition, with more partitions than input partitions
+        for num_partitions in (1, 7, 50, 200):
+            self.assertEqual(rdd.sortBy(lambda x: x, numPartitions=num_partitions).getNumPartitions(),
+                             num_partitions)
+
+    def test_sortBy_stable(self):
+        rdd = self.context.parallelize([(i % 4, i) for i in range(40)], 3)
+        self.assertEqual(rdd.sortByKey(numPartitions=2).collect(),
+                         sorted(rdd.collect(), key=lambda kv: kv[0]))
+
+    def test_top_takeOrdered(self):
+        data = [(i * 7919) % 1000 for i in range(1000)]
+        rdd = self.context.parallelize(data, 7)
+        self.assertEqual(rdd.top(5), [999, 998, 997, 996, 995])
+        self.assertEqual(rdd.takeOrdered(3), [0, 1, 2])
+        self.assertEqual(rdd.takeOrdered(3, key=lambda x: -x), [999, 998, 997])
+
     def test_reduceByKey(self):
         # This will fail if the values of the RDD need to be compared
         class IncomparableValueAddable:
@@ -0,0 +1,135 @@
+import gc
+from operator import add
+import os
+import pickle
+import threading
+import unittest
+
+import pysparkling
+from pysparkling.rdd import ElementPipeline, MapPartitionsRDD, PipelinedRDD
+from pysparkling.scheduler import fuse, narrow_lineage, persisted_blocks
+from pysparkling.shuffle import DiskShuffleManager, ShuffleManager
+
+
+def record_stage_ids(rdd, stage_ids):
+    return MapPartitionsRDD(rdd, lambda tc, i, x: stage_ids.append(tc.stageId()) or x)
+
+
+def shuffle_blocks(shuffle_manager):
+    if isinstance(shuffle_manager, DiskShuffleManager):
+        return os.listdir(shuffle_manager.local_dir)
+    return shuffle_manager.blocks
+
+
+class DAGScheduler(unittest.TestCase):
+    def test_stage_ids(self):
+        sc = pysparkling.Context()
+        map_stage_ids, result_stage_ids = [], []
+        pairs = record_stage_ids(sc.parallelize(range(10), 2).map(lambda x: (x % 3, x)), map_stage_ids)
+        result = record_stage_ids(pairs.reduceByKey(add, 3), result_stage_ids)
+
+        self.assertEqual(sorted(result.collect()), [(0, 18), (1, 12), (2, 15)])
+        self.assertEqual(len(map_stage_ids), 2)
+        self.assertEqual(len(set(map_stage_ids)), 1)
+        self.assertEqual(len(set(result_stage_ids)), 1)
+        self.assertLess(map_stage_ids[0], result_stage_ids[0])
+
+    def test_reuse_shuffle_outputs(self):
+        sc = pysparkling.Context()
+        computed = []
+        pairs = sc.parallelize(range(10), 2).map(lambda x: computed.append(x) or (x % 2, x))
+        sums = pairs.reduceByKey(add)
+
+        self.assertEqual(sums.collectAsMap(), {0: 20, 1: 25})
+        self.assertEqual(sums.mapValues(lambda x: x * 2).collectAsMap(), {0: 40, 1: 50})
+        self.assertEqual(len(computed), 10)
+
+    def test_remove_shuffle_outputs(self):
+        for shuffle_manager in (ShuffleManager(), DiskShuffleManager()):
+            sc = pysparkling.Context()
+            sc._shuffle_manager = shuffle_manager
+            sums = sc.parallelize(range(10), 2).map(lambda x: (x % 2, x)).reduceByKey(add)
+            self.assertEqual(sums.collectAsMap(), {0: 20, 1: 25})
+            self.assertTrue(shuffle_blocks(shuffle_manager))
+
+            # the outputs are removed with the last RDD depending on them
+            del sums
+            gc.collect()
+            self.assertFalse(shuffle_blocks(shuffle_manager))
+
+    def test_independent_stages_run_concurrently(self):
+        sc = pysparkling.Context()
+        # each map stage waits for the other one to start
+        barrier = threading.Barrier(2, timeout=10)
+
+        def wait_for_other_stage(partition):
+            barrier.wait()
+            return [(v, v) for v in partition]
+
+        def pairs(values):
+            return sc.parallelize(values).mapPartitions(wait_for_other_stage)
+
+        joined = pairs([1, 2, 3]).partitionBy(2).join(pairs([2, 3, 4]).partitionBy(2))
+        self.assertEqual(sorted(joined.collect()), [(2, (2, 2)), (3, (3, 3))])
+
+    def test_fuse_narrow_transformations(self):
+        sc = pysparkling.Context()
+        rdd = (sc.parallelize(['a b', 'c', '', 'd e f'], 2)
+               .flatMap(str.split)
+               .filter(lambda w: w != 'c')
+               .map(lambda w: (w, ord(w)))
+               .mapValues(lambda v: v - ord('a'))
+               .flatMapValues(range)
+               .mapPartitions(lambda p: [sum(v for _, v in p)]))
+        self.assertEqual(rdd.collect(), [0, 3 + 6 + 10])
+
+        fused = fuse(rdd)
+        self.assertIsInstance(fused, PipelinedRDD)
+        self.assertEqual(fused.id(), rdd.id())
+        self.assertEqual(len(fused.functions), 2)
+        self.assertIsInstance(fused.functions[0], ElementPipeline)
+
+    def test_fuse_chains_before_parents(self):
+        sc = pysparkling.Context()
+        left = sc.parallelize(range(4), 2).map(lambda x: x + 1).filter(lambda x: x % 2)
+        right = sc.parallelize(range(4), 2).map(lambda x: x * 2).map(lambda x: x + 1)
+        rdd = left.union(right.zip(right).map(sum)).coalesce(2)
+        self.assertEqual(rdd.collect(), [1, 3, 2, 6, 10, 14])
+
+        fused = fuse(rdd)
+        lineage = list(narrow_lineage(fused))
+        self.assertFalse([r for r in lineage if isinstance(r, MapPartitionsRDD)])
+        self.assertEqual(len([r for r in lineage if isinstance(r, PipelinedRDD)]), 3)
+        self.assertEqual(fused.collect(), rdd.collect())
+        # the RDDs of the lineage are not modified
+        self.assertTrue([r for r in narrow_lineage(rdd) if isinstance(r, MapPartitionsRDD)])
+
+    def test_long_chain(self):
+        sc = pysparkling.Context()
+        rdd = sc.parallelize(range(10), 2)
+        for _ in range(3000):
+            rdd = rdd.map(increment)
+        self.assertEqual(rdd.sum(), 30045)
+
+        # the pickled form of the fused chain is flat
+        pipeline = pickle.loads(pickle.dumps(fuse(rdd).functions[0]))
+        self.assertEqual(list(pipeline(None, 0, [0])), [3000])
+
+    def test_persisted_blocks(self):
+        sc = pysparkling.Context()
+        cached = sc.parallelize(range(4), 2).cache()
+        other = sc.parallelize(range(4), 2)
+
+        union = other.union(cached.map(increment))
+        self.assertEqual([persisted_blocks(union, p) for p in union.partitions()],
+                         [[], [], [(cached.id(), 0)], [(cached.id(), 1)]])
+        cartesian = cached.cartesian(cached)
+        self.assertEqual(sorted(persisted_blocks(cartesian, cartesian.partitions()[1])),
+                         [(cached.id(), 0), (cached.id(), 1)])
+        coalesced = cached.coalesce(1)
+        self.assertEqual(sorted(persisted_blocks(coalesced, coalesced.partitions()[0])),
+                         [(cached.id(), 0), (cached.id(), 1)])
+
+
+def increment(x):
+    return x + 1
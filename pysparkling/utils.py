@@ -6,6 +6,7 @@ import math
 from operator import itemgetter
 import random
 import re
+import struct
 import sys
 from typing import List, Optional, Union
 
@@ -20,6 +21,11 @@ from .sql.schema_utils import get_on_fields
 from .sql.types import create_row, Row, row_from_keyed_values
 from .sql.utils import IllegalArgumentException
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class Tokenizer:
     def __init__(self, expression: str):
@@ -88,9 +94,9 @@ def reservoir_sample_and_size(iterable, k, seed):
         # There are k elements in the reservoir, and the l-th element has been
         # consumed. It should be chosen with probability k/l. The expression
         # below is a random int chosen uniformly from [0, l)
-        replacementIndex = random.randint(0, reservoir_size)
+        replacementIndex = random.randint(0, reservoir_size - 1)
         if replacementIndex < k:
-            reservoir[replacementIndex.toInt] = item
+            reservoir[replacementIndex] = item
 
     return reservoir, reservoir_size
 
@@ -148,6 +154,112 @@ def compute_weighted_percentiles(weighted_values, number_of_percentiles, key=lam
     return bounds
 
 
+def get_range_bounds(rdd, numPartitions, key=lambda x: x, sample_size=1e6):
+    """
+    Compute the bounds that split the elements of an RDD into numPartitions
+    ranges of similar sizes.
+
+    The bounds are weighted percentiles of a reservoir sample of every
+    partition. Partitions that are much bigger than the average are
+    resampled with the sampling probability of the whole dataset.
+
+    :param rdd: The RDD to sample.
+    :param int numPartitions: Number of ranges.
+    :param key: A function that maps elements to comparable values.
+    :param sample_size: Approximate number of sampled elements.
+    :return: A sorted list of at most numPartitions - 1 elements of the RDD.
+
+    >>> from pysparkling import Context
+    >>> get_range_bounds(Context().parallelize(range(100), 3), 4)
+    [24, 49, 74]
+    """
+    if numPartitions <= 1 or rdd.getNumPartitions() == 0:
+        return []
+
+    sample_size_per_partition = math.ceil(3 * sample_size / rdd.getNumPartitions())
+    sketched_rdd = sketch_rdd(rdd, sample_size_per_partition)
+    rdd_size = sum(partition_size for partition_size, sample in sketched_rdd.values())
+
+    if rdd_size == 0:
+        return []
+
+    fraction = min(sample_size / rdd_size, 1.0)
+
+    candidates, imbalanced_partitions = _get_initial_candidates(
+        sketched_rdd,
+        sample_size_per_partition,
+        fraction
+    )
+
+    candidates += _get_additional_candidates(
+        rdd,
+        imbalanced_partitions,
+        fraction
+    )
+
+    bounds = compute_weighted_percentiles(
+        candidates,
+        min(numPartitions, len(candidates)) + 1,
+        key=key
+    )[1:-1]
+    return bounds
+
+
+def _get_initial_candidates(sketched_rdd, sample_size_per_partition, fraction):
+    candidates = []
+    imbalanced_partitions = set()
+    for idx, (partition_size, sample) in sketched_rdd.items():
+        # Partition is bigger than (3 times) average and more than sample_size_per_partition
+        # is needed to get accurate information on its distribution
+        if fraction * partition_size > sample_size_per_partition:
+            imbalanced_partitions.add(idx)
+        elif sample:
+            # The weight is 1 over the sampling probability.
+            weight = partition_size / len(sample)
+            candidates += [(key, weight) for key in sample]
+    return candidates, imbalanced_partitions
+
+
+def _get_additional_candidates(rdd, imbalanced_partitions, fraction):
+    additional_candidates = []
+    if imbalanced_partitions:
+        # Re-sample imbalanced partitions with the desired sampling probability.
+        def keep_imbalanced_partitions(partition_id, x):
+            return x if partition_id in imbalanced_partitions else []
+
+        resampled = (rdd.mapPartitionsWithIndex(keep_imbalanced_partitions)
+                     .sample(withReplacement=False, fraction=fraction, seed=rdd.id())
+                     .collect())
+        weight = 1.0 / fraction
+        additional_candidates += [(x, weight) for x in resampled]
+    return additional_candidates
+
+
+def sketch_rdd(rdd, sample_size_per_partition):
+    """
+    Get a subset per partition of an RDD
+
+    Sampling algorithm is reservoir sampling.
+
+    :param rdd:
+    :param sample_size_per_partition:
+    :return: A dict mapping partition indices to their size and sample.
+    """
+    rdd_id = rdd.id()
+
+    def sketch_partition(idx, x):
+        sample, original_size = reservoir_sample_and_size(
+            x,
+            sample_size_per_partition,
+            seed=rdd_id + idx
+        )
+        return [(idx, (original_size, sample))]
+
+    sketched_rdd_content = rdd.mapPartitionsWithIndex(sketch_partition).collect()
+
+    return dict(sketched_rdd_content)
+
+
 def get_keyfunc(cols, schema, nulls_are_smaller=False):
     """
     Return a function that maps a row to a tuple of some of its columns values
@@ -361,6 +473,225 @@ class MurmurHash3:
     def rotl(i, distance):
         return i << distance
 
+    # The methods below implement Spark's Murmur3_x86_32 with 32 bits
+    # arithmetic. Spark uses it for hash() and to hash partition DataFrames.
+
+    @staticmethod
+    def mixK1(k1):
+        k1 = (k1 * 0xcc9e2d51) & 0xFFFFFFFF
+        k1 = ((k1 << 15) | (k1 >> 17)) & 0xFFFFFFFF
+        return (k1 * 0x1b873593) & 0xFFFFFFFF
+
+    @staticmethod
+    def mixH1(h1, k1):
+        h1 ^= k1
+        h1 = ((h1 << 13) | (h1 >> 19)) & 0xFFFFFFFF
+        return (h1 * 5 + 0xe6546b64) & 0xFFFFFFFF
+
+    @staticmethod
+    def fmix(h1, length):
+        h1 ^= length
+        h1 ^= h1 >> 16
+        h1 = (h1 * 0x85ebca6b) & 0xFFFFFFFF
+        h1 ^= h1 >> 13
+        h1 = (h1 * 0xc2b2ae35) & 0xFFFFFFFF
+        h1 ^= h1 >> 16
+        return to_int32(h1)
+
+    @staticmethod
+    def hashInt(i, seed):
+        h1 = MurmurHash3.mixH1(seed & 0xFFFFFFFF, MurmurHash3.mixK1(i & 0xFFFFFFFF))
+        return MurmurHash3.fmix(h1, 4)
+
+    @staticmethod
+    def hashLong(i, seed):
+        h1 = MurmurHash3.mixH1(seed & 0xFFFFFFFF, MurmurHash3.mixK1(i & 0xFFFFFFFF))
+        h1 = MurmurHash3.mixH1(h1, MurmurHash3.mixK1((i >> 32) & 0xFFFFFFFF))
+        return MurmurHash3.fmix(h1, 8)
+
+    @staticmethod
+    def hashUnsafeBytes(data, seed):
+        length = len(data)
+        aligned = length - length % 4
+        h1 = seed & 0xFFFFFFFF
+        for i in range(0, aligned, 4):
+            h1 = MurmurHash3.mixH1(h1, MurmurHash3.mixK1(int.from_bytes(data[i:i + 4], "little")))
+        # Spark mixes each trailing byte on its own, as a signed int
+        for byte in data[aligned:]:
+            h1 = MurmurHash3.mixH1(h1, MurmurHash3.mixK1((byte - 256 if byte > 127 else byte) & 0xFFFFFFFF))
+        return MurmurHash3.fmix(h1, length)
+
+
+def to_int32(i):
+    i &= 0xFFFFFFFF
+    return i - (1 << 32) if i & 0x80000000 else i
+
+
+def double_to_long_bits(d):
+    """Bits of a double as a signed long, with Spark's normalization of -0.0 and NaN"""
+    if d != d:  # pylint: disable=comparison-with-itself
+        d = float("nan")
+    return struct.unpack("<q", struct.pack("<d", d + 0.0))[0]
+
+
+# Seed of Spark's hash() function and hash partitioning
+MURMUR3_SEED = 42
+
+
+def murmur3_hash(value, seed=MURMUR3_SEED):  # pylint: disable=too-many-return-statements
+    """Hash a value like Spark's ``hash()`` function.
+
+    Python values are hashed as the Spark type they are converted to when a
+    DataFrame is created: ``int`` as a long, ``float`` as a double, ``tuple``
+    as a struct, ``list`` as an array and ``dict`` as a map. Contrary to
+    ``hash()``, the result does not depend on the Python process.
+
+    >>> murmur3_hash("Spark")
+    228093765
+    >>> murmur3_hash(None)
+    42
+    >>> murmur3_hash(("Spark", 1)) == murmur3_hash(1, murmur3_hash("Spark"))
+    True
+
+    :param value: value to hash
+    :param int seed: hash of the previous columns, if any
+    :rtype: int
+    """
+    if value is None:
+        return seed
+    if isinstance(value, bool):
+        return MurmurHash3.hashInt(int(value), seed)
+    if isinstance(value, int):
+        return MurmurHash3.hashLong(value, seed)
+    if isinstance(value, float):
+        return MurmurHash3.hashLong(double_to_long_bits(value), seed)
+    if isinstance(value, str):
+        return MurmurHash3.hashUnsafeBytes(value.encode("utf-8"), seed)
+    if isinstance(value, (bytes, bytearray)):
+        return MurmurHash3.hashUnsafeBytes(value, seed)
+    if isinstance(value, datetime.datetime):
+        seconds = round(value.replace(microsecond=0).timestamp())
+        return MurmurHash3.hashLong(seconds * 1000000 + value.microsecond, seed)
+    if isinstance(value, datetime.date):
+        return MurmurHash3.hashInt((value - datetime.date(1970, 1, 1)).days, seed)
+    if isinstance(value, (tuple, list)):
+        for item in value:
+            seed = murmur3_hash(item, seed)
+        return seed
+    if isinstance(value, dict):
+        for key, item in value.items():
+            seed = murmur3_hash(item, murmur3_hash(key, seed))
+        return seed
+    return murmur3_hash(str(value), seed)
+
+
+def murmur3_partition_ids(keys, num_partitions, seed=MURMUR3_SEED):
+    """Partition of every key with Spark's hash partitioning.
+
+    All keys are hashed at once, with vectorized operations when NumPy is
+    available and the keys are ints, floats, strings or tuples of those.
+
+    >>> murmur3_partition_ids(["a", "b", None, ("a", 1)], 4)
+    [2, 1, 2, 1]
+
+    :param list keys: keys to partition
+    :param int num_partitions: number of partitions
+    :param int seed: hash seed
+    :rtype: list
+    """
+    if numpy is None or not keys:
+        return [murmur3_hash(key, seed) % num_partitions for key in keys]
+
+    seeds = numpy.full(len(keys), seed & 0xFFFFFFFF, dtype=numpy.uint32)
+    hashes = _murmur3_hash_column(keys, seeds).view(numpy.int32).astype(numpy.int64)
+    return (hashes % num_partitions).tolist()
+
+
+# Above this number of bytes, strings are hashed one by one
+_MAX_VECTORIZED_BYTES = 1 << 26
+
+
+def _murmur3_hash_column(values, seeds):
+    """Hash values with their seeds with NumPy, returns unsigned 32 bits hashes"""
+    present = [i for i, value in enumerate(values) if value is not None]
+    if len(present) < len(values):
+        hashes = seeds.copy()
+        if present:
+            hashes[present] = _murmur3_hash_column([values[i] for i in present], seeds[present])
+        return hashes
+
+    types = {type(value) for value in values}
+    if types == {int} and -(1 << 63) <= min(values) and max(values) < (1 << 63):
+        return _murmur3_hash_longs(numpy.array(values, dtype=numpy.int64), seeds)
+    if types == {float}:
+        doubles = numpy.array(values, dtype=numpy.float64) + 0.0
+        doubles[numpy.isnan(doubles)] = numpy.nan
+        return _murmur3_hash_longs(doubles.view(numpy.int64), seeds)
+    if types == {str}:
+        data = [value.encode("utf-8") for value in values]
+        width = max(max(len(d) for d in data), 1)
+        if width * len(data) <= _MAX_VECTORIZED_BYTES:
+            return _murmur3_hash_bytes(data, width, seeds)
+    elif all(isinstance(value, tuple) for value in values) and len({len(value) for value in values}) == 1:
+        for column in zip(*values):
+            seeds = _murmur3_hash_column(column, seeds)
+        return seeds
+
+    return numpy.array(
+        [murmur3_hash(value, int(seed)) & 0xFFFFFFFF for value, seed in zip(values, seeds.view(numpy.int32))],
+        dtype=numpy.uint32
+    )
+
+
+def _mix_k1(k1):
+    k1 = k1 * numpy.uint32(0xcc9e2d51)
+    k1 = (k1 << numpy.uint32(15)) | (k1 >> numpy.uint32(17))
+    return k1 * numpy.uint32(0x1b873593)
+
+
+def _mix_h1(h1, k1):
+    h1 = h1 ^ k1
+    h1 = (h1 << numpy.uint32(13)) | (h1 >> numpy.uint32(19))
+    return h1 * numpy.uint32(5) + numpy.uint32(0xe6546b64)
+
+
+def _fmix(h1, length):
+    h1 = h1 ^ length
+    h1 = h1 ^ (h1 >> numpy.uint32(16))
+    h1 = h1 * numpy.uint32(0x85ebca6b)
+    h1 = h1 ^ (h1 >> numpy.uint32(13))
+    h1 = h1 * numpy.uint32(0xc2b2ae35)
+    return h1 ^ (h1 >> numpy.uint32(16))
+
+
+def _murmur3_hash_longs(longs, seeds):
+    longs = longs.view(numpy.uint64)
+    h1 = _mix_h1(seeds, _mix_k1((longs & numpy.uint64(0xFFFFFFFF)).astype(numpy.uint32)))
+    h1 = _mix_h1(h1, _mix_k1((longs >> numpy.uint64(32)).astype(numpy.uint32)))
+    return _fmix(h1, numpy.uint32(8))
+
+
+def _murmur3_hash_bytes(data, width, seeds):
+    width += -width % 4
+    lengths = numpy.array([len(d) for d in data], dtype=numpy.int64)
+    buffer = numpy.frombuffer(b"".join(d.ljust(width, b"\0") for d in data), dtype=numpy.uint8)
+    buffer = buffer.reshape(len(data), width)
+
+    h1 = seeds
+    words = buffer.view("<u4").astype(numpy.uint32)
+    n_words = lengths // 4
+    for i in range(width // 4):
+        h1 = numpy.where(i < n_words, _mix_h1(h1, _mix_k1(words[:, i])), h1)
+
+    rows = numpy.arange(len(data))
+    for i in range(3):
+        position = n_words * 4 + i
+        byte = buffer[rows, numpy.minimum(position, width - 1)]
+        k1 = byte.view(numpy.int8).astype(numpy.int32).view(numpy.uint32)
+        h1 = numpy.where(position < lengths, _mix_h1(h1, _mix_k1(k1)), h1)
+
+    return _fmix(h1, lengths.astype(numpy.uint32))
+
 
 def merge_rows(left, right):
     return create_row(
@@ -417,7 +748,7 @@ def strhash(string):
 
     x = ord(string[0]) << 7
     for c in string[1:]:
-        x = ((1000003 * x) ^ ord(c)) & (1 << 32)
+        x = ((1000003 * x) ^ ord(c)) & 0xFFFFFFFF
     x = (x ^ len(string))
     return x
 